@@ -0,0 +1,59 @@
+"""Bulk role removal throughput against the fake REST endpoint.
+
+Compares the old one-at-a-time loop with BulkRoleEngine at the same
+server-side rate limit. Run with ``python -m benchmarks.bulk_roles``.
+"""
+import asyncio
+import os
+import tempfile
+import time
+
+from benchmarks.fake_rest import FakeRestServer, request
+from utils.bulk_roles import BulkRoleEngine
+
+MEMBERS = 1_000
+SERVER_RATE = 200  # requests per second per route
+LATENCY = 0.02  # simulated round-trip
+
+
+async def sequential(server, member_ids):
+    start = time.perf_counter()
+    for member_id in member_ids:
+        while True:
+            try:
+                await request(server.port, "DELETE", f"/guilds/1/members/{member_id}/roles/2")
+                break
+            except Exception as e:
+                await asyncio.sleep(e.retry_after)
+    return len(member_ids) / (time.perf_counter() - start)
+
+
+async def engine(server, member_ids, directory):
+    async def apply(job, member_id):
+        await request(server.port, "DELETE", f"/guilds/{job.guild_id}/members/{member_id}/roles/{job.role_id}")
+
+    roles = BulkRoleEngine(apply, path=os.path.join(directory, "jobs.json"), workers=16, rate=SERVER_RATE, per=1.0)
+    job = roles.create(1, 2, "remove", member_ids)
+    start = time.perf_counter()
+    await roles.run(job)
+    elapsed = time.perf_counter() - start
+    await roles.close()
+    return job.done / elapsed, job.failed
+
+
+async def main():
+    member_ids = list(range(MEMBERS))
+    with tempfile.TemporaryDirectory() as directory:
+        server = await FakeRestServer(rate=SERVER_RATE, per=1.0, latency=LATENCY).start()
+        old = await sequential(server, member_ids)
+        limited_before = server.rate_limited
+        new, failed = await engine(server, member_ids, directory)
+        await server.stop()
+
+    print(f"members:          {MEMBERS}, server limit {SERVER_RATE}/s, {LATENCY * 1e3:.0f}ms latency")
+    print(f"sequential:       {old:.0f} ops/s")
+    print(f"bulk role engine: {new:.0f} ops/s ({failed} failed, {server.rate_limited - limited_before} 429s)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,107 @@
+"""Disk size, restart time, memory and /modlog query latency of the case log with millions of cases.
+
+Run with ``python -m benchmarks.case_log``.
+"""
+import asyncio
+import gc
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from utils.case_log import ACTIONS, CaseLog
+
+CASES = 2_000_000
+GUILDS = [300_000_000_000_000_000 + i for i in range(5)]
+TARGETS = 300_000
+MODERATORS = 60
+REASONS = ["spam", "raid account", "scam links", "harassment", "NSFW in general", "", "alt of a banned user",
+           "advertising", "slurs", "repeated warnings"]
+QUERIES = 200
+# Relative frequency of each action: warnings and timeouts dominate, lockdown kicks and role restores are rare
+ACTION_WEIGHTS = {"ban": 8, "tempban": 3, "unban": 2, "kick": 5, "timeout": 25, "clear_timeout": 5, "warn": 40,
+                  "remove_warning": 3, "strip_role": 4, "purge": 6, "clear_roles": 1, "add_roles": 2,
+                  "restore_roles": 0.5, "lockdown_kick": 0.2}
+RARE_ACTION = "lockdown_kick"
+# The cases are spread over this many seconds up to now, about a year
+SPAN = 365 * 86400
+
+
+def directory_kb(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)) / 1024
+
+
+async def timed(queries, cases):
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        rows, _ = cases.search(**query)
+        await cases.cases(rows)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return statistics.median(samples) * 1e3, samples[int(len(samples) * 0.99)] * 1e3
+
+
+async def main():
+    random.seed(0)
+    with tempfile.TemporaryDirectory() as directory:
+        cases = CaseLog(directory)
+        await cases.load()
+        now = time.time()
+        actions = random.choices(ACTIONS, [ACTION_WEIGHTS[action] for action in ACTIONS], k=CASES)
+        start = time.perf_counter()
+        for i in range(CASES):
+            # Skewed like real moderation: a few repeat offenders and busy moderators
+            target = 400_000_000_000_000_000 + int(random.paretovariate(1.2)) % TARGETS
+            moderator = 500_000_000_000_000_000 + int(random.paretovariate(1.5)) % MODERATORS
+            cases.record(random.choice(GUILDS), actions[i], moderator, target,
+                         f"{random.choice(REASONS)} (#{i % 9973})", when=now - SPAN + SPAN * i / CASES)
+            if i % 10_000 == 0:
+                # Let the journal flush and seals run, as they would between commands
+                await asyncio.sleep(0)
+        per_record = (time.perf_counter() - start) / CASES
+        await cases.close()
+        size_kb = directory_kb(directory)
+
+        restarted = CaseLog(directory)
+        start = time.perf_counter()
+        await restarted.load()
+        load = time.perf_counter() - start
+        assert len(restarted) == CASES and restarted.recent == cases.recent
+
+        tracemalloc.start()
+        measured = CaseLog(directory)
+        await measured.load()
+        gc.collect()
+        memory_mb = tracemalloc.get_traced_memory()[0] / 1e6
+        tracemalloc.stop()
+        del measured
+
+        guild = GUILDS[0]
+        queries = {
+            "by user": [{"guild_id": guild, "target_id": 400_000_000_000_000_000 + random.randrange(1000)}
+                        for _ in range(QUERIES)],
+            "repeat offender": [{"guild_id": guild, "target_id": 400_000_000_000_000_001} for _ in range(QUERIES)],
+            "by moderator, page 50": [{"guild_id": guild, "moderator_id": 500_000_000_000_000_000 + random.randrange(5),
+                                       "offset": 490} for _ in range(QUERIES)],
+            "by action, last day": [{"guild_id": guild, "action": random.choice(ACTIONS), "since": now - 86400}
+                                    for _ in range(QUERIES)],
+            "rare action": [{"guild_id": guild, "action": RARE_ACTION} for _ in range(QUERIES)],
+            "rare action, last week": [{"guild_id": guild, "action": RARE_ACTION, "since": now - 7 * 86400}
+                                       for _ in range(QUERIES)],
+            "whole guild, page 1000": [{"guild_id": guild, "offset": 9990} for _ in range(QUERIES)],
+        }
+        results = {name: await timed(batch, restarted) for name, batch in queries.items()}
+
+    print(f"cases:        {CASES} in {len(restarted.segments)} sealed segments + {len(restarted.recent)} journaled")
+    print(f"record:       {per_record * 1e6:.1f}us per case")
+    print(f"on disk:      {size_kb / 1024:.1f}MB ({size_kb * 1024 / CASES:.1f} bytes per case)")
+    print(f"restart:      {load * 1e3:.0f}ms, {memory_mb:.0f}MB in memory")
+    for name, (p50, p99) in results.items():
+        print(f"{name + ':':<26}p50 {p50:.2f}ms, p99 {p99:.2f}ms (search plus reading the page's cases)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,107 @@
+"""A local stand-in for Discord's REST API.
+
+Speaks just enough HTTP/1.1 to accept requests, enforces a token bucket per
+route (method + path up to its major parameter) and answers 429 with a
+``retry_after`` body when a bucket is exhausted, like Discord does. With
+``inject`` set, that fraction of otherwise allowed requests is answered 429
+too, the way shared or undocumented buckets surprise a real client.
+"""
+import asyncio
+import json
+import random
+import time
+
+
+class RateLimited(Exception):
+    status = 429
+
+    def __init__(self, retry_after):
+        super().__init__(f"429: retry after {retry_after:.3f}s")
+        self.retry_after = retry_after
+
+
+class HTTPError(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+
+def route_key(method, path):
+    # /guilds/{guild_id}/members/... shares one bucket per guild
+    parts = path.strip("/").split("/")
+    return method, "/".join(parts[:2])
+
+
+class FakeRestServer:
+    def __init__(self, rate=50, per=1.0, latency=0.0, inject=0.0, inject_retry_after=0.5):
+        self.rate = rate
+        self.per = per
+        self.latency = latency
+        self.inject = inject
+        self.inject_retry_after = inject_retry_after
+        self.buckets = {}
+        self.served = 0
+        self.rate_limited = 0
+        self.server = None
+        self.port = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    def _take(self, key):
+        now = time.monotonic()
+        tokens, updated = self.buckets.get(key, (self.rate, now))
+        tokens = min(self.rate, tokens + (now - updated) * self.rate / self.per)
+        if tokens < 1:
+            self.buckets[key] = (tokens, now)
+            return (1 - tokens) * self.per / self.rate
+        self.buckets[key] = (tokens - 1, now)
+        return None
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            method, path, _ = request_line.decode().split(" ", 2)
+            while (await reader.readline()) not in (b"\r\n", b""):
+                pass
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            retry_after = self._take(route_key(method, path))
+            if retry_after is None and self.inject and random.random() < self.inject:
+                retry_after = self.inject_retry_after
+            if retry_after is None:
+                self.served += 1
+                writer.write(b"HTTP/1.1 204 No Content\r\nConnection: close\r\n\r\n")
+            else:
+                self.rate_limited += 1
+                body = json.dumps({"retry_after": retry_after, "global": False}).encode()
+                writer.write(
+                    b"HTTP/1.1 429 Too Many Requests\r\nContent-Type: application/json\r\n"
+                    + f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+                )
+            await writer.drain()
+        finally:
+            writer.close()
+
+
+async def request(port, method, path):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n".encode())
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    status = int(response.split(b" ", 2)[1])
+    if status == 429:
+        body = response.split(b"\r\n\r\n", 1)[1]
+        raise RateLimited(json.loads(body)["retry_after"])
+    if status >= 400:
+        raise HTTPError(status)
+    return status
@@ -0,0 +1,509 @@
+"""In-process stand-ins for Discord's gateway and REST API, and a scenario runner.
+
+The fakes implement only the attributes and coroutines the cogs actually use.
+Every REST call goes through ``FakeRest``, which applies a configurable
+round-trip latency and per-route/global rate limits the way discord.py's HTTP
+client does (wait for the bucket, count the would-be 429s).
+"""
+import asyncio
+import gc
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from config import GuildConfig
+from utils.checks import PermissionIndex
+from utils.member_cache import MemberResolver
+from utils.outbound import OutboundScheduler
+from utils.ratelimit import TokenBucket
+
+RESULTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results.jsonl")
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# A result is flagged when it is this much worse than the previous run
+REGRESSION_THRESHOLD = 0.2
+
+_ids = itertools.count(100_000_000_000_000_000)
+
+
+def snowflake():
+    return next(_ids)
+
+
+class FakeRest:
+    """Latency and rate limits for every simulated REST call."""
+
+    def __init__(self, latency=0.0, route_rate=50, route_per=1.0, global_rate=50, global_per=1.0):
+        self.latency = latency
+        self.route_rate = route_rate
+        self.route_per = route_per
+        self.global_bucket = TokenBucket(global_rate, global_per)
+        self.buckets = {}
+        self.calls = 0
+        self.rate_limited = 0
+
+    async def request(self, route):
+        bucket = self.buckets.get(route)
+        if bucket is None:
+            bucket = self.buckets[route] = TokenBucket(self.route_rate, self.route_per)
+        # discord.py waits on exhausted buckets; count those waits as 429s avoided
+        if bucket.tokens < 1 or self.global_bucket.tokens < 1:
+            self.rate_limited += 1
+        await self.global_bucket.acquire()
+        await bucket.acquire()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.calls += 1
+
+    # The bulk role engine calls these directly on bot.http
+    async def add_role(self, guild_id, user_id, role_id, reason=None):
+        await self.request(f"PUT /guilds/{guild_id}/members/roles")
+
+    async def remove_role(self, guild_id, user_id, role_id, reason=None):
+        await self.request(f"DELETE /guilds/{guild_id}/members/roles")
+
+
+class FakeRole:
+    def __init__(self, guild, name, position=0):
+        self.guild = guild
+        self.id = snowflake()
+        self.name = name
+        self.position = position
+        self.members = []
+
+    def __str__(self):
+        return self.name
+
+
+class FakeMessage:
+    def __init__(self, rest, channel, author, content="", **fields):
+        self.rest = rest
+        self.id = snowflake()
+        self.channel = channel
+        self.author = author
+        self.content = content
+        self.guild = getattr(channel, "guild", None)
+        self.created_at = datetime.now(timezone.utc)
+        self.attachments = []
+        self.mentions = []
+        self.role_mentions = []
+        self.mention_everyone = False
+        self.jump_url = f"https://discord.com/channels/{self.guild.id if self.guild else '@me'}/{channel.id}/{self.id}"
+        self.__dict__.update(fields)
+
+    async def add_reaction(self, emoji):
+        await self.rest.request(f"PUT /channels/{self.channel.id}/reactions")
+
+    async def edit(self, **fields):
+        await self.rest.request(f"PATCH /channels/{self.channel.id}/messages")
+
+    async def delete(self):
+        await self.rest.request(f"DELETE /channels/{self.channel.id}/messages")
+
+
+class FakeChannel:
+    def __init__(self, rest, name, guild=None):
+        self.rest = rest
+        self.id = snowflake()
+        self.name = name
+        self.guild = guild
+        self.mention = f"<#{self.id}>"
+
+    async def send(self, content=None, **fields):
+        await self.rest.request(f"POST /channels/{self.id}/messages")
+        return FakeMessage(self.rest, self, None, content or "")
+
+
+class FakeMember:
+    def __init__(self, rest, guild, name, bot=False, account_age=None, avatar="avatar"):
+        self.rest = rest
+        self.guild = guild
+        self.id = snowflake()
+        self.name = name
+        self.nick = None
+        self.bot = bot
+        self.roles = [guild.default_role]
+        # Spread out by default, as real accounts are (identical creation times look like a raid)
+        self.created_at = datetime.now(timezone.utc) - (account_age or timedelta(days=random.randint(30, 2000)))
+        self.avatar = avatar
+        self.joined_at = datetime.now(timezone.utc)
+        self.timed_out_until = None
+        self.dm_channel = FakeChannel(rest, f"dm-{name}")
+        self.mention = f"<@{self.id}>"
+
+    def __str__(self):
+        return self.name
+
+    def get_role(self, role_id):
+        return next((role for role in self.roles if role.id == role_id), None)
+
+    async def send(self, content=None, **fields):
+        await self.rest.request("POST /users/@me/channels")
+        return FakeMessage(self.rest, self.dm_channel, None, content or "")
+
+    async def edit(self, **fields):
+        await self.rest.request(f"PATCH /guilds/{self.guild.id}/members")
+        self.nick = fields.get("nick", self.nick)
+
+    async def add_roles(self, *roles, reason=None):
+        for role in roles:
+            await self.rest.request(f"PUT /guilds/{self.guild.id}/members/roles")
+            self.roles.append(role)
+            role.members.append(self)
+
+    async def remove_roles(self, *roles, reason=None):
+        for role in roles:
+            await self.rest.request(f"DELETE /guilds/{self.guild.id}/members/roles")
+            self.roles.remove(role)
+            role.members.remove(self)
+
+    async def timeout(self, until, reason=None):
+        await self.rest.request(f"PATCH /guilds/{self.guild.id}/members")
+        self.timed_out_until = until
+
+
+class FakeGuild:
+    def __init__(self, rest, name="Benchmark Guild", role_names=("Member", "Moderator", "Admin")):
+        self.rest = rest
+        self.id = snowflake()
+        self.name = name
+        self.created_at = datetime.now(timezone.utc)
+        self.default_role = FakeRole(self, "@everyone")
+        self.roles = [self.default_role] + [FakeRole(self, name, position) for position, name in enumerate(role_names, 1)]
+        self.text_channels = [FakeChannel(rest, name, self) for name in ("general", "leave-messages", "mod-reports")]
+        self.members_by_id = {}
+        self.chunked = True
+
+    @property
+    def members(self):
+        return list(self.members_by_id.values())
+
+    @property
+    def member_count(self):
+        return len(self.members_by_id)
+
+    def get_role(self, role_id):
+        return next((role for role in self.roles if role.id == role_id), None)
+
+    def role(self, name):
+        return next(role for role in self.roles if role.name == name)
+
+    def get_member(self, member_id):
+        return self.members_by_id.get(member_id)
+
+    async def fetch_member(self, member_id):
+        await self.rest.request(f"GET /guilds/{self.id}/members")
+        return self.members_by_id[member_id]
+
+    def add_member(self, member):
+        self.members_by_id[member.id] = member
+
+    async def ban(self, user, reason=None, **fields):
+        await self.rest.request(f"PUT /guilds/{self.id}/bans")
+
+    async def unban(self, user, reason=None):
+        await self.rest.request(f"DELETE /guilds/{self.id}/bans")
+
+    async def kick(self, user, reason=None):
+        await self.rest.request(f"DELETE /guilds/{self.id}/members")
+
+
+class FakeResponse:
+    def __init__(self, interaction):
+        self.interaction = interaction
+        self.done = False
+
+    def is_done(self):
+        return self.done
+
+    async def _respond(self):
+        if self.done:
+            raise RuntimeError("This interaction has already been responded to before")
+        await self.interaction.rest.request(f"POST /interactions/{self.interaction.id}/callback")
+        self.done = True
+        self.interaction.responded_at = time.perf_counter()
+
+    async def send_message(self, content=None, **fields):
+        await self._respond()
+
+    async def defer(self, **fields):
+        await self._respond()
+
+
+class FakeFollowup:
+    def __init__(self, interaction):
+        self.interaction = interaction
+
+    async def send(self, content=None, wait=False, **fields):
+        await self.interaction.rest.request("POST /webhooks/followup")
+        return FakeMessage(self.interaction.rest, self.interaction.channel, None, content or "")
+
+
+class FakeInteraction:
+    def __init__(self, bot, user, command_name, channel=None):
+        self.rest = bot.http
+        self.client = bot
+        self.id = snowflake()
+        self.user = user
+        self.guild = user.guild
+        self.channel = channel or user.guild.text_channels[0]
+        self.command = type("Command", (), {"name": command_name, "qualified_name": command_name})()
+        self.created_at = datetime.now(timezone.utc)
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+        self.responded_at = None
+
+
+class FakePayload:
+    """Shape of a RawReactionActionEvent for a reaction in DMs."""
+
+    def __init__(self, message_id, user_id, emoji):
+        self.message_id = message_id
+        self.user_id = user_id
+        self.emoji = emoji
+        self.guild_id = None
+
+
+class FakeTree:
+    """Collects app commands so scenarios can invoke them by name."""
+
+    def __init__(self):
+        self.commands = {}
+
+    def command(self, name, description=None, guild=None, **fields):
+        def decorator(callback):
+            self.commands[name] = callback
+            return callback
+        return decorator
+
+
+class FakeBot:
+    def __init__(self, rest):
+        self.http = rest
+        self.tree = FakeTree()
+        self.guilds = []
+        self.users_by_id = {}
+        self.latency = rest.latency
+        self.user = type("BotUser", (), {"id": snowflake(), "name": "bot"})()
+        self.cogs = []
+        self.logger = logging.getLogger("bot")
+        self.member_cache = MemberResolver(self)
+        self.guild_config = GuildConfig()
+        self.permissions = PermissionIndex(self.guild_config)
+        # FakeRest already enforces the route limits; the scheduler only orders the calls
+        self.outbound = OutboundScheduler(rate=rest.global_bucket.rate, per=rest.global_bucket.per, route_limits={},
+                                          default_limit=(rest.route_rate, rest.route_per))
+
+    @property
+    def users(self):
+        return list(self.users_by_id.values())
+
+    def get_guild(self, guild_id):
+        return next((guild for guild in self.guilds if guild.id == guild_id), None)
+
+    def get_channel(self, channel_id):
+        for guild in self.guilds:
+            for channel in guild.text_channels:
+                if channel.id == channel_id:
+                    return channel
+        return None
+
+    def get_user(self, user_id):
+        return self.users_by_id.get(user_id)
+
+    async def fetch_user(self, user_id):
+        await self.http.request("GET /users")
+        return self.users_by_id[user_id]
+
+    async def add_cog(self, cog):
+        if hasattr(cog, "cog_load"):
+            await cog.cog_load()
+        self.cogs.append(cog)
+
+    async def close(self):
+        for cog in self.cogs:
+            if hasattr(cog, "cog_unload"):
+                await cog.cog_unload()
+        self.outbound.stop()
+
+
+class FakeGateway:
+    """Dispatches events straight to cog listeners, timing each handler."""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.latencies = []
+        self.errors = 0
+
+    async def _timed(self, handler, *args):
+        start = time.perf_counter()
+        try:
+            await handler(*args)
+        except Exception:
+            self.errors += 1
+        self.latencies.append(time.perf_counter() - start)
+
+    def dispatch(self, event, *args):
+        tasks = []
+        for cog in self.bot.cogs:
+            handler = getattr(cog, f"on_{event}", None)
+            if handler is not None:
+                tasks.append(asyncio.create_task(self._timed(handler, *args)))
+        return tasks
+
+    def invoke(self, callback, *args, **kwargs):
+        return asyncio.create_task(self._timed(lambda: callback(*args, **kwargs)))
+
+
+class LoopLagMonitor:
+    """Measures how late a short periodic sleep wakes up, i.e. event-loop blocking."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.lags = []
+        self._task = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, time.perf_counter() - start - self.interval))
+
+    def __enter__(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (FileNotFoundError, OSError):
+        # ru_maxrss is kilobytes on Linux, bytes on macOS
+        scale = 1 if platform.system() == "Darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Sandbox:
+    """Runs scenarios inside a temporary copy of data/, so bot state files stay untouched."""
+
+    def __enter__(self):
+        self.previous = os.getcwd()
+        self.directory = tempfile.mkdtemp(prefix="bot-bench-")
+        shutil.copytree(os.path.join(REPO_ROOT, "data"), os.path.join(self.directory, "data"),
+                        ignore=shutil.ignore_patterns("*.json", "*.jsonl", "*.log", "*.prom"))
+        os.makedirs(os.path.join(self.directory, "data", "logs"), exist_ok=True)
+        shutil.copy(os.path.join(REPO_ROOT, "data", "guild_config.json"), os.path.join(self.directory, "data"))
+        os.chdir(self.directory)
+        return self
+
+    def __exit__(self, *exc):
+        os.chdir(self.previous)
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+async def run_scenario(name, scenario, rest_options, **options):
+    """Run one scenario coroutine and return its result record.
+
+    ``scenario(bot, gateway, **options)`` returns the number of operations it
+    performed; handler latencies are collected by the gateway.
+    """
+    gc.collect()
+    rest = FakeRest(**rest_options)
+    bot = FakeBot(rest)
+    gateway = FakeGateway(bot)
+    rss_before = rss_mb()
+    with LoopLagMonitor() as lag:
+        start = time.perf_counter()
+        operations = await scenario(bot, gateway, **options)
+        elapsed = time.perf_counter() - start
+    # Scenarios may also return scenario-specific figures
+    operations, details = operations if isinstance(operations, tuple) else (operations, {})
+    await bot.close()
+
+    return {
+        "scenario": name,
+        "time": datetime.now(timezone.utc).isoformat(),
+        "commit": _commit(),
+        "options": {**options, **rest_options},
+        "operations": operations,
+        "seconds": round(elapsed, 4),
+        "throughput": round(operations / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(gateway.latencies, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(gateway.latencies, 0.99) * 1000, 3),
+        "loop_lag_max_ms": round(max(lag.lags, default=0.0) * 1000, 3),
+        "loop_lag_p99_ms": round(percentile(lag.lags, 0.99) * 1000, 3),
+        "rss_delta_mb": round(rss_mb() - rss_before, 2),
+        "rest_calls": rest.calls,
+        "rate_limit_waits": rest.rate_limited,
+        "errors": gateway.errors,
+        "details": details,
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True, timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def previous_results(path=RESULTS_FILE):
+    latest = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                record = json.loads(line)
+                latest[(record["scenario"], json.dumps(record["options"], sort_keys=True))] = record
+    return latest
+
+
+def compare(result, previous):
+    """Describe regressions against the last run of the same scenario and options."""
+    if previous is None:
+        return []
+    regressions = []
+    if result["throughput"] < previous["throughput"] * (1 - REGRESSION_THRESHOLD):
+        regressions.append(f"throughput {previous['throughput']} -> {result['throughput']}/s")
+    for key in ("p99_ms", "loop_lag_max_ms"):
+        if result[key] > max(previous[key] * (1 + REGRESSION_THRESHOLD), 1.0):
+            regressions.append(f"{key} {previous[key]} -> {result[key]}")
+    return regressions
+
+
+def save_result(result, path=RESULTS_FILE):
+    with open(path, "a") as f:
+        f.write(json.dumps(result) + "\n")
+
+
+def print_result(result, regressions):
+    print(
+        f"{result['scenario']:<16} {result['operations']:>7} ops  {result['throughput']:>9.1f}/s  "
+        f"p50 {result['p50_ms']:>8.2f}ms  p99 {result['p99_ms']:>8.2f}ms  "
+        f"lag {result['loop_lag_max_ms']:>6.2f}ms  rss {result['rss_delta_mb']:>+7.2f}MB  "
+        f"429-waits {result['rate_limit_waits']:>5}  errors {result['errors']}"
+    )
+    if result.get("details"):
+        print("  " + ", ".join(f"{key} {value}" for key, value in result["details"].items()))
+    for regression in regressions:
+        print(f"  ⚠️ regression: {regression}")
@@ -0,0 +1,156 @@
+"""RSS of the member cache modes for a simulated 100k-member guild.
+
+Needs the real discord.py (not the fake used by the other benchmarks). Each
+mode runs in its own process with a discord.Client built from
+member_cache_options(mode), and gateway payloads are fed straight to
+discord.py's own parsers, so the cached objects are real discord.Member
+objects:
+
+* full chunks the guild first, as discord.py does at startup;
+* every mode then sees the same day of traffic: 200k messages from the 20%
+  of members who talk, joins and member updates;
+* lazy is measured again after the chunk on demand that the first
+  /clear_roles or /add_roles triggers (guild.chunk() caches everyone);
+* active keeps message authors in a MemberResolver and pins members holding
+  the privileged role.
+
+    python -m benchmarks.member_cache [--members 100000] [--capacity 10000]
+"""
+import argparse
+import gc
+import random
+import subprocess
+import sys
+from types import SimpleNamespace
+
+import discord
+from discord.state import ChunkRequest
+
+from benchmarks.harness import rss_mb
+from utils.checks import PermissionIndex
+from utils.member_cache import MemberResolver, member_cache_options
+
+GUILD_ID = 1
+CHANNEL_ID = 2
+PRIVILEGED_ROLE_ID = 3
+ROLE_IDS = list(range(10, 40))
+MESSAGES = 200_000
+JOINS = 1_000
+UPDATES = 5_000
+CHUNK_SIZE = 1_000
+JOINED_AT = "2024-01-01T00:00:00+00:00"
+
+
+class Config:
+    def get(self, guild_id, key, default=None):
+        return [PRIVILEGED_ROLE_ID] if key == "privileged_roles" else default
+
+
+class Client(discord.Client):
+    """Hands every dispatched message to ``on_message`` synchronously; nothing else listens."""
+
+    on_message = None
+
+    def dispatch(self, event, *args, **kwargs):
+        if event == "message" and self.on_message is not None:
+            self.on_message(args[0])
+
+
+def user_payload(user_id):
+    return {"id": str(user_id), "username": f"user{user_id}", "discriminator": "0",
+            "global_name": f"User {user_id}", "avatar": f"{user_id:032x}"}
+
+
+def member_payload(user_id, privileged=False):
+    roles = [str(random.choice(ROLE_IDS))] + ([str(PRIVILEGED_ROLE_ID)] if privileged else [])
+    return {"user": user_payload(user_id), "roles": roles, "joined_at": JOINED_AT,
+            "deaf": False, "mute": False, "flags": 0}
+
+
+def guild_payload(members):
+    roles = [{"id": str(role_id), "name": f"role{role_id}", "permissions": "0", "position": position,
+              "color": 0, "hoist": False, "managed": False, "mentionable": False}
+             for position, role_id in enumerate([GUILD_ID, PRIVILEGED_ROLE_ID] + ROLE_IDS)]
+    return {"id": str(GUILD_ID), "name": "guild", "owner_id": "0", "member_count": members, "large": True,
+            "roles": roles, "channels": [{"id": str(CHANNEL_ID), "type": 0, "name": "general", "position": 0}],
+            "members": [], "emojis": [], "stickers": [], "features": []}
+
+
+def message_payload(message_id, user_id, privileged):
+    member = member_payload(user_id, privileged)
+    return {"id": str(message_id), "channel_id": str(CHANNEL_ID), "guild_id": str(GUILD_ID),
+            "author": member.pop("user"), "member": member, "content": "hello", "timestamp": JOINED_AT,
+            "edited_timestamp": None, "tts": False, "mention_everyone": False, "mentions": [],
+            "mention_roles": [], "attachments": [], "embeds": [], "pinned": False, "type": 0}
+
+
+def chunk(state, members, privileged):
+    """guild.chunk() without a gateway: a registered request answered with GUILD_MEMBERS_CHUNK payloads."""
+    request = ChunkRequest(GUILD_ID, 0, None, state._get_guild, cache=True)
+    state._chunk_requests[request.nonce] = request
+    count = -(-members // CHUNK_SIZE)
+    for index in range(count):
+        user_ids = range(index * CHUNK_SIZE, min(members, (index + 1) * CHUNK_SIZE))
+        state.parsers["GUILD_MEMBERS_CHUNK"]({
+            "guild_id": str(GUILD_ID), "chunk_index": index, "chunk_count": count, "nonce": request.nonce,
+            "members": [member_payload(user_id, user_id in privileged) for user_id in user_ids]})
+
+
+def traffic(state, members, privileged):
+    talkers = random.sample(range(members), members // 5)
+    for message_id in range(MESSAGES):
+        user_id = random.choice(talkers)
+        state.parsers["MESSAGE_CREATE"](message_payload(message_id, user_id, user_id in privileged))
+    for user_id in range(members, members + JOINS):
+        state.parsers["GUILD_MEMBER_ADD"]({"guild_id": str(GUILD_ID), **member_payload(user_id)})
+    for user_id in random.sample(range(members), UPDATES):
+        state.parsers["GUILD_MEMBER_UPDATE"]({"guild_id": str(GUILD_ID), **member_payload(user_id, user_id in privileged)})
+
+
+def run_mode(mode, members, capacity):
+    intents = discord.Intents.default()
+    intents.members = True
+    intents.message_content = True
+    client = Client(intents=intents, **member_cache_options(mode))
+    state = client._connection
+    guild = state._add_guild_from_data(guild_payload(members))
+    privileged = set(random.sample(range(members), 50))
+    resolver = None
+    if mode == "active":
+        resolver = MemberResolver(SimpleNamespace(permissions=PermissionIndex(Config())), mode, capacity)
+        client.on_message = lambda message: resolver.remember(message.author)
+
+    def report(label):
+        gc.collect()
+        held = len(guild._members) + (len(resolver.pinned) + len(resolver.recent) if resolver else 0)
+        print(f"{label:<18} {held:>8} members  {rss_mb() - baseline:>8.1f}MB")
+
+    gc.collect()
+    baseline = rss_mb()
+    if mode == "full":
+        chunk(state, members, privileged)
+    traffic(state, members, privileged)
+    report(mode)
+    if mode == "lazy":
+        chunk(state, members, privileged)
+        report("lazy, chunked")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, default=100_000)
+    parser.add_argument("--capacity", type=int, default=10_000)
+    parser.add_argument("--mode", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.members, args.capacity)
+        return
+    print(f"{args.members} members, LRU capacity {args.capacity}, {MESSAGES} messages, {JOINS} joins, {UPDATES} updates")
+    for mode in ("full", "lazy", "active"):
+        subprocess.run([sys.executable, "-m", "benchmarks.member_cache", "--mode", mode,
+                        "--members", str(args.members), "--capacity", str(args.capacity)], check=True)
+
+
+if __name__ == "__main__":
+    main()
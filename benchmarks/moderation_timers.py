@@ -0,0 +1,83 @@
+"""Scheduling cost, idle CPU and restart catch-up with 100k pending moderation timers.
+
+Run with ``python -m benchmarks.moderation_timers``.
+"""
+import asyncio
+import os
+import tempfile
+import time
+
+from utils import moderation_timers
+from utils.moderation_timers import ModerationTimers
+from utils.storage import AppendLog
+
+TIMERS = 100_000
+# An unban stuck behind a 429 while other timers come due
+STALLED = 2.0
+BEHIND_STALL = 100
+
+
+async def main():
+    fired = 0
+
+    async def handler(timer):
+        nonlocal fired
+        fired += 1
+
+    async def stalled(timer):
+        await asyncio.sleep(STALLED)
+
+    handlers = {"warning_expiry": handler, "tempban": stalled}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "timers.jsonl")
+        timers = ModerationTimers(handlers, path=path)
+        await timers.load()
+
+        start = time.perf_counter()
+        for i in range(TIMERS):
+            # Warnings expiring over the next 30 days
+            timers.add("warning_expiry", 60 + 30 * 86400 * i / TIMERS, key=i)
+        per_add = (time.perf_counter() - start) / TIMERS
+        await timers.flush()
+
+        cpu = time.process_time()
+        await asyncio.sleep(1.0)
+        idle_cpu = time.process_time() - cpu
+        await timers.close()
+
+        # Simulate downtime: every journaled deadline is now in the past
+        overdue = [{**timer, "when": time.time() - 1} for timer in timers.timers.values()]
+        await AppendLog(path).rewrite(overdue)
+
+        restarted = ModerationTimers(handlers, path=path)
+        start = time.perf_counter()
+        await restarted.load()
+        replay = time.perf_counter() - start
+        while fired < TIMERS:
+            await asyncio.sleep(0.01)
+        catch_up = time.perf_counter() - start
+        caught_up = fired
+
+        restarted.add("tempban", 0, key="stalled")
+        await asyncio.sleep(0.01)
+        fired = 0
+        start = time.perf_counter()
+        for i in range(BEHIND_STALL):
+            restarted.add("warning_expiry", 0, key=i)
+        while fired < BEHIND_STALL:
+            await asyncio.sleep(0.001)
+        behind_stall = time.perf_counter() - start
+        await restarted.close()
+        journal_kb = os.path.getsize(path) / 1024
+
+    print(f"pending timers:          {TIMERS}")
+    print(f"schedule:                {per_add * 1e6:.2f}us per timer")
+    print(f"idle CPU over 1s:        {idle_cpu * 1e3:.1f}ms")
+    print(f"restart replay:          {replay * 1e3:.0f}ms")
+    print(f"catch-up of all overdue: {catch_up * 1e3:.0f}ms ({caught_up} fired)")
+    print(f"{BEHIND_STALL} due behind a {STALLED:.0f}s handler: {behind_stall * 1e3:.0f}ms until all fired")
+    print(f"journal after compaction: {journal_kb:.1f}KB (compacts past {moderation_timers.COMPACT_AFTER} finished)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
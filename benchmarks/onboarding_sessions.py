@@ -0,0 +1,65 @@
+"""Routing cost of onboarding events with thousands of pending sessions.
+
+Starts 5k concurrent sessions, then replays reactions and DMs from those
+members plus unrelated chatter, and compares the per-event cost with the
+old approach of evaluating one wait_for check per pending session.
+Run with ``python -m benchmarks.onboarding_sessions``.
+"""
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+from cogs.onboarding import AWAITING_GAMERTAG, OnboardingSessions
+
+SESSIONS = 5_000
+EVENTS = 50_000
+
+
+def per_event_us(elapsed, events):
+    return elapsed / events * 1e6
+
+
+async def main():
+    with tempfile.TemporaryDirectory() as directory:
+        sessions = OnboardingSessions(path=os.path.join(directory, "sessions.json"))
+        for user_id in range(SESSIONS):
+            sessions.start(1, user_id, message_id=1_000_000 + user_id)
+
+        # Old approach: every event runs every pending wait_for check
+        checks = [
+            (lambda user_id, message_id, uid=uid: user_id == uid and message_id == 1_000_000 + uid)
+            for uid in range(SESSIONS)
+        ]
+        events = [(random.randrange(SESSIONS * 2), random.randrange(SESSIONS * 2)) for _ in range(EVENTS)]
+        start = time.perf_counter()
+        for user_id, offset in events:
+            for check in checks:
+                check(user_id, 1_000_000 + offset)
+        old = per_event_us(time.perf_counter() - start, EVENTS)
+
+        start = time.perf_counter()
+        for user_id, offset in events:
+            sessions.for_reaction(1_000_000 + offset, user_id)
+            sessions.for_dm(user_id)
+        new = per_event_us(time.perf_counter() - start, EVENTS)
+
+        # Walk every session through the whole state machine
+        start = time.perf_counter()
+        for user_id in range(SESSIONS):
+            if sessions.for_reaction(1_000_000 + user_id, user_id):
+                sessions.advance(1, user_id, AWAITING_GAMERTAG)
+            if sessions.for_dm(user_id):
+                sessions.finish(1, user_id)
+        completed = time.perf_counter() - start
+        await sessions.store.close()
+
+    print(f"pending sessions:          {SESSIONS}")
+    print(f"wait_for checks per event: {old:.1f}us")
+    print(f"indexed dispatch per event: {new:.2f}us")
+    print(f"full flow for all sessions: {completed * 1e3:.1f}ms, {len(sessions)} left")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,144 @@
+"""Moderator ban latency while bulk work saturates the rate limits, with and without the outbound scheduler.
+
+Both modes run the same producers against the fake REST server with
+injected 429s: a role job, onboarding DMs, audit posts, a progress message
+edited ten times a second and a moderator banning someone every half
+second. "direct" sends each call as soon as its producer makes it, through
+a first-come first-served global bucket with per-call 429 retries (what the
+cogs did before); "scheduled" submits everything to OutboundScheduler.
+A last run parks every bulk call in a long wait (as discord.py's own bucket
+waits do) and times a ban with and without slots reserved for the
+interaction lane. Run with ``python -m benchmarks.outbound``.
+"""
+import asyncio
+import statistics
+import time
+
+from benchmarks.fake_rest import FakeRestServer, RateLimited, request
+from utils.outbound import INTERACTION, USER, BACKGROUND, BULK, RESERVED_SLOTS, OutboundScheduler
+from utils.ratelimit import TokenBucket
+
+ROLE_EDITS = 300
+DMS = 200
+AUDIT_POSTS = 30
+BANS = 20
+SERVER_RATE = 10  # requests per second per route
+INJECT = 0.05  # share of allowed requests answered 429 anyway
+LATENCY = 0.02
+GLOBAL_RATE = 40
+STALLED = 3.0  # seconds each bulk call is parked in the stalled run
+
+
+class Direct:
+    def __init__(self, port):
+        self.port = port
+        self.bucket = TokenBucket(GLOBAL_RATE, 1.0)
+
+    async def call(self, lane, route, method, path, key=None):
+        while True:
+            await self.bucket.acquire()
+            try:
+                return await request(self.port, method, path)
+            except RateLimited as e:
+                await asyncio.sleep(e.retry_after)
+
+
+class Scheduled:
+    def __init__(self, port):
+        self.port = port
+        self.scheduler = OutboundScheduler(rate=GLOBAL_RATE)
+
+    async def call(self, lane, route, method, path, key=None):
+        return await self.scheduler.run(lane, route, lambda: request(self.port, method, path), key=key)
+
+
+async def workers(count, items, work):
+    items = iter(items)
+
+    async def worker():
+        for item in items:
+            await work(item)
+
+    await asyncio.gather(*(worker() for _ in range(count)))
+
+
+async def workload(client):
+    bans = []
+    edits = []
+    done = asyncio.Event()
+
+    async def role_edit(member_id):
+        await client.call(BULK, "members:1", "PATCH", f"/guilds/1/members/{member_id}")
+
+    async def dm(member_id):
+        await client.call(USER, f"messages:dm:{member_id}", "POST", f"/channels/{member_id}/messages")
+
+    async def audit_post(i):
+        await client.call(BACKGROUND, "messages:9", "POST", "/channels/9/messages")
+
+    async def progress():
+        while not done.is_set():
+            edits.append(asyncio.create_task(
+                client.call(BACKGROUND, "webhook_messages:7", "PATCH", "/webhooks/7/messages", key=("progress", 7))))
+            await asyncio.sleep(0.1)
+
+    async def moderator():
+        await asyncio.sleep(1.0)  # let the backlog build first
+        for i in range(BANS):
+            start = time.perf_counter()
+            await client.call(INTERACTION, "bans:1", "PUT", f"/guilds/1/bans/{i}")
+            bans.append(time.perf_counter() - start)
+            await asyncio.sleep(0.5)
+
+    start = time.perf_counter()
+    progress_task = asyncio.create_task(progress())
+    await asyncio.gather(
+        workers(8, range(ROLE_EDITS), role_edit),
+        workers(8, range(1000, 1000 + DMS), dm),
+        workers(2, range(AUDIT_POSTS), audit_post),
+        moderator(),
+    )
+    elapsed = time.perf_counter() - start
+    done.set()
+    await progress_task
+    await asyncio.gather(*edits)
+    return elapsed, bans, len(edits)
+
+
+async def run(mode):
+    server = await FakeRestServer(rate=SERVER_RATE, per=1.0, latency=LATENCY, inject=INJECT).start()
+    client = mode(server.port)
+    elapsed, bans, edits = await workload(client)
+    if isinstance(client, Scheduled):
+        client.scheduler.stop()
+    await server.stop()
+    bans.sort()
+    print(f"{mode.__name__.lower():<10} all work done in {elapsed:5.1f}s | ban p50 {statistics.median(bans) * 1e3:6.0f}ms, "
+          f"max {bans[-1] * 1e3:6.0f}ms | {server.rate_limited} 429s | {server.served} requests served "
+          f"({edits} progress edits submitted)")
+    if isinstance(client, Scheduled):
+        for line in client.scheduler.metrics.lane_lines():
+            print(f"           {line}")
+
+
+async def stalled_bulk(reserved):
+    scheduler = OutboundScheduler(rate=GLOBAL_RATE, reserved=reserved, route_limits={}, default_limit=(1000, 1.0))
+    bulk = [scheduler.submit(BULK, f"members:{i}", lambda: asyncio.sleep(STALLED)) for i in range(40)]
+    await asyncio.sleep(0.3)
+    start = time.perf_counter()
+    await scheduler.run(INTERACTION, "bans:1", lambda: asyncio.sleep(LATENCY))
+    ban = time.perf_counter() - start
+    scheduler.stop()
+    await asyncio.gather(*bulk, return_exceptions=True)
+    print(f"stalled bulk, {reserved} reserved slots: ban took {ban * 1e3:.0f}ms")
+
+
+async def main():
+    for mode in (Direct, Scheduled):
+        await run(mode)
+    for reserved in (0, RESERVED_SLOTS):
+        await stalled_bulk(reserved)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,50 @@
+"""Reaction tallying and scheduled closing with thousands of open polls.
+
+Run with ``python -m benchmarks.polls``.
+"""
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+from utils.polls import POLL_EMOJIS, PollEngine
+
+POLLS = 5_000
+REACTIONS = 500_000
+
+
+async def main():
+    closed = []
+
+    async def on_close(message_id, poll):
+        closed.append(message_id)
+
+    with tempfile.TemporaryDirectory() as directory:
+        polls = PollEngine(on_close, path=os.path.join(directory, "polls.json"))
+        polls.start()
+        now = time.time()
+        for message_id in range(POLLS):
+            polls.create(message_id, 1, 2, 3, f"Question {message_id}", ["yes", "no", "maybe"], now + 1 + random.random())
+
+        # Mostly votes on open polls, some reactions on unrelated messages
+        events = [(random.randrange(POLLS * 2), random.choice(POLL_EMOJIS), random.choice((1, 1, 1, -1)))
+                  for _ in range(REACTIONS)]
+        start = time.perf_counter()
+        for message_id, emoji, delta in events:
+            polls.react(message_id, emoji, delta)
+        per_reaction = (time.perf_counter() - start) / REACTIONS
+
+        start = time.perf_counter()
+        while len(closed) < POLLS:
+            await asyncio.sleep(0.05)
+        close_all = time.perf_counter() - start
+        await polls.stop()
+
+    print(f"open polls:        {POLLS}")
+    print(f"per reaction:      {per_reaction * 1e6:.2f}us over {REACTIONS} events")
+    print(f"all polls closed:  {len(closed)} within {close_all:.2f}s of the first deadline window, one scheduler task")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
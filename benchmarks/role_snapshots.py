@@ -0,0 +1,93 @@
+"""Journal size, record cost and replay time of role snapshots for 100k members with role churn.
+
+Run with ``python -m benchmarks.role_snapshots``.
+"""
+import asyncio
+import gc
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from utils.bulk_roles import BulkRoleEngine
+from utils import role_snapshots
+from utils.role_snapshots import RoleSnapshots
+
+MEMBERS = 100_000
+CHURN = 500_000
+GUILD_ID = 300_000_000_000_000_000
+# Real snowflakes, so IDs cost what they would in production
+FIRST_USER = 400_000_000_000_000_000
+ROLES = [200_000_000_000_000_000 + i for i in range(40)]
+
+
+async def main():
+    random.seed(0)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "role_snapshots.jsonl")
+        snapshots = RoleSnapshots(path=path)
+        await snapshots.load()
+
+        # Initial snapshot: most members hold one of a few common role combinations
+        combos = [random.sample(ROLES, random.randint(1, 4)) for _ in range(50)]
+        for user_id in range(FIRST_USER, FIRST_USER + MEMBERS):
+            snapshots.record(GUILD_ID, user_id, random.choice(combos))
+        await snapshots.flush()
+
+        # Role churn: one role toggled per change, journaled as diffs only
+        role_snapshots.COMPACT_AFTER = float("inf")
+        start = time.perf_counter()
+        for _ in range(CHURN):
+            user_id = FIRST_USER + random.randrange(MEMBERS)
+            roles = set(snapshots.get(GUILD_ID, user_id))
+            roles ^= {random.choice(ROLES)}
+            snapshots.record(GUILD_ID, user_id, roles)
+        per_record = (time.perf_counter() - start) / CHURN
+        await snapshots.flush()
+        journal_kb = os.path.getsize(path) / 1024
+
+        role_snapshots.COMPACT_AFTER = 0
+        start = time.perf_counter()
+        await snapshots.close()
+        compaction = time.perf_counter() - start
+        compacted_kb = os.path.getsize(path) / 1024
+
+        restarted = RoleSnapshots(path=path)
+        start = time.perf_counter()
+        await restarted.load()
+        replay = time.perf_counter() - start
+        assert restarted.guilds == snapshots.guilds
+
+        # Live memory of a freshly loaded copy, without parsing garbage
+        tracemalloc.start()
+        measured = RoleSnapshots(path=path)
+        await measured.load()
+        await asyncio.sleep(0)  # let the loop drop its reference to the parsed journal
+        gc.collect()
+        memory_mb = tracemalloc.get_traced_memory()[0] / 1e6
+        tracemalloc.stop()
+        del measured
+
+        # Bulk restore of 1000 returning members at Discord's ~10 member edits per second per guild
+        async def restore(job, member_id):
+            restarted.get(job.guild_id, member_id)
+            await asyncio.sleep(0.05)
+
+        engine = BulkRoleEngine(restore, path=os.path.join(directory, "role_jobs.json"), rate=1000)
+        job = engine.create(GUILD_ID, None, "restore", range(FIRST_USER, FIRST_USER + 1000))
+        start = time.perf_counter()
+        await engine.run(job)
+        bulk = time.perf_counter() - start
+        await engine.close()
+
+    print(f"members:              {MEMBERS}, role changes: {CHURN}")
+    print(f"record:               {per_record * 1e6:.2f}us per role change")
+    print(f"memory:               {memory_mb:.1f}MB after a restart")
+    print(f"journal:              {journal_kb:.0f}KB of diffs, {compacted_kb:.0f}KB after compaction ({compaction * 1e3:.0f}ms)")
+    print(f"restart replay:       {replay * 1e3:.0f}ms")
+    print(f"bulk restore:         {job.done} members in {bulk:.2f}s with {engine.workers} workers and 50ms per edit")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,239 @@
+"""Offline load tests for the cogs against the fake gateway and REST layer.
+
+    python -m benchmarks.run                       # every scenario, default sizes
+    python -m benchmarks.run joins --count 5000 --latency 0.05 --route-rate 5
+
+Each result is appended to benchmarks/results.jsonl and compared with the
+previous run of the same scenario and options to flag regressions.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from datetime import timedelta
+
+# Admin commands register against the home guild; the fakes don't care which
+os.environ.setdefault("GUILD_ID", "1")
+os.environ.setdefault("DISCORD_TOKEN", "benchmark")
+
+from benchmarks.harness import (  # noqa: E402
+    FakeGuild, FakeInteraction, FakeMember, FakeMessage, FakePayload, Sandbox,
+    compare, previous_results, print_result, run_scenario, save_result,
+)
+
+
+def populate(bot, count, role=None):
+    guild = bot.guilds[0] if bot.guilds else FakeGuild(bot.http)
+    if not bot.guilds:
+        bot.guilds.append(guild)
+    members = []
+    for i in range(count):
+        member = FakeMember(bot.http, guild, f"member{i}")
+        if role is not None:
+            member.roles.append(role)
+            role.members.append(member)
+        guild.add_member(member)
+        bot.users_by_id[member.id] = member
+        members.append(member)
+    return guild, members
+
+
+async def paced(items, rate, start):
+    """Call ``start(item)`` for each item at ``rate`` per second (0 = all at once)."""
+    tasks = []
+    for item in items:
+        tasks.extend(start(item))
+        if rate:
+            await asyncio.sleep(1 / rate)
+    await asyncio.gather(*tasks)
+
+
+async def joins(bot, gateway, count=1000, rate=0):
+    """Members join, accept the rules and send their gamertag."""
+    from cogs.onboarding import Onboarding, ACCEPT_EMOJI, member_key
+    from utils.logger import AuditLog
+
+    # A burst of joins raises a lockdown alert in the audit channel
+    bot.audit = AuditLog(bot)
+    cog = Onboarding(bot)
+    await bot.add_cog(cog)
+    guild, members = populate(bot, count)
+    await paced(members, rate, lambda member: gateway.dispatch("member_join", member))
+    # Rules DMs go out through the throttled onboarding queue
+    await cog.dm_queue.join()
+
+    def accept(member):
+        session = cog.sessions.store.get(member_key(member.guild.id, member.id))
+        return gateway.dispatch("raw_reaction_add", FakePayload(session["message_id"], member.id, ACCEPT_EMOJI)) if session else []
+
+    await paced(members, rate, accept)
+
+    def reply(member):
+        return gateway.dispatch("message", FakeMessage(bot.http, member.dm_channel, member, f"Tag{member.id % 10000}", guild=None))
+
+    await paced(members, rate, reply)
+    await bot.audit.close()
+    return count * 3
+
+
+async def raid(bot, gateway, count=2000, rate=0):
+    """A burst of ``count`` fresh raid accounts joining, with established members (one in eleven) mixed in."""
+    from cogs.onboarding import Onboarding
+    from utils.logger import AuditLog
+
+    bot.audit = AuditLog(bot)
+    cog = Onboarding(bot)
+    await bot.add_cog(cog)
+    guild = FakeGuild(bot.http)
+    bot.guilds.append(guild)
+    joiners, legitimate = [], []
+    for i in range(count + count // 10):
+        if i % 11 == 0:
+            member = FakeMember(bot.http, guild, f"member{i}")
+            legitimate.append(member)
+        else:
+            # Registered together a few hours ago, default avatar
+            member = FakeMember(bot.http, guild, f"raider{i}", account_age=timedelta(hours=20), avatar=None)
+        guild.add_member(member)
+        bot.users_by_id[member.id] = member
+        joiners.append(member)
+
+    start = time.perf_counter()
+    await paced(joiners, rate, lambda member: gateway.dispatch("member_join", member))
+    while any((guild.id, member.id) not in cog.sessions for member in legitimate):
+        await asyncio.sleep(0.05)
+    legitimate_done = time.perf_counter() - start
+    await cog.dm_queue.join()
+    raiders_messaged = len(cog.sessions) - len(legitimate)
+    await bot.audit.close()
+    return len(joiners), {
+        "legitimate_onboarded_s": round(legitimate_done, 2),
+        "held": len(cog.held.get(guild.id, {})),
+        "raiders_messaged": raiders_messaged,
+        "lockdown": cog.raid.in_lockdown(guild.id),
+    }
+
+
+async def interactions(bot, gateway, count=1000, rate=0):
+    """Users run /ping, /userinfo, /serverinfo, /status and /help."""
+    from commands.user_commands import UserCommands
+    from utils.metrics import Metrics
+
+    bot.metrics = Metrics()
+    await bot.add_cog(UserCommands(bot))
+    guild, members = populate(bot, max(10, count // 10))
+    names = ["ping", "userinfo", "serverinfo", "status", "help"]
+    calls = [(random.choice(names), random.choice(members)) for _ in range(count)]
+    await paced(calls, rate, lambda call: [gateway.invoke(bot.tree.commands[call[0]], FakeInteraction(bot, call[1], call[0]))])
+    return count
+
+
+async def moderation(bot, gateway, count=1000, rate=0):
+    """Moderators issue /warn and /warnings against random members."""
+    from commands.admin_commands import AdminCommands
+    from utils.logger import AuditLog
+
+    bot.audit = AuditLog(bot)
+    cog = AdminCommands(bot)
+    await bot.add_cog(cog)
+    guild, members = populate(bot, max(10, count // 5))
+    moderator = members[0]
+
+    def command(target):
+        name = random.choice(["warn", "warnings"])
+        return [gateway.invoke(getattr(cog, name), FakeInteraction(bot, moderator, name), target)]
+
+    await paced([random.choice(members[1:]) for _ in range(count)], rate, command)
+    await bot.audit.close()
+    return count
+
+
+async def chatter(bot, gateway, count=5000, rate=0):
+    """Ordinary guild messages and reactions reaching every loaded cog."""
+    from cogs.flag_bot import FlagBot
+    from cogs.onboarding import Onboarding
+
+    await bot.add_cog(Onboarding(bot))
+    await bot.add_cog(FlagBot(bot))
+    guild, members = populate(bot, 100)
+    channel = guild.text_channels[0]
+
+    def event(i):
+        author = members[i % len(members)]
+        if i % 4 == 0:
+            payload = FakePayload(i, author.id, "👍")
+            payload.guild_id = guild.id
+            return gateway.dispatch("raw_reaction_add", payload)
+        return gateway.dispatch("message", FakeMessage(bot.http, channel, author, f"message {i}"))
+
+    await paced(range(count), rate, event)
+    return count
+
+
+async def clear_roles(bot, gateway, count=1000, rate=0):
+    """/clear_roles on a role held by ``count`` members."""
+    from commands.admin_commands import AdminCommands
+    from utils.logger import AuditLog
+
+    bot.audit = AuditLog(bot)
+    cog = AdminCommands(bot)
+    cog.role_jobs.rate = bot.http.route_rate
+    cog.role_jobs.per = bot.http.route_per
+    await bot.add_cog(cog)
+    guild = FakeGuild(bot.http)
+    bot.guilds.append(guild)
+    role = guild.role("Member")
+    guild, members = populate(bot, count, role=role)
+    await asyncio.gather(*[gateway.invoke(cog.clear_roles, FakeInteraction(bot, members[0], "clear_roles"), role)])
+    await bot.audit.close()
+    return count
+
+
+SCENARIOS = {
+    "joins": joins,
+    "raid": raid,
+    "interactions": interactions,
+    "moderation": moderation,
+    "chatter": chatter,
+    "clear_roles": clear_roles,
+}
+
+
+async def main(args):
+    rest_options = {
+        "latency": args.latency,
+        "route_rate": args.route_rate,
+        "route_per": args.route_per,
+        "global_rate": args.global_rate,
+        "global_per": 1.0,
+    }
+    previous = previous_results()
+    with Sandbox():
+        for name in args.scenarios or SCENARIOS:
+            options = {"rate": args.rate}
+            if args.count:
+                options["count"] = args.count
+            result = await run_scenario(name, SCENARIOS[name], rest_options, **options)
+            key = (name, json.dumps(result["options"], sort_keys=True))
+            print_result(result, compare(result, previous.get(key)))
+            if not args.no_save:
+                save_result(result)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenarios", nargs="*", help=f"scenarios to run (default: all of {', '.join(SCENARIOS)})")
+    parser.add_argument("--count", type=int, help="operations per scenario")
+    parser.add_argument("--rate", type=float, default=0, help="events per second (0 = as fast as possible)")
+    parser.add_argument("--latency", type=float, default=0.01, help="simulated REST round-trip in seconds")
+    parser.add_argument("--route-rate", type=int, default=50, help="requests per route bucket window")
+    parser.add_argument("--route-per", type=float, default=1.0, help="route bucket window in seconds")
+    parser.add_argument("--global-rate", type=int, default=50, help="global requests per second")
+    parser.add_argument("--no-save", action="store_true", help="don't append results to results.jsonl")
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    asyncio.run(main(args))
@@ -0,0 +1,69 @@
+"""Per-command latency of /warn against a warnings file of growing size.
+
+Compares the old read-modify-write of the whole JSON file with the
+in-memory JsonStore. Run with ``python -m benchmarks.warnings_store``.
+"""
+import asyncio
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from utils.storage import JsonStore
+
+SIZES = [100, 1_000, 10_000, 100_000]
+COMMANDS = 200
+
+
+def seed_file(path, size):
+    with open(path, "w") as f:
+        json.dump({str(user_id): random.randint(1, 2) for user_id in range(size)}, f)
+
+
+def warn_full_rewrite(path, user_id):
+    with open(path, "r") as f:
+        warnings = json.load(f)
+    warnings[user_id] = warnings.get(user_id, 0) + 1
+    with open(path, "w") as f:
+        json.dump(warnings, f)
+
+
+async def warn_store(store, user_id):
+    async with store.lock:
+        store.set(user_id, store.get(user_id, 0) + 1)
+
+
+async def run_size(directory, size):
+    path = os.path.join(directory, f"warnings_{size}.json")
+    seed_file(path, size)
+    targets = [str(random.randrange(size)) for _ in range(COMMANDS)]
+
+    baseline = []
+    for user_id in targets:
+        start = time.perf_counter()
+        warn_full_rewrite(path, user_id)
+        baseline.append(time.perf_counter() - start)
+
+    store = JsonStore(path, flush_delay=0.05)
+    latencies = []
+    for user_id in targets:
+        start = time.perf_counter()
+        await warn_store(store, user_id)
+        latencies.append(time.perf_counter() - start)
+    await store.close()
+
+    return statistics.median(baseline), statistics.median(latencies)
+
+
+async def main():
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{'users':>8} {'full rewrite':>14} {'store':>10}")
+        for size in SIZES:
+            baseline, store = await run_size(directory, size)
+            print(f"{size:>8} {baseline * 1e6:>12.1f}us {store * 1e6:>8.1f}us")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,9 +1,23 @@
+import time
+LAUNCH_TIME = time.perf_counter()  # Taken before the heavy imports so launch-to-ready is honest
+
 import discord
+from discord import app_commands
 from discord.ext import commands
 import logging
 import asyncio
+import os
 from dotenv import load_dotenv
-from config import DISCORD_TOKEN, GUILD_ID
+from config import (DISCORD_TOKEN, GUILD_ID, MEMBER_CACHE_MODE, MEMBER_CACHE_SIZE, SHARD_COUNT, SHARD_IDS,
+                    CLUSTER_ID, CLUSTER_COUNT, IDENTIFY_CONCURRENCY, SYNC_COMMANDS, GuildConfig)
+from utils.checks import setup_permissions
+from utils.logger import AuditLog
+from utils.metrics import InstrumentedBot, instrument
+from utils.command_sync import CommandSyncer
+from utils.member_cache import member_cache_options, setup_member_cache
+from utils.sharding import wait_for_identify, write_status
+from utils.role_snapshots import setup_role_snapshots
+from utils.outbound import GLOBAL_RATE, OutboundScheduler
 
 # Load environment variables
 load_dotenv()
@@ -13,62 +27,136 @@ intents = discord.Intents.default()
 intents.members = True
 intents.message_content = True
 
-# Initialize bot
-bot = commands.Bot(command_prefix="/", intents=intents)
+class RogueLegionBot(InstrumentedBot):
+    # Runs once before connecting, so reconnects never reload or resync
+    async def setup_hook(self):
+        await super().setup_hook()
+        await self.role_snapshots.load()
+        self.logger.info("🔄 Loading cogs and commands...")
+        await load_extensions()
+        await sync_commands()
+        self.status_report = asyncio.create_task(report_status())
+
+    async def close(self):
+        # Queued audit posts go out first, while the connection and the outbound queue still run
+        await self.audit.close()
+        await super().close()
+        self.outbound.stop()
+        await self.role_snapshots.close()
+
+    # Shards started by other launcher processes take turns identifying through a lock file
+    async def before_identify_hook(self, shard_id, *, initial=False):
+        if not await wait_for_identify(shard_id, IDENTIFY_CONCURRENCY):
+            await super().before_identify_hook(shard_id, initial=initial)
+
+# Initialize bot (commands and listeners are timed, see /status and /metrics)
+# Without SHARD_COUNT/SHARD_IDS every shard runs here; launcher.py splits them over processes
+bot = RogueLegionBot(command_prefix="/", intents=intents, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS,
+                     **member_cache_options(MEMBER_CACHE_MODE))
 bot.remove_command("help")
+instrument(bot)
 
 # Logger (optional but recommended)
 logging.basicConfig(level=logging.INFO)
 bot.logger = logging.getLogger("bot")
 
-# Track sync state
-has_synced = False
+# Per-guild settings from data/guild_config.json, looked up by guild ID
+bot.guild_config = GuildConfig()
+
+# REST calls from every cog go out through one prioritized queue: moderation first, bulk jobs last.
+# Every launcher process shares the token's global rate limit, so each gets its share of it
+bot.outbound = OutboundScheduler(bot.metrics, rate=GLOBAL_RATE / CLUSTER_COUNT)
+
+# Moderator actions are queued here and written/posted in the background
+bot.audit = AuditLog(bot)
+
+# Privileged role index used by the @is_privileged() command check
+setup_permissions(bot)
+
+# Member lookups with REST fallbacks for when the member cache is trimmed
+setup_member_cache(bot, MEMBER_CACHE_MODE, MEMBER_CACHE_SIZE)
+
+# Members' last known roles, journaled as diffs, for /restore_role and /restore_roles
+setup_role_snapshots(bot)
+
+@bot.tree.error
+async def on_app_command_error(interaction, error):
+    bot.metrics.command_finished(interaction, interaction.command, failed=True)
+    if isinstance(error, app_commands.CheckFailure):
+        message = "❌ You don't have permission."
+    else:
+        bot.logger.error(f"❌ Command {interaction.command and interaction.command.name} failed: {error}")
+        message = f"❌ Error: {error}"
+    if interaction.response.is_done():
+        await interaction.followup.send(message, ephemeral=True)
+    else:
+        await interaction.response.send_message(message, ephemeral=True)
+
+# Command sync is skipped when the command tree is unchanged since the last sync
+bot.syncer = CommandSyncer(bot.tree)
 
 @bot.event
 async def on_ready():
-    global has_synced
+    bot.logger.info(f"✅ Logged in as {bot.user} (ID: {bot.user.id}), shards {sorted(bot.shards)} of {bot.shard_count}, {len(bot.guilds)} guilds")
+    bot.logger.info(f"⏱️ Ready {time.perf_counter() - LAUNCH_TIME:.2f}s after launch")
+    await bot.change_presence(activity=discord.Game(name="Serving Rogue Legion"))
 
-    bot.logger.info(f"✅ Logged in as {bot.user} (ID: {bot.user.id})")
+@bot.event
+async def on_shard_ready(shard_id):
+    bot.logger.info(f"✅ Shard {shard_id} ready")
 
-    if not has_synced:
-        bot.logger.info("🔄 Loading cogs and commands...")
-        await load_extensions()
+async def report_status():
+    # Read by launcher.py to show how each process is doing
+    while True:
+        await bot.wait_until_ready()
+        status = {
+            "cluster": CLUSTER_ID,
+            "pid": os.getpid(),
+            # Latency is infinite until a shard's first heartbeat
+            "shards": {str(shard_id): round(shard.latency * 1000) if shard.latency < float("inf") else None
+                       for shard_id, shard in bot.shards.items()},
+            "guilds": len(bot.guilds),
+            "updated": time.time(),
+        }
+        await asyncio.to_thread(write_status, CLUSTER_ID, status)
+        await asyncio.sleep(30)
 
-        bot.logger.info("🔄 Syncing slash commands...")
+async def sync_commands():
+    # Only one process syncs when the shards are spread over several
+    if not SYNC_COMMANDS:
+        return
+    scopes = [None, discord.Object(id=GUILD_ID)] if GUILD_ID else [None]
+    for guild in scopes:
+        scope = f"guild {guild.id}" if guild else "global"
         try:
-            synced = await bot.tree.sync(guild=discord.Object(id=GUILD_ID))
-            bot.logger.info(f"✅ Synced {len(synced)} slash commands to guild {GUILD_ID}")
-            has_synced = True
+            synced = await bot.syncer.sync(guild=guild)
+            if synced is None:
+                bot.logger.info(f"✅ Slash commands unchanged ({scope}), skipping sync")
+            else:
+                bot.logger.info(f"✅ Synced {len(synced)} slash commands ({scope})")
         except Exception as e:
-            bot.logger.error(f"❌ Failed to sync commands: {e}")
+            bot.logger.error(f"❌ Failed to sync commands ({scope}): {e}")
 
-    await bot.change_presence(activity=discord.Game(name="Serving Rogue Legion"))
+async def load_extension(ext):
+    try:
+        await bot.load_extension(ext)
+        bot.logger.info(f"✅ Loaded: {ext}")
+    except Exception as e:
+        bot.logger.error(f"❌ Failed to load {ext}: {e}")
 
 async def load_extensions():
-    # Load static cogs
-    static_cogs = [
+    extensions = [
+        # Static cogs
         "cogs.onboarding",
-        "cogs.flag_bot"
-    ]
-    for ext in static_cogs:
-        try:
-            await bot.load_extension(ext)
-            bot.logger.info(f"✅ Loaded: {ext}")
-        except Exception as e:
-            bot.logger.error(f"❌ Failed to load {ext}: {e}")
-
-    # Load dynamic command groups (admin, user)
-    command_groups = [
+        "cogs.flag_bot",
+        # Command groups (admin, user)
         "commands.admin_commands",
-        "commands.user_commands"  # Add if necessary
+        "commands.user_commands",
     ]
-    
-    for group in command_groups:
-        try:
-            await bot.load_extension(group)
-            bot.logger.info(f"✅ Loaded: {group}")
-        except Exception as e:
-            bot.logger.error(f"❌ Failed to load {group}: {e}")
+    # One after another: importing them is CPU-bound on the loop, and neither gathering the loads nor
+    # importing in worker threads first made setup_hook any faster
+    for ext in extensions:
+        await load_extension(ext)
 
 # Run the bot
 bot.run(DISCORD_TOKEN)
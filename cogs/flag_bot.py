@@ -1 +1,155 @@
+import discord
+from discord.ext import commands, tasks
+import re
+import time
+from utils.helpers import content_cache
+from utils.logger import ChannelBatcher
+from utils.ratelimit import SlidingCounter
 
+TERMS_FILE = "data/banned_terms.txt"
+FLAG_CHANNEL_NAME = "mod-reports"
+
+# Defaults, overridable per guild in data/guild_config.json
+SPAM_LIMIT = 8        # messages...
+SPAM_WINDOW = 10      # ...per this many seconds
+MENTION_LIMIT = 10    # user/role mentions (@everyone counts as 5)...
+MENTION_WINDOW = 30   # ...per this many seconds
+EVERYONE_WEIGHT = 5
+
+# Counters of users quiet for this long are dropped (longer than any sensible window)
+IDLE_AFTER = 600
+
+# Reports are posted every 5 seconds at most, one embed per guild
+REPORT_WINDOW = 5.0
+EXCERPT_LENGTH = 200
+
+# Common character swaps, undone before matching ("fr33 n1tro" -> "free nitro")
+NORMALIZE = str.maketrans("013457@$!", "oieastasi")
+
+
+def normalize(text):
+    return text.lower().translate(NORMALIZE)
+
+
+def _trie_pattern(node):
+    end = "" in node
+    branches = [re.escape(char) + _trie_pattern(child) for char, child in sorted(node.items()) if char]
+    if not branches:
+        return ""
+    if len(branches) == 1 and not end:
+        return branches[0]
+    return "(?:" + "|".join(branches) + ")" + ("?" if end else "")
+
+
+def compile_terms(text):
+    """One regex for every term in ``text`` (one per line, # for comments).
+
+    The terms are merged into a trie first, so the alternation branches on
+    one character at a time and a scan costs about the length of the message
+    no matter how many terms there are. Runs in a worker thread on reload.
+    """
+    trie = {}
+    for line in text.splitlines():
+        term = normalize(line.split("#", 1)[0].strip())
+        if not term:
+            continue
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node[""] = {}
+    if not trie:
+        return None
+    # Whole words only, so "class" doesn't match "ass"
+    return re.compile(r"(?<!\w)" + _trie_pattern(trie) + r"(?!\w)")
+
+
+class FlagEngine:
+    """Decides whether a message should be flagged: banned terms, spam and mention floods.
+
+    ``check`` takes plain values so it can run without Discord objects; the
+    banned-term regex comes from ``matcher()``, which returns whatever the
+    last reload compiled.
+    """
+
+    def __init__(self, guild_config, matcher):
+        self.guild_config = guild_config
+        self.matcher = matcher
+        self.messages = SlidingCounter()
+        self.mentions = SlidingCounter()
+        # A user flagged for spam or mentions isn't flagged again until this time
+        self.quiet_until = {}
+
+    def check(self, guild_id, user_id, content, mentions, now):
+        reasons = []
+        pattern = self.matcher()
+        if pattern is not None and content:
+            match = pattern.search(normalize(content))
+            if match:
+                reasons.append(f"banned term `{match.group()}`")
+
+        key = (guild_id, user_id)
+        config = self.guild_config
+        spam_window = config.get(guild_id, "spam_window", SPAM_WINDOW)
+        sent = self.messages.add(key, now, spam_window)
+        if sent > config.get(guild_id, "spam_limit", SPAM_LIMIT) and self._notify(key, now, spam_window):
+            reasons.append(f"spam ({sent} messages in {spam_window}s)")
+        if mentions:
+            mention_window = config.get(guild_id, "mention_window", MENTION_WINDOW)
+            mentioned = self.mentions.add(key, now, mention_window, mentions)
+            if mentioned > config.get(guild_id, "mention_limit", MENTION_LIMIT) and self._notify(key, now, mention_window):
+                reasons.append(f"mention flood ({mentioned} mentions in {mention_window}s)")
+        return reasons
+
+    def _notify(self, key, now, window):
+        if self.quiet_until.get(key, 0) > now:
+            return False
+        self.quiet_until[key] = now + window
+        return True
+
+    def prune(self, now):
+        self.messages.prune(now, IDLE_AFTER)
+        self.mentions.prune(now, IDLE_AFTER)
+        for key in [key for key, until in self.quiet_until.items() if until <= now]:
+            del self.quiet_until[key]
+
+
+def mention_count(message):
+    return len(message.mentions) + len(message.role_mentions) + (EVERYONE_WEIGHT if message.mention_everyone else 0)
+
+
+# Flagging cog class
+class FlagBot(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.engine = FlagEngine(bot.guild_config, lambda: content_cache.compiled("banned_terms"))
+        self.reports = ChannelBatcher(bot, "flag_channel", FLAG_CHANNEL_NAME, "Flagged messages",
+                                      discord.Color.red(), REPORT_WINDOW)
+
+    async def cog_load(self):
+        # Recompiled off the event loop whenever the file changes
+        await content_cache.preload("banned_terms", TERMS_FILE, compile=compile_terms)
+        self.prune_counters.start()
+
+    async def cog_unload(self):
+        self.prune_counters.cancel()
+        await self.reports.close()
+
+    @commands.Cog.listener()
+    async def on_message(self, message):
+        if message.guild is None or message.author.bot:
+            return
+        reasons = self.engine.check(message.guild.id, message.author.id, message.content,
+                                    mention_count(message), time.monotonic())
+        if not reasons or self.bot.permissions.is_privileged(message.author):
+            return
+        excerpt = discord.utils.escape_markdown(message.content[:EXCERPT_LENGTH].replace("\n", " "))
+        self.reports.add(message.guild.id, f"**{', '.join(reasons)}**: {message.author.mention} in "
+                                           f"{message.channel.mention} ([jump]({message.jump_url}))\n> {excerpt}")
+
+    @tasks.loop(seconds=60)
+    async def prune_counters(self):
+        self.engine.prune(time.monotonic())
+
+# Setup function to load the cog
+async def setup(bot):
+    await bot.add_cog(FlagBot(bot))
@@ -1,94 +1,456 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
+import asyncio
+import itertools
 import json
+import logging
 import os
+import time
 from datetime import datetime
+from config import GUILD_ID, STATE_DIR
+from utils.storage import AppendLog, JsonStore
+from utils.helpers import content_cache
+from utils.outbound import USER
+from utils.raid import RaidDetector, SUSPECTED
+from utils.ratelimit import TokenBucket
 
 # Define paths for data storage
-ONBOARDING_FILE = "data/onboarding.json"
+ONBOARDING_FILE = f"{STATE_DIR}/onboarding.json"  # Legacy whole-file store, imported once into the ledger
+LEDGER_FILE = f"{STATE_DIR}/onboarding.jsonl"
+SESSIONS_FILE = f"{STATE_DIR}/onboarding_sessions.json"
+QUEUE_FILE = f"{STATE_DIR}/onboarding_queue.json"  # Joiners still waiting for their rules DM
+HELD_FILE = f"{STATE_DIR}/onboarding_held.json"  # Joiners held back by a lockdown
 RULES_FILE = "data/rules.txt"
 
-# Function to load onboarding data
-def load_onboarding_data():
-    if os.path.exists(ONBOARDING_FILE):
-        with open(ONBOARDING_FILE, "r") as f:
-            return json.load(f)
-    return {}
+# Each onboarding step has 2 minutes to be answered
+STEP_TIMEOUT = 120.0
+ACCEPT_EMOJI = "✅"
+MEMBER_ROLE_NAME = "Member"
 
-# Function to save onboarding data
-def save_onboarding_data(data):
-    with open(ONBOARDING_FILE, "w") as f:
-        json.dump(data, f, indent=4)
+# Onboardings (rules DMs plus reaction) started per second across all guilds; each costs
+# 3-4 requests, which leaves most of the 50 requests/s global limit for everything else
+ONBOARDING_RATE = 10
+ONBOARDING_WORKERS = 4
 
-# Function to send onboarding message to new member
-async def send_onboarding_message(member):
-    try:
-        # Load the rules from the rules.txt file
-        if not os.path.exists(RULES_FILE):
-            raise FileNotFoundError(f"Rules file not found at {RULES_FILE}")
-        with open(RULES_FILE, 'r') as file:
-            rules = file.read()
+# Session states
+AWAITING_RULES = "awaiting_rules"
+AWAITING_GAMERTAG = "awaiting_gamertag"
 
-        # Send a welcome message along with the rules
-        welcome_message = await member.send(
-            f"Welcome {member.name}! Please review the server rules and guidelines:\n\n{rules}\n\n"
-            "Please react with ✅ if you accept the rules."
-        )
+logger = logging.getLogger("bot")
 
-        # Add a reaction to the message (green check mark)
-        await welcome_message.add_reaction("✅")
 
-        # Define a check to ensure the member reacts with the check mark emoji
-        def check(reaction, user):
-            return user == member and str(reaction.emoji) == "✅" and reaction.message.id == welcome_message.id
+def member_key(guild_id, member_id):
+    return f"{guild_id}:{member_id}"
 
-        # Wait for the member to react with the check mark (timeout of 2 minutes)
-        await member.client.wait_for('reaction_add', check=check, timeout=120.0)
 
-        # After they accept the rules, ask for their gamertag
-        await member.send("Thank you for accepting the rules! Please tell me your gamertag so I can set it as your nickname (max 32 characters).")
+class OnboardingLedger:
+    """Append-only record of completed onboardings with an in-memory index.
 
-        def gamertag_check(msg):
-            return msg.author == member and isinstance(msg.channel, discord.DMChannel)
+    Lookups hit the ``completed`` set of (guild ID, member ID); a completion
+    appends one line to the ledger instead of rewriting every previous entry.
+    Entries written before the bot served several guilds carry no guild ID
+    and belong to the home guild (or to every guild if none is configured).
+    """
 
-        # Wait for the user to send their gamertag (timeout of 2 minutes)
-        gamertag_message = await member.client.wait_for('message', check=gamertag_check, timeout=120.0)
-        gamertag = gamertag_message.content.strip()
+    def __init__(self, path=LEDGER_FILE, legacy_path=ONBOARDING_FILE):
+        self.log = AppendLog(path)
+        self.legacy_path = legacy_path
+        self.completed = set()
 
-        if len(gamertag) > 32:
-            await member.send("Your gamertag is too long. Please contact a moderator to set your nickname manually.")
-        else:
-            # Set the member's nickname
-            await member.edit(nick=gamertag)
+    async def load(self):
+        records = await asyncio.to_thread(self.log.read_all)
+        for record in records:
+            key = (record.get("guild_id", GUILD_ID), record["member_id"])
+            if record.get("completed"):
+                self.completed.add(key)
+            else:
+                self.completed.discard(key)
 
-            # Give the member the "Member" role
-            member_role = discord.utils.get(member.guild.roles, name="Member")
-            if member_role:
-                await member.add_roles(member_role)
+        if not records:
+            await self._import_legacy()
 
-            await member.send(f"Your nickname has been set to **{gamertag}** and you have been given the Member role!")
+    async def _import_legacy(self):
+        legacy = await asyncio.to_thread(self._read_legacy)
+        migrated = [
+            {"member_id": int(member_id), "completed": True, "timestamp": entry.get("timestamp")}
+            for member_id, entry in legacy.items()
+            if entry.get("completed")
+        ]
+        if migrated:
+            await self.log.append(*migrated)
+            self.completed.update((GUILD_ID, record["member_id"]) for record in migrated)
 
-        # Record that the user has completed the onboarding
-        onboarding_data = load_onboarding_data()
-        onboarding_data[str(member.id)] = {"completed": True, "timestamp": str(datetime.utcnow())}
-        save_onboarding_data(onboarding_data)
+    def _read_legacy(self):
+        if os.path.exists(self.legacy_path):
+            with open(self.legacy_path, "r") as f:
+                return json.load(f)
+        return {}
+
+    def is_completed(self, guild_id, member_id):
+        return (guild_id, member_id) in self.completed or (None, member_id) in self.completed
+
+    async def record_completion(self, guild_id, member_id):
+        self.completed.add((guild_id, member_id))
+        await self.log.append({"guild_id": guild_id, "member_id": member_id, "completed": True, "timestamp": str(datetime.utcnow())})
+
+
+class OnboardingSessions:
+    """In-flight onboardings, persisted so a restart resumes them.
+
+    Sessions are keyed by (guild ID, user ID), so a user can onboard in
+    several guilds at once, and additionally indexed by the ID of the rules
+    DM, so an incoming reaction or DM is routed to its session with a dict
+    lookup no matter how many onboardings are pending. A gamertag DM carries
+    no guild; it answers the user's most recently accepted rules.
+    """
+
+    def __init__(self, path=SESSIONS_FILE, timeout=STEP_TIMEOUT):
+        self.store = JsonStore(path)
+        self.timeout = timeout
+        # Sessions saved before they were per guild are keyed by user ID alone
+        for user_id in [key for key in self.store.data if ":" not in key]:
+            session = self.store.data.pop(user_id)
+            self.store.data[member_key(session["guild_id"], user_id)] = session
+        self.by_message = {}
+        self.by_user = {}
+        for key, session in self.store.data.items():
+            guild_id, user_id = map(int, key.split(":"))
+            self.by_message[session["message_id"]] = (guild_id, user_id)
+            self.by_user.setdefault(user_id, set()).add(guild_id)
+
+    def __len__(self):
+        return len(self.store.data)
+
+    def __contains__(self, key):
+        return member_key(*key) in self.store.data
+
+    def start(self, guild_id, user_id, message_id):
+        previous = self.store.get(member_key(guild_id, user_id))
+        if previous is not None:
+            self.by_message.pop(previous["message_id"], None)
+        self.store.set(member_key(guild_id, user_id), {
+            "guild_id": guild_id,
+            "message_id": message_id,
+            "state": AWAITING_RULES,
+            "deadline": time.time() + self.timeout,
+        })
+        self.by_message[message_id] = (guild_id, user_id)
+        self.by_user.setdefault(user_id, set()).add(guild_id)
+
+    def for_reaction(self, message_id, user_id):
+        # Only the member the rules were sent to can accept them
+        key = self.by_message.get(message_id)
+        if key is None or key[1] != user_id:
+            return None
+        return self._active(*key, AWAITING_RULES)
+
+    def for_dm(self, user_id):
+        sessions = [self._active(guild_id, user_id, AWAITING_GAMERTAG) for guild_id in self.by_user.get(user_id, ())]
+        return max(filter(None, sessions), key=lambda session: session["deadline"], default=None)
+
+    def _active(self, guild_id, user_id, state):
+        session = self.store.get(member_key(guild_id, user_id))
+        if session is None or session["state"] != state or session["deadline"] < time.time():
+            return None
+        return session
+
+    def advance(self, guild_id, user_id, state):
+        session = self.store.get(member_key(guild_id, user_id))
+        session["state"] = state
+        session["deadline"] = time.time() + self.timeout
+        self.store.mark_dirty()
+
+    def finish(self, guild_id, user_id):
+        session = self.store.pop(member_key(guild_id, user_id))
+        if session is not None:
+            self.by_message.pop(session["message_id"], None)
+            guild_ids = self.by_user.get(user_id, set())
+            guild_ids.discard(guild_id)
+            if not guild_ids:
+                self.by_user.pop(user_id, None)
+        return session
+
+    def expired(self, now=None):
+        """(guild ID, user ID) of every session whose step timed out."""
+        now = now or time.time()
+        return [tuple(map(int, key.split(":"))) for key, session in self.store.data.items() if session["deadline"] < now]
+
+
+class OnboardingQueue:
+    """Joiners waiting for their rules DM, served in priority order at a bounded rate.
+
+    A join only enqueues the member. Workers take the lowest priority first
+    (established accounts before new ones), skip anyone ``hold(member)``
+    keeps back, and wait for a token before each ``send``, so a burst of
+    joins never turns into a burst of DMs. Who is waiting, with their
+    priority, is persisted so a restart picks the queue back up.
+    """
+
+    def __init__(self, send, hold, rate=ONBOARDING_RATE, per=1.0, workers=ONBOARDING_WORKERS, path=QUEUE_FILE):
+        self.send = send
+        self.hold = hold
+        self.store = JsonStore(path)
+        self.bucket = TokenBucket(rate, per)
+        self.queue = asyncio.PriorityQueue()
+        self.workers = workers
+        self.queued = set()
+        self._ids = itertools.count()
+        self._tasks = []
+
+    def __len__(self):
+        return len(self.queued)
+
+    def put(self, priority, member, check=True):
+        """Queue ``member``; ``check=False`` onboards them even if ``hold`` would keep them back."""
+        key = (member.guild.id, member.id)
+        if key in self.queued:
+            return
+        self.queued.add(key)
+        self.store.set(member_key(*key), [priority, check])
+        self.queue.put_nowait((priority, next(self._ids), member, check))
+
+    def discard(self, guild_id, member_id):
+        # Left before their turn; the worker skips them
+        self.queued.discard((guild_id, member_id))
+        if member_key(guild_id, member_id) in self.store.data:
+            self.store.pop(member_key(guild_id, member_id))
+
+    def saved(self):
+        """(guild ID, member ID, priority, check) of everyone persisted as waiting, in queue order."""
+        entries = []
+        for key, (priority, check) in self.store.data.items():
+            guild_id, member_id = map(int, key.split(":"))
+            entries.append((guild_id, member_id, priority, check))
+        return entries
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def _work(self):
+        while True:
+            priority, _, member, check = await self.queue.get()
+            try:
+                key = (member.guild.id, member.id)
+                if key not in self.queued or (check and self.hold(member)):
+                    continue
+                await self.bucket.acquire()
+                self.discard(*key)
+                await self.send(member)
+            except Exception as e:
+                logger.error(f"❌ Error during onboarding of {member}: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def join(self):
+        await self.queue.join()
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await self.store.close()
+
+
+# Function to send onboarding message to new member
+async def send_onboarding_message(member, sessions, outbound):
+    try:
+        # The rules come pre-split from the content cache
+        rules = content_cache.chunks("rules")
+        if not rules:
+            raise FileNotFoundError(f"Rules file not found at {RULES_FILE}")
+
+        # Send a welcome message along with the rules, split over several DMs if needed
+        messages = [f"Welcome {member.name}! Please review the server rules and guidelines:\n\n{rules[0]}", *rules[1:]]
+        messages[-1] += f"\n\nPlease react with {ACCEPT_EMOJI} if you accept the rules."
+        for text in messages:
+            welcome_message = await outbound.run(USER, f"messages:dm:{member.id}", lambda text=text: member.send(text))
+
+        # Add a reaction to the message (green check mark)
+        await outbound.run(USER, f"reactions:dm:{member.id}", lambda: welcome_message.add_reaction(ACCEPT_EMOJI))
+
+        # The reaction and the gamertag reply are routed back through the cog listeners
+        sessions.start(member.guild.id, member.id, welcome_message.id)
 
     except Exception as e:
-        print(f"Error during onboarding process: {e}")
+        logger.error(f"❌ Error during onboarding of {member}: {e}")
 
 # Onboarding cog class
 class Onboarding(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.ledger = OnboardingLedger()
+        self.sessions = OnboardingSessions()
+        self.raid = RaidDetector(bot.guild_config)
+        self.dm_queue = OnboardingQueue(lambda member: send_onboarding_message(member, self.sessions, bot.outbound),
+                                        self.hold_back)
+        # guild ID -> {member ID: member} kept back from onboarding during a lockdown, persisted by key
+        self.held = {}
+        self.held_store = JsonStore(HELD_FILE)
+        self._restore_task = None
+
+    async def cog_load(self):
+        await self.ledger.load()
+        # Leave room for the welcome header and the acceptance prompt
+        await content_cache.preload("rules", RULES_FILE, reserve=200)
+        self.dm_queue.start()
+        self.expire_sessions.start()
+        if self.dm_queue.store.data or self.held_store.data:
+            self._restore_task = asyncio.create_task(self.restore_pending())
+
+    async def cog_unload(self):
+        self.expire_sessions.cancel()
+        if self._restore_task is not None:
+            self._restore_task.cancel()
+        await self.dm_queue.close()
+        await self.held_store.close()
+        await self.sessions.store.close()
+
+    async def restore_pending(self):
+        """Requeue the joiners and re-hold the members a restart interrupted, once their guilds are available."""
+        await self.bot.wait_until_ready()
+        held = [tuple(map(int, key.split(":"))) for key in self.held_store.data]
+        restored = 0
+        for guild_id, member_id, priority, check in self.dm_queue.saved():
+            member = await self._resolve(guild_id, member_id)
+            if member is None:
+                self.dm_queue.discard(guild_id, member_id)
+                continue
+            self.dm_queue.put(priority, member, check)
+            restored += 1
+        for guild_id, member_id in held:
+            member = await self._resolve(guild_id, member_id)
+            if member is None:
+                self.held_store.pop(member_key(guild_id, member_id))
+                continue
+            self.held.setdefault(guild_id, {})[member_id] = member
+            restored += 1
+        self.bot.logger.info(f"✅ Restored {restored} pending onboardings and held members")
+
+    async def _resolve(self, guild_id, member_id):
+        guild = self.bot.get_guild(guild_id)
+        if guild is None:
+            return None
+        try:
+            return await self.bot.member_cache.get(guild, member_id)
+        except discord.HTTPException as e:
+            self.bot.logger.error(f"❌ Could not fetch member {member_id} of {guild_id} to resume onboarding: {e}")
+            return None
+
+    async def dm(self, user, text):
+        return await self.bot.outbound.run(USER, f"messages:dm:{user.id}", lambda: user.send(text))
+
+    def alert(self, guild_id, text):
+        # Raid alerts go to the guild's audit channel
+        self.bot.audit.add(guild_id, text)
+
+    def hold_back(self, member):
+        """During a lockdown, park suspected raid accounts instead of DMing them."""
+        if not self.raid.in_lockdown(member.guild.id) or self.raid.priority(member, discord.utils.utcnow()) != SUSPECTED:
+            return False
+        self.held.setdefault(member.guild.id, {})[member.id] = member
+        self.held_store.set(member_key(member.guild.id, member.id), True)
+        self.dm_queue.discard(member.guild.id, member.id)
+        return True
+
+    def start_lockdown(self, guild_id, reason="manual"):
+        self.raid.start(guild_id, time.monotonic(), reason)
+
+    def end_lockdown(self, guild_id):
+        return self.raid.lift(guild_id)
+
+    def release_held(self, guild_id):
+        """Queue every held member of the guild for onboarding; returns how many."""
+        held = self.held.pop(guild_id, {})
+        for member in held.values():
+            self.held_store.pop(member_key(guild_id, member.id))
+            self.dm_queue.put(SUSPECTED, member, check=False)
+        return len(held)
+
+    def take_held(self, guild_id):
+        held = list(self.held.pop(guild_id, {}))
+        for member_id in held:
+            self.held_store.pop(member_key(guild_id, member_id))
+        return held
 
     @commands.Cog.listener()
     async def on_member_join(self, member):
         # Check if the member has already completed onboarding
-        onboarding_data = load_onboarding_data()
-        if str(member.id) not in onboarding_data or not onboarding_data[str(member.id)]["completed"]:
-            await send_onboarding_message(member)
+        if self.ledger.is_completed(member.guild.id, member.id) or (member.guild.id, member.id) in self.sessions:
+            return
+        lockdown = self.raid.observe(member, time.monotonic())
+        if lockdown:
+            self.alert(member.guild.id, f"🚨 **Lockdown**: {lockdown['reason']}. Suspected raid accounts are held back "
+                                        f"from onboarding; see /lockdown.")
+        self.dm_queue.put(self.raid.priority(member, discord.utils.utcnow()), member)
+
+    @commands.Cog.listener()
+    async def on_raw_member_remove(self, payload):
+        self.dm_queue.discard(payload.guild_id, payload.user.id)
+        if self.held.get(payload.guild_id, {}).pop(payload.user.id, None) is not None:
+            self.held_store.pop(member_key(payload.guild_id, payload.user.id))
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_add(self, payload):
+        # Rules are accepted in DMs, which carry no guild ID
+        if payload.guild_id is not None or str(payload.emoji) != ACCEPT_EMOJI:
+            return
+        session = self.sessions.for_reaction(payload.message_id, payload.user_id)
+        if not session:
+            return
+
+        try:
+            self.sessions.advance(session["guild_id"], payload.user_id, AWAITING_GAMERTAG)
+            user = self.bot.get_user(payload.user_id) or await self.bot.fetch_user(payload.user_id)
+            # After they accept the rules, ask for their gamertag
+            await self.dm(user, "Thank you for accepting the rules! Please tell me your gamertag so I can set it as your nickname (max 32 characters).")
+        except Exception as e:
+            self.bot.logger.error(f"❌ Error during onboarding of {payload.user_id}: {e}")
+
+    @commands.Cog.listener()
+    async def on_message(self, message):
+        if message.guild is not None or message.author.bot:
+            return
+        session = self.sessions.for_dm(message.author.id)
+        if not session:
+            return
+
+        self.sessions.finish(session["guild_id"], message.author.id)
+        try:
+            await self.complete_onboarding(message, session)
+        except Exception as e:
+            self.bot.logger.error(f"❌ Error during onboarding of {message.author}: {e}")
+
+    async def complete_onboarding(self, message, session):
+        gamertag = message.content.strip()
+        if len(gamertag) > 32:
+            await self.dm(message.author, "Your gamertag is too long. Please contact a moderator to set your nickname manually.")
+        else:
+            guild = self.bot.get_guild(session["guild_id"])
+            member = await self.bot.member_cache.get(guild, message.author.id)
+
+            # Set the member's nickname
+            await self.bot.outbound.run(USER, f"members:{guild.id}", lambda: member.edit(nick=gamertag))
+
+            # Give the member the "Member" role (or the guild's configured one)
+            role_name = self.bot.guild_config.get(guild.id, "member_role", MEMBER_ROLE_NAME)
+            member_role = discord.utils.get(guild.roles, name=role_name)
+            if member_role:
+                await self.bot.outbound.run(USER, f"members:{guild.id}", lambda: member.add_roles(member_role))
+
+            await self.dm(member, f"Your nickname has been set to **{gamertag}** and you have been given the {role_name} role!")
+
+        # Record that the user has completed the onboarding
+        await self.ledger.record_completion(session["guild_id"], message.author.id)
+
+    @tasks.loop(seconds=30)
+    async def expire_sessions(self):
+        # Members who let a step time out simply drop out, as before
+        for guild_id, user_id in self.sessions.expired():
+            self.sessions.finish(guild_id, user_id)
+        for guild_id in self.raid.expired(time.monotonic()):
+            held = len(self.held.get(guild_id, {}))
+            self.alert(guild_id, f"✅ **Lockdown lifted** after a quiet period. {held} held members await "
+                                 f"/lockdown release or kick.")
 
 # Setup function to load the cog
 async def setup(bot):
     await bot.add_cog(Onboarding(bot))
-
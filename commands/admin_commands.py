@@ -1,210 +1,520 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-import logging
-import json
+import re
 from datetime import timedelta
-from config import GUILD_ID
-
-logging.basicConfig(level=logging.INFO, filename="data/logs/admin_actions.log",
-                    format='%(asctime)s - %(levelname)s - %(message)s')
+from config import GUILD_ID, STATE_DIR
+from utils.storage import JsonStore
+from utils.bulk_roles import BulkRoleEngine, CANCELLED, DONE
+from utils.purge import build_filter, purge_channel
+from utils.helpers import content_cache, parse_duration
+from utils.moderation_timers import ModerationTimers
+from utils.checks import is_privileged
+from utils.role_snapshots import restorable_roles
+from utils.outbound import INTERACTION, BACKGROUND, BULK
+from utils.case_log import ACTIONS, CaseLog
+
+WARNINGS_FILE = f"{STATE_DIR}/warnings.json"
+
+
+# Bulk role job verbs by action: (in progress, finished)
+JOB_VERBS = {"add": ("Adding", "Added"), "remove": ("Removing", "Removed"), "restore": ("Restoring", "Restored"),
+             "kick": ("Kicking", "Kicked")}
+RESTORE_LABEL = "previous roles"
+# Labels for jobs that aren't about a single role
+JOB_LABELS = {"restore": RESTORE_LABEL, "kick": "held raid accounts"}
+# Case log action of each bulk role job
+JOB_CASES = {"add": "add_roles", "remove": "clear_roles", "restore": "restore_roles", "kick": "lockdown_kick"}
+LOCKDOWN_ACTIONS = ("status", "on", "off", "release", "kick")
+MODLOG_PAGE_SIZE = 10
+MODLOG_REASON_CHARS = 150
+USER_ID = re.compile(r"\d{15,20}")
+
+
+def warning_key(guild_id, user_id):
+    # Warnings are counted per guild
+    return f"{guild_id}:{user_id}"
 
 
 class AdminCommands(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
         self.tree = bot.tree
-        self.guild = discord.Object(id=GUILD_ID)
+        # Registered in the home guild when one is configured, globally otherwise
+        self.guild = discord.Object(id=GUILD_ID) if GUILD_ID else None
+        self.warning_store = JsonStore(WARNINGS_FILE)
+        self.cases = CaseLog()
+        self.role_jobs = BulkRoleEngine(self.apply_role_edit)
+        self.timers = ModerationTimers({
+            "warning_expiry": self.expire_warning,
+            "unban": self.scheduled_unban,
+            "restore_role": self.scheduled_role_restore,
+        })
 
         self.tree.command(name="purge", description="Delete a specified number of messages.", guild=self.guild)(self.purge)
-        self.tree.command(name="sync", description="Sync commands to this guild.", guild=self.guild)(self.sync)
+        self.tree.command(name="sync", description="Sync commands to this guild if they changed.", guild=self.guild)(self.sync)
         self.tree.command(name="clear_roles", description="Clear a role from all members.", guild=self.guild)(self.clear_roles)
+        self.tree.command(name="add_roles", description="Give a role to all members, optionally only those holding another role.", guild=self.guild)(self.add_roles)
+        self.tree.command(name="cancel_role_job", description="Cancel a running bulk role job.", guild=self.guild)(self.cancel_role_job)
+        self.tree.command(name="resume_role_job", description="Resume a cancelled or interrupted bulk role job.", guild=self.guild)(self.resume_role_job)
         self.tree.command(name="ban", description="Ban a user from the server.", guild=self.guild)(self.ban)
+        self.tree.command(name="tempban", description="Ban a user for a duration (e.g., 7d); they are unbanned automatically.", guild=self.guild)(self.tempban)
+        self.tree.command(name="strip_role", description="Remove a role from a member for a duration (e.g., 1d 12h), then give it back.", guild=self.guild)(self.strip_role)
         self.tree.command(name="timeout", description="Put a user in timeout for a duration (e.g., 1d 2h 30m).", guild=self.guild)(self.timeout)
         self.tree.command(name="clear_timeout", description="Remove the timeout from a user.", guild=self.guild)(self.clear_timeout)
         self.tree.command(name="kick", description="Kick a user from the server.", guild=self.guild)(self.kick)
         self.tree.command(name="warn", description="Warn a user and track the warnings.", guild=self.guild)(self.warn)
         self.tree.command(name="warnings", description="Check the warning count of a user.", guild=self.guild)(self.warnings)
         self.tree.command(name="remove_warning", description="Remove a specified number of warnings from a user.", guild=self.guild)(self.remove_warning)
-        self.tree.command(name="restore_role", description="Restore a user's role based on their previous rank.", guild=self.guild)(self.restore_role)
+        self.tree.command(name="restore_role", description="Give a returning user back the roles they last had.", guild=self.guild)(self.restore_role)
+        self.tree.command(name="restore_roles", description="Give several returning users (mentions or IDs) back their last roles.", guild=self.guild)(self.restore_roles)
         self.tree.command(name="unban", description="Unban a user from the server.", guild=self.guild)(self.unban)
+        self.tree.command(name="lockdown", description="Raid lockdown: status, on, off, release or kick the held joiners.", guild=self.guild)(self.lockdown)
+        self.tree.command(name="modlog", description="Search moderation cases by user, moderator, action and age.", guild=self.guild)(self.modlog)
+        self.tree.command(name="metrics", description="Show per-command latency, errors and rate limits.", guild=self.guild)(self.metrics)
         self.tree.command(name="adminhelp", description="Get a list of admin commands and their usage.", guild=self.guild)(self.adminhelp)
 
-    async def has_admin_permissions(self, interaction):
-        roles = [role.name.lower() for role in interaction.user.roles]
-        return any(role in ['admin', 'moderator', 'founder'] for role in roles)
-
-    async def log_action(self, action: str, user: discord.User, reason: str = ""):
-        logging.info(f"Action: {action} - User: {user} - Reason: {reason}")
-        channel = discord.utils.get(user.guild.text_channels, name="leave-messages")
-        if channel:
-            await channel.send(f"**{action}**: {user} | Reason: {reason}")
+    async def cog_load(self):
+        await content_cache.preload("admincommands", "data/admincommands.txt", wrap="```")
+        self.migrate_warnings()
+        await self.timers.load()
+        await self.cases.load()
 
-    async def purge(self, interaction):
-        if not await self.has_admin_permissions(interaction):
-            await interaction.response.send_message("❌ You don't have permission.", ephemeral=True)
+    def migrate_warnings(self):
+        # Counts stored before warnings were per guild are keyed by user ID alone and belong to the home guild
+        if GUILD_ID is None:
+            return
+        legacy = [key for key in self.warning_store.data if ":" not in key]
+        for key in legacy:
+            self.warning_store.set(warning_key(GUILD_ID, key), self.warning_store.pop(key))
+
+    async def cog_unload(self):
+        await self.timers.close()
+        await self.role_jobs.close()
+        await self.warning_store.close()
+        await self.cases.close()
+
+    async def moderate(self, interaction, route, factory):
+        # A moderator is waiting on the response, so this jumps every queued bulk and background call
+        return await self.bot.outbound.run(INTERACTION, f"{route}:{interaction.guild.id}", factory)
+
+    def open_case(self, interaction, action, target=None, reason=""):
+        # Every moderation action gets a numbered case, searchable with /modlog
+        case_id = self.cases.record(interaction.guild.id, action, interaction.user.id, target.id if target else None, reason)
+        return f"Case #{case_id}"
+
+    def log_action(self, action: str, user: discord.User, reason: str = ""):
+        # Enqueued only; the audit pipeline writes the file and posts the embed in the background
+        self.bot.audit.record(user.guild, action, user, reason)
+
+    @is_privileged()
+    async def purge(self, interaction, amount: int = 100, user: discord.User = None, within_hours: int = None,
+                    pattern: str = None, attachments_only: bool = False):
+        if amount < 1:
+            await interaction.response.send_message("❌ Amount must be at least 1.", ephemeral=True)
+            return
+        try:
+            check = build_filter(
+                author_id=user.id if user else None,
+                pattern=pattern,
+                attachments_only=attachments_only,
+            )
+        except re.error as e:
+            await interaction.response.send_message(f"❌ Invalid pattern: {e}", ephemeral=True)
             return
+
+        since = discord.utils.utcnow() - timedelta(hours=within_hours) if within_hours else None
         await interaction.response.defer(ephemeral=True)
-        deleted = await interaction.channel.purge(limit=100)  # Fixing 'amount' reference here
-        await interaction.followup.send(f"🧹 Deleted {len(deleted)} messages.", ephemeral=True)
-        await self.log_action("Purged messages", interaction.user, f"Amount: 100")
+        message = await interaction.followup.send(f"🧹 Purging up to {amount} messages...", ephemeral=True, wait=True)
 
-    async def sync(self, interaction):
-        if not await self.has_admin_permissions(interaction):
-            await interaction.response.send_message("❌ You don't have permission.", ephemeral=True)
-            return
+        async def report(progress):
+            status = "🧹 Deleted" if progress.finished else "⏳ Purging:"
+            text = f"{status} {progress.deleted}/{amount} messages (scanned {progress.scanned}"
+            text += f", {progress.failed} failed)." if progress.failed else ")."
+            try:
+                await self.edit_progress(message, text)
+            except discord.HTTPException:
+                pass  # The interaction token expires after 15 minutes; the purge keeps going
+
+        progress = await purge_channel(interaction.channel, amount, check, self.bot.outbound, since=since,
+                                       on_progress=report)
+        case = self.open_case(interaction, "purge", user, f"{progress.deleted} messages in #{interaction.channel}")
+        self.log_action("Purged messages", interaction.user, f"{case} | Amount: {progress.deleted}")
+
+    @is_privileged()
+    async def sync(self, interaction, force: bool = False):
         await interaction.response.defer(ephemeral=True)
         try:
-            synced = await self.bot.tree.sync(guild=interaction.guild)
+            # Diff mode by default: only hit the rate-limited sync endpoint when commands changed
+            synced = await self.bot.syncer.sync(guild=interaction.guild if self.guild else None, force=force)
+            if synced is None:
+                await interaction.followup.send("✅ Commands unchanged, nothing to sync. Use `force` to sync anyway.", ephemeral=True)
+                return
             await interaction.followup.send(f"✅ Synced {len(synced)} commands.", ephemeral=True)
         except Exception as e:
             await interaction.followup.send(f"❌ Failed to sync: {e}", ephemeral=True)
-        await self.log_action("Synced commands", interaction.user)
+        self.log_action("Synced commands", interaction.user)
+
+    async def edit_progress(self, message, text):
+        # Only the newest text of a progress message is sent when edits queue up
+        await self.bot.outbound.run(BACKGROUND, f"webhook_messages:{message.id}",
+                                    lambda: message.edit(content=text), key=("progress", message.id))
+
+    async def apply_role_edit(self, job, member_id):
+        # Straight to the REST route, so members don't need to be cached
+        http, outbound = self.bot.http, self.bot.outbound
+        route = f"members:{job.guild_id}"
+        if job.action == "add":
+            await outbound.run(BULK, route, lambda: http.add_role(job.guild_id, member_id, job.role_id, reason="Bulk role add"))
+        elif job.action == "restore":
+            if await self.restore_member_roles(self.bot.get_guild(job.guild_id), member_id, BULK) is None:
+                raise LookupError(f"Member {member_id} is not in the server")
+        elif job.action == "kick":
+            await outbound.run(BULK, f"bans:{job.guild_id}", lambda: http.kick(member_id, job.guild_id, reason="Held during raid lockdown"))
+        else:
+            await outbound.run(BULK, route, lambda: http.remove_role(job.guild_id, member_id, job.role_id, reason="Bulk role clear"))
+
+    async def restore_member_roles(self, guild, user_id, lane=INTERACTION):
+        """Give the member back their snapshotted roles in one edit; None if they aren't in the server."""
+        member = await self.bot.member_cache.get(guild, user_id)
+        if member is None:
+            return None
+        held = {role.id for role in member.roles}
+        roles = restorable_roles(guild, self.bot.role_snapshots.get(guild.id, user_id), held)
+        if roles:
+            # atomic=False sends a single role-list PATCH instead of one request per role
+            await self.bot.outbound.run(lane, f"members:{guild.id}",
+                                        lambda: member.add_roles(*roles, reason="Role snapshot restore", atomic=False))
+        self.bot.role_snapshots.restored(guild.id, user_id)
+        return roles
+
+    def describe_role_job(self, job, label):
+        verb, finished = JOB_VERBS[job.action]
+        if job.state == DONE:
+            return f"🧼 {finished} '{label}' for {job.done} users ({job.failed} failed)."
+        status = "⏸️ Cancelled" if job.state == CANCELLED else "⏳"
+        return (f"{status} {verb} '{label}': {job.processed}/{job.total} "
+                f"({job.rate:.1f}/s, {job.failed} failed) | job `{job.id}`")
+
+    async def run_role_job(self, interaction, job, label):
+        message = await interaction.followup.send(self.describe_role_job(job, label), ephemeral=True, wait=True)
+
+        async def report(job):
+            try:
+                await self.edit_progress(message, self.describe_role_job(job, label))
+            except discord.HTTPException:
+                pass  # The interaction token expires after 15 minutes; the job keeps going
 
+        await self.role_jobs.run(job, on_progress=report)
+        action = {"add": "Added role", "remove": "Cleared role", "restore": "Restored roles", "kick": "Kicked held members"}[job.action]
+        case = self.open_case(interaction, JOB_CASES[job.action], reason=f"{label}: {job.done} members, job {job.id} ({job.state})")
+        self.log_action(action, interaction.user, f"{case} | Role: {label} - Count: {job.done} - Job: {job.id} ({job.state})")
+
+    @is_privileged()
     async def clear_roles(self, interaction, role: discord.Role):
-        if not await self.has_admin_permissions(interaction):
-            await interaction.response.send_message("❌ You don't have permission.", ephemeral=True)
+        await interaction.response.defer(ephemeral=True)
+        member_ids = await self.bot.member_cache.role_member_ids(interaction.guild, role)
+        job = self.role_jobs.create(interaction.guild.id, role.id, "remove", member_ids)
+        await self.run_role_job(interaction, job, role.name)
+
+    @is_privileged()
+    async def add_roles(self, interaction, role: discord.Role, having_role: discord.Role = None):
+        await interaction.response.defer(ephemeral=True)
+        member_ids = await self.bot.member_cache.member_ids(
+            interaction.guild,
+            lambda member: member.get_role(role.id) is None and (having_role is None or member.get_role(having_role.id) is not None),
+        )
+        job = self.role_jobs.create(interaction.guild.id, role.id, "add", member_ids)
+        await self.run_role_job(interaction, job, role.name)
+
+    @is_privileged()
+    async def cancel_role_job(self, interaction, job_id: str):
+        if self.role_jobs.cancel(job_id):
+            await interaction.response.send_message(f"⏸️ Cancelling job `{job_id}`. Resume it with /resume_role_job.", ephemeral=True)
+        else:
+            await interaction.response.send_message("❌ No running job with that ID.", ephemeral=True)
+
+    @is_privileged()
+    async def resume_role_job(self, interaction, job_id: str):
+        job = self.role_jobs.jobs.get(job_id)
+        if job is None or job.guild_id != interaction.guild.id or job_id in self.role_jobs.tasks:
+            job = None
+        elif job.action in JOB_LABELS:
+            label = JOB_LABELS[job.action]
+        else:
+            role = interaction.guild.get_role(job.role_id)
+            label = role.name if role else None
+        if job is None or label is None:
+            await interaction.response.send_message("❌ No resumable job with that ID.", ephemeral=True)
             return
         await interaction.response.defer(ephemeral=True)
-        count = 0
-        for member in interaction.guild.members:
-            if role in member.roles:
-                await member.remove_roles(role)
-                count += 1
-        await interaction.followup.send(f"🧼 Removed '{role.name}' from {count} users.", ephemeral=True)
-        await self.log_action("Cleared role", interaction.user, f"Role: {role.name} - Count: {count}")
+        await self.run_role_job(interaction, job, label)
+
+    async def expire_warning(self, timer):
+        key = timer["key"]
+        if ":" not in key and GUILD_ID:
+            key = warning_key(GUILD_ID, key)
+        async with self.warning_store.lock:
+            current = self.warning_store.get(key, 0)
+            if current <= 1:
+                self.warning_store.pop(key)
+            else:
+                self.warning_store.set(key, current - 1)
+
+    async def scheduled_unban(self, timer):
+        data = timer["data"]
+        try:
+            await self.bot.outbound.run(BACKGROUND, f"bans:{data['guild_id']}",
+                                        lambda: self.bot.http.unban(timer["key"], data["guild_id"], reason="Temporary ban expired"))
+        except discord.NotFound:
+            pass  # Already unbanned by hand
 
-    async def ban(self, interaction, user: discord.User, reason: str = None):
-        if not await self.has_admin_permissions(interaction):
-            await interaction.response.send_message("❌ You don't have permission.", ephemeral=True)
+    async def scheduled_role_restore(self, timer):
+        data = timer["data"]
+        try:
+            await self.bot.outbound.run(BACKGROUND, f"members:{data['guild_id']}", lambda: self.bot.http.add_role(
+                data["guild_id"], timer["key"], data["role_id"], reason="Temporary role removal expired"))
+        except discord.NotFound:
+            pass  # Member left or role was deleted
+
+    @is_privileged()
+    async def tempban(self, interaction, user: discord.User, duration: str, reason: str = None):
+        try:
+            length = parse_duration(duration)
+        except ValueError:
+            await interaction.response.send_message("❌ Invalid duration. Use `7d 12h`.", ephemeral=True)
+            return
+        await interaction.response.defer(ephemeral=True)
+        await self.moderate(interaction, "bans", lambda: interaction.guild.ban(user, reason=reason))
+        self.timers.add("unban", length.total_seconds(), key=user.id, guild_id=interaction.guild.id)
+        await interaction.followup.send(f"✅ {user} has been banned for {length}.", ephemeral=True)
+        case = self.open_case(interaction, "tempban", user, f"{length}" + (f": {reason}" if reason else ""))
+        self.log_action("Temp-banned user", interaction.user, f"{case} | User: {user} | Duration: {length} | Reason: {reason}")
+
+    @is_privileged()
+    async def strip_role(self, interaction, member: discord.Member, role: discord.Role, duration: str):
+        try:
+            length = parse_duration(duration)
+        except ValueError:
+            await interaction.response.send_message("❌ Invalid duration. Use `1d 12h`.", ephemeral=True)
             return
+        if member.get_role(role.id) is None:
+            await interaction.response.send_message(f"❌ {member} doesn't have {role.name}.", ephemeral=True)
+            return
+        await interaction.response.defer(ephemeral=True)
+        await self.moderate(interaction, "members", lambda: member.remove_roles(role, reason=f"Removed for {length}"))
+        self.timers.add("restore_role", length.total_seconds(), key=member.id, guild_id=interaction.guild.id, role_id=role.id)
+        await interaction.followup.send(f"✅ Removed {role.name} from {member} for {length}.", ephemeral=True)
+        case = self.open_case(interaction, "strip_role", member, f"{role.name} for {length}")
+        self.log_action("Stripped role", interaction.user, f"{case} | User: {member} | Role: {role.name} | Duration: {length}")
+
+    @is_privileged()
+    async def ban(self, interaction, user: discord.User, reason: str = None):
         await interaction.response.defer(ephemeral=True)
-        await interaction.guild.ban(user, reason=reason)
+        await self.moderate(interaction, "bans", lambda: interaction.guild.ban(user, reason=reason))
         await interaction.followup.send(f"✅ {user} has been banned.", ephemeral=True)
-        await self.log_action("Banned user", interaction.user, f"User: {user} | Reason: {reason}")
+        case = self.open_case(interaction, "ban", user, reason)
+        self.log_action("Banned user", interaction.user, f"{case} | User: {user} | Reason: {reason}")
 
+    @is_privileged()
     async def timeout(self, interaction, member: discord.Member, time: str):
-        if not await self.has_admin_permissions(interaction):
-            await interaction.response.send_message("❌ You don't have permission.", ephemeral=True)
-            return
-
         try:
-            time_parts = time.lower().split()
-            total_time = timedelta()
-            for part in time_parts:
-                if part.endswith('d'):
-                    total_time += timedelta(days=int(part[:-1]))
-                elif part.endswith('h'):
-                    total_time += timedelta(hours=int(part[:-1]))
-                elif part.endswith('m'):
-                    total_time += timedelta(minutes=int(part[:-1]))
-                else:
-                    raise ValueError("Invalid time format")
-        except Exception:
+            total_time = parse_duration(time)
+        except ValueError:
             await interaction.response.send_message("❌ Invalid time format. Use `1d 2h 30m`.", ephemeral=True)
             return
 
+        await interaction.response.defer(ephemeral=True)
         try:
-            await member.timeout_for(total_time)
-            await interaction.response.send_message(f"✅ {member} timed out for {total_time}.", ephemeral=True)
-            await self.log_action("Timed out user", interaction.user, f"User: {member} | Duration: {total_time}")
+            await self.moderate(interaction, "members", lambda: member.timeout(total_time))
+            await interaction.followup.send(f"✅ {member} timed out for {total_time}.", ephemeral=True)
+            case = self.open_case(interaction, "timeout", member, f"{total_time}")
+            self.log_action("Timed out user", interaction.user, f"{case} | User: {member} | Duration: {total_time}")
         except Exception as e:
-            await interaction.response.send_message(f"❌ Error: {e}", ephemeral=True)
+            await interaction.followup.send(f"❌ Error: {e}", ephemeral=True)
 
+    @is_privileged()
     async def clear_timeout(self, interaction, member: discord.Member):
-        if not await self.has_admin_permissions(interaction):
-            await interaction.response.send_message("❌ You don't have permission.", ephemeral=True)
-            return
         if member.timed_out_until:
+            await interaction.response.defer(ephemeral=True)
             try:
-                await member.timeout_for(None)
-                await interaction.response.send_message(f"✅ {member}'s timeout cleared.", ephemeral=True)
-                await self.log_action("Cleared timeout", interaction.user, f"User: {member}")
+                await self.moderate(interaction, "members", lambda: member.timeout(None))
+                await interaction.followup.send(f"✅ {member}'s timeout cleared.", ephemeral=True)
+                case = self.open_case(interaction, "clear_timeout", member)
+                self.log_action("Cleared timeout", interaction.user, f"{case} | User: {member}")
             except Exception as e:
-                await interaction.response.send_message(f"❌ Error: {e}", ephemeral=True)
+                await interaction.followup.send(f"❌ Error: {e}", ephemeral=True)
         else:
             await interaction.response.send_message("❌ User is not timed out.", ephemeral=True)
 
+    @is_privileged()
     async def kick(self, interaction, user: discord.User, reason: str = None):
-        if not await self.has_admin_permissions(interaction):
-            await interaction.response.send_message("❌ You don't have permission.", ephemeral=True)
-            return
         await interaction.response.defer(ephemeral=True)
-        await interaction.guild.kick(user, reason=reason)
+        await self.moderate(interaction, "bans", lambda: interaction.guild.kick(user, reason=reason))
         await interaction.followup.send(f"✅ {user} has been kicked.", ephemeral=True)
-        await self.log_action("Kicked user", interaction.user, f"User: {user} | Reason: {reason}")
+        case = self.open_case(interaction, "kick", user, reason)
+        self.log_action("Kicked user", interaction.user, f"{case} | User: {user} | Reason: {reason}")
 
+    @is_privileged()
     async def warn(self, interaction, user: discord.User):
-        if not await self.has_admin_permissions(interaction):
-            await interaction.response.send_message("❌ You don't have permission.", ephemeral=True)
-            return
-
-        with open("data/warnings.json", "r") as f:
-            warnings = json.load(f)
-
-        warnings[str(user.id)] = warnings.get(str(user.id), 0) + 1
-
-        with open("data/warnings.json", "w") as f:
-            json.dump(warnings, f)
-
-        if warnings[str(user.id)] >= 3:
-            await user.timeout(timedelta(days=2))
-            await interaction.followup.send(f"⚠️ {user} warned 3 times and timed out.", ephemeral=True)
-
-        await interaction.followup.send(f"⚠️ {user} warned. Total: {warnings[str(user.id)]}.", ephemeral=True)
-        await self.log_action("Warned user", interaction.user, f"User: {user} | Total: {warnings[str(user.id)]}")
+        key = warning_key(interaction.guild.id, user.id)
+        async with self.warning_store.lock:
+            total = self.warning_store.get(key, 0) + 1
+            self.warning_store.set(key, total)
+        expiry_days = self.bot.guild_config.get(interaction.guild.id, "warning_expiry_days")
+        if expiry_days:
+            self.timers.add("warning_expiry", expiry_days * 86400, key=key)
+
+        member = None
+        send = interaction.response.send_message
+        if total >= 3:
+            # The member lookup and the timeout may both wait on REST calls
+            await interaction.response.defer(ephemeral=True)
+            send = interaction.followup.send
+            member = await self.bot.member_cache.get(interaction.guild, user.id)
+            if member:
+                await self.moderate(interaction, "members", lambda: member.timeout(timedelta(days=2)))
+        if member:
+            await send(f"⚠️ {user} warned 3 times and timed out.", ephemeral=True)
+        else:
+            await send(f"⚠️ {user} warned. Total: {total}.", ephemeral=True)
+        case = self.open_case(interaction, "warn", user, f"Warning {total}" + (", timed out for 2 days" if member else ""))
+        self.log_action("Warned user", interaction.user, f"{case} | User: {user} | Total: {total}")
 
     async def warnings(self, interaction, user: discord.User):
-        with open("data/warnings.json", "r") as f:
-            warnings = json.load(f)
-        await interaction.response.send_message(f"⚠️ {user} has {warnings.get(str(user.id), 0)} warnings.", ephemeral=True)
+        total = self.warning_store.get(warning_key(interaction.guild.id, user.id), 0)
+        await interaction.response.send_message(f"⚠️ {user} has {total} warnings.", ephemeral=True)
 
+    @is_privileged()
     async def remove_warning(self, interaction, user: discord.User, count: int):
-        if not await self.has_admin_permissions(interaction):
-            await interaction.response.send_message("❌ You don't have permission.", ephemeral=True)
-            return
-        with open("data/warnings.json", "r") as f:
-            warnings = json.load(f)
-
-        current = warnings.get(str(user.id), 0)
-        warnings[str(user.id)] = max(0, current - count)
-
-        with open("data/warnings.json", "w") as f:
-            json.dump(warnings, f)
+        key = warning_key(interaction.guild.id, user.id)
+        async with self.warning_store.lock:
+            current = self.warning_store.get(key, 0)
+            self.warning_store.set(key, max(0, current - count))
+        # The removed warnings no longer need to expire
+        for timer in self.timers.pending("warning_expiry", key)[:count]:
+            self.timers.cancel(timer["id"])
 
         await interaction.response.send_message(f"✅ Removed {count} warnings from {user}.", ephemeral=True)
-        await self.log_action("Removed warning", interaction.user, f"User: {user} | Removed: {count}")
+        case = self.open_case(interaction, "remove_warning", user, f"Removed {count}")
+        self.log_action("Removed warning", interaction.user, f"{case} | User: {user} | Removed: {count}")
 
+    @is_privileged()
     async def restore_role(self, interaction, user: discord.User):
-        with open("data/ranks.json", "r") as f:
-            ranks = json.load(f)
-        role_id = ranks.get(str(user.id))
-        role = discord.utils.get(interaction.guild.roles, id=role_id)
-        if role:
-            await user.add_roles(role)
-            await interaction.response.send_message(f"✅ Restored {role.name} to {user}.", ephemeral=True)
-            await self.log_action("Restored role", interaction.user, f"User: {user} | Role: {role.name}")
+        if not self.bot.role_snapshots.get(interaction.guild.id, user.id):
+            await interaction.response.send_message(f"❌ No saved roles for {user}.", ephemeral=True)
+            return
+        await interaction.response.defer(ephemeral=True)
+        roles = await self.restore_member_roles(interaction.guild, user.id)
+        if roles is None:
+            await interaction.followup.send(f"❌ {user} is not in the server.", ephemeral=True)
+        elif not roles:
+            await interaction.followup.send(f"✅ {user} already has all of their previous roles.", ephemeral=True)
+        else:
+            names = ", ".join(role.name for role in roles)
+            await interaction.followup.send(f"✅ Restored {names} to {user}.", ephemeral=True)
+            case = self.open_case(interaction, "restore_roles", user, names)
+            self.log_action("Restored role", interaction.user, f"{case} | User: {user} | Roles: {names}")
+
+    @is_privileged()
+    async def restore_roles(self, interaction, members: str):
+        user_ids = {int(match) for match in USER_ID.findall(members)}
+        user_ids = [user_id for user_id in user_ids if self.bot.role_snapshots.get(interaction.guild.id, user_id)]
+        if not user_ids:
+            await interaction.response.send_message("❌ No saved roles for any of those users.", ephemeral=True)
+            return
+        await interaction.response.defer(ephemeral=True)
+        job = self.role_jobs.create(interaction.guild.id, None, "restore", user_ids)
+        await self.run_role_job(interaction, job, RESTORE_LABEL)
+
+    @is_privileged()
+    async def lockdown(self, interaction, action: str = "status"):
+        onboarding = self.bot.get_cog("Onboarding")
+        if action not in LOCKDOWN_ACTIONS or onboarding is None:
+            await interaction.response.send_message(f"❌ Action must be one of: {', '.join(LOCKDOWN_ACTIONS)}.", ephemeral=True)
+            return
+        guild_id = interaction.guild.id
+        held = len(onboarding.held.get(guild_id, {}))
+
+        if action == "status":
+            lockdown = onboarding.raid.lockdowns.get(guild_id)
+            state = f"🚨 Lockdown ({lockdown['reason']})" if lockdown else "✅ No lockdown"
+            await interaction.response.send_message(
+                f"{state}. {held} members held, {len(onboarding.dm_queue)} waiting for onboarding.", ephemeral=True)
+            return
+        if action == "on":
+            onboarding.start_lockdown(guild_id, reason=f"started by {interaction.user}")
+            message = "🚨 Lockdown on. Suspected raid accounts will be held back until you turn it off."
+        elif action == "off":
+            onboarding.end_lockdown(guild_id)
+            message = f"✅ Lockdown off. {held} held members remain; use `release` or `kick`."
+        elif action == "release":
+            message = f"✅ Released {onboarding.release_held(guild_id)} held members to onboarding."
         else:
-            await interaction.response.send_message("❌ No role data or role not found.", ephemeral=True)
+            member_ids = onboarding.take_held(guild_id)
+            await interaction.response.defer(ephemeral=True)
+            job = self.role_jobs.create(guild_id, None, "kick", member_ids)
+            await self.run_role_job(interaction, job, JOB_LABELS["kick"])
+            return
+        await interaction.response.send_message(message, ephemeral=True)
+        self.log_action(f"Lockdown {action}", interaction.user, f"Held: {held}")
 
+    @is_privileged()
     async def unban(self, interaction, user: discord.User):
-        if not await self.has_admin_permissions(interaction):
-            await interaction.response.send_message("❌ You don't have permission.", ephemeral=True)
+        await interaction.response.defer(ephemeral=True)
+        await self.moderate(interaction, "bans", lambda: interaction.guild.unban(user))
+        await interaction.followup.send(f"✅ {user} unbanned.", ephemeral=True)
+        case = self.open_case(interaction, "unban", user)
+        self.log_action("Unbanned user", interaction.user, f"{case} | User: {user}")
+
+    @is_privileged()
+    async def modlog(self, interaction, user: discord.User = None, moderator: discord.User = None, action: str = None,
+                     days: int = None, page: int = 1):
+        if action is not None and action not in ACTIONS:
+            await interaction.response.send_message(f"❌ Action must be one of: {', '.join(ACTIONS)}.", ephemeral=True)
+            return
+        page = max(page, 1)
+        since = discord.utils.utcnow().timestamp() - days * 86400 if days else None
+        rows, more = self.cases.search(interaction.guild.id, target_id=user.id if user else None,
+                                       moderator_id=moderator.id if moderator else None, action=action, since=since,
+                                       offset=(page - 1) * MODLOG_PAGE_SIZE, limit=MODLOG_PAGE_SIZE)
+        if not rows:
+            await interaction.response.send_message("❌ No matching cases." if page == 1 else "❌ No cases on that page.", ephemeral=True)
             return
-        await interaction.guild.unban(user)
-        await interaction.response.send_message(f"✅ {user} unbanned.", ephemeral=True)
-        await self.log_action("Unbanned user", interaction.user, f"User: {user}")
 
+        lines = []
+        for case_id, _, timestamp, case_action, target_id, moderator_id, reason in await self.cases.cases(rows):
+            line = f"**#{case_id}** <t:{timestamp}:d> **{case_action}**"
+            if target_id:
+                line += f" <@{target_id}>"
+            line += f" by <@{moderator_id}>"
+            if reason:
+                line += f": {discord.utils.escape_markdown(reason[:MODLOG_REASON_CHARS])}"
+            lines.append(line)
+        embed = discord.Embed(title="Moderation log", description="\n".join(lines), color=discord.Color.orange())
+        embed.set_footer(text=f"Page {page}" + (f" · older cases on page {page + 1}" if more else ""))
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @is_privileged()
+    async def metrics(self, interaction):
+        metrics = self.bot.metrics
+        lines = metrics.summary_lines() or ["No commands recorded yet."]
+        for route, (count, waited) in sorted(metrics.rate_limits.items(), key=lambda item: item[1][0], reverse=True):
+            lines.append(f"429 {route}: {count} times, {waited:.1f}s waited")
+        for route, count in sorted(metrics.preemptive.items(), key=lambda item: item[1], reverse=True):
+            lines.append(f"bucket {route}: {count} pre-emptive waits")
+        lines.extend(f"outbound {line}" for line in metrics.lane_lines())
+        await interaction.response.send_message(f"```\n{chr(10).join(lines)[:1900]}\n```", ephemeral=True)
+
+    @is_privileged()
     async def adminhelp(self, interaction):
-        if not await self.has_admin_permissions(interaction):
-            await interaction.response.send_message("❌ You don't have permission.", ephemeral=True)
-            return
-        try:
-            with open("data/admincommands.txt", "r") as f:
-                commands_text = f.read()
-            await interaction.response.send_message(f"```\n{commands_text}\n```", ephemeral=True)
-        except FileNotFoundError:
+        chunks = content_cache.chunks("admincommands")
+        if not chunks:
             await interaction.response.send_message("❌ File not found.", ephemeral=True)
+            return
+        await interaction.response.send_message(chunks[0], ephemeral=True)
+        for chunk in chunks[1:]:
+            await interaction.followup.send(chunk, ephemeral=True)
 
 
 async def setup(bot: commands.Bot):
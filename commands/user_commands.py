@@ -1,24 +1,27 @@
 import discord
 from discord.ext import commands
 import datetime
+from utils.helpers import content_cache
+from utils.polls import PollEngine, POLL_EMOJIS, closes_in
+from utils.outbound import USER, BACKGROUND
 
 def load_help_text():
-    try:
-        with open('data/usercommands.txt', 'r') as f:
-            return f.read()
-    except FileNotFoundError:
-        return "Help text file not found."
+    # Served from memory; the content cache reloads the file when it changes
+    return content_cache.chunks("usercommands") or ["Help text file not found."]
 
 class UserCommands(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
         self.bot.start_time = datetime.datetime.utcnow()
+        self.polls = PollEngine(self.publish_poll_results)
 
         # Register tree commands
         @self.bot.tree.command(name="help", description="Show help for all commands")
         async def help_command(interaction: discord.Interaction):
             help_text = load_help_text()
-            await interaction.response.send_message(help_text)
+            await interaction.response.send_message(help_text[0])
+            for chunk in help_text[1:]:
+                await interaction.followup.send(chunk)
 
         @self.bot.tree.command(name="userinfo", description="Get information about yourself")
         async def userinfo(interaction: discord.Interaction):
@@ -27,7 +30,7 @@ class UserCommands(commands.Cog):
             embed.add_field(name="Username", value=user.name, inline=False)
             embed.add_field(name="ID", value=user.id, inline=False)
             embed.add_field(name="Account Created", value=user.created_at.strftime("%B %d, %Y"), inline=False)
-            member = interaction.guild.get_member(user.id)
+            member = await self.bot.member_cache.get(interaction.guild, user.id)
             if member and member.joined_at:
                 embed.add_field(name="Joined Server", value=member.joined_at.strftime("%B %d, %Y"), inline=False)
                 embed.add_field(name="Roles", value=", ".join([role.name for role in member.roles[1:]]), inline=False)
@@ -57,23 +60,32 @@ class UserCommands(commands.Cog):
             option2: str,
             option3: str = None,
             option4: str = None,
-            option5: str = None
+            option5: str = None,
+            hours: float = None,
+            time: str = None
         ):
             options = [opt for opt in [option1, option2, option3, option4, option5] if opt]
             if len(options) < 2:
                 await interaction.response.send_message("You need at least 2 options to create a vote.")
                 return
+            try:
+                closes_at = closes_in(hours=hours, until=time)
+            except ValueError:
+                await interaction.response.send_message("Invalid time. Use a future `YYYY-MM-DD HH:MM:SS` (UTC) or a positive number of hours.", ephemeral=True)
+                return
 
-            emojis = ['🇦', '🇧', '🇨', '🇩', '🇪']
             poll_message = f"||**Poll**: {question}||\n\n"
             for i, option in enumerate(options):
-                poll_message += f"{emojis[i]}: {option}\n"
+                poll_message += f"{POLL_EMOJIS[i]}: {option}\n"
+            poll_message += f"\nCloses <t:{int(closes_at)}:R>"
 
             await interaction.response.send_message(f"**Poll started!** {poll_message}")
             msg = await interaction.original_response()
+            self.polls.create(msg.id, interaction.guild_id, interaction.channel_id, interaction.user.id,
+                              question, options, closes_at)
 
             for i in range(len(options)):
-                await msg.add_reaction(emojis[i])
+                await self.bot.outbound.run(USER, f"reactions:{msg.channel.id}", lambda emoji=POLL_EMOJIS[i]: msg.add_reaction(emoji))
 
         @self.bot.tree.command(name="status", description="Show the bot's current status")
         async def status(interaction: discord.Interaction):
@@ -82,8 +94,40 @@ class UserCommands(commands.Cog):
             embed.add_field(name="Uptime", value=str(bot_uptime).split('.')[0], inline=False)
             embed.add_field(name="Bot Latency", value=f"{round(self.bot.latency * 1000)}ms", inline=False)
             embed.add_field(name="Bot Users", value=len(self.bot.users), inline=False)
+            slowest = self.bot.metrics.summary_lines(limit=5)
+            if slowest:
+                embed.add_field(name="Slowest Commands (p99)", value="\n".join(slowest)[:1024], inline=False)
+            rate_limits = sum(count for count, _ in self.bot.metrics.rate_limits.values())
+            embed.add_field(name="Rate Limits Hit", value=rate_limits, inline=False)
+            embed.add_field(name="Outbound Queue", value=f"{len(self.bot.outbound)} waiting, {self.bot.outbound.in_flight} in flight", inline=False)
             await interaction.response.send_message(embed=embed)
 
+    async def cog_load(self):
+        await content_cache.preload("usercommands", "data/usercommands.txt")
+        self.polls.start()
+
+    async def cog_unload(self):
+        await self.polls.stop()
+
+    # Tallies are kept live from raw events, so poll messages never need to be cached or refetched
+    @commands.Cog.listener()
+    async def on_raw_reaction_add(self, payload):
+        if payload.user_id != self.bot.user.id:
+            self.polls.react(payload.message_id, str(payload.emoji), 1)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_remove(self, payload):
+        if payload.user_id != self.bot.user.id:
+            self.polls.react(payload.message_id, str(payload.emoji), -1)
+
+    async def publish_poll_results(self, message_id, poll):
+        lines, total = self.polls.results(poll)
+        embed = discord.Embed(title=f"Poll closed: {poll['question']}", description="\n".join(lines), color=discord.Color.gold())
+        embed.set_footer(text=f"{total} votes")
+        channel = self.bot.get_partial_messageable(poll["channel_id"], guild_id=poll["guild_id"])
+        await self.bot.outbound.run(BACKGROUND, f"messages:{poll['channel_id']}",
+                                    lambda: channel.get_partial_message(message_id).reply(embed=embed))
+
 # Setup function to load the cog
 async def setup(bot):
     await bot.add_cog(UserCommands(bot))
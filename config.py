@@ -1,8 +1,54 @@
+import json
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
 DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
-GUILD_ID = int(os.getenv("GUILD_ID"))  # Needs to be an integer
+# Optional home guild: admin commands are registered there (instant sync) instead of globally,
+# and data recorded before per-guild storage is attributed to it
+GUILD_ID = int(os.getenv("GUILD_ID")) if os.getenv("GUILD_ID") else None
 
+# Member cache policy for large guilds: full, lazy or active (see utils/member_cache.py)
+MEMBER_CACHE_MODE = os.getenv("MEMBER_CACHE_MODE", "full")
+MEMBER_CACHE_SIZE = int(os.getenv("MEMBER_CACHE_SIZE", "10000"))  # LRU cap in active mode
+
+# Sharding, usually set by launcher.py: SHARD_IDS is a comma-separated subset of range(SHARD_COUNT)
+SHARD_COUNT = int(os.getenv("SHARD_COUNT")) if os.getenv("SHARD_COUNT") else None
+SHARD_IDS = [int(shard) for shard in os.getenv("SHARD_IDS").split(",")] if os.getenv("SHARD_IDS") else None
+CLUSTER_ID = int(os.getenv("CLUSTER_ID", "0"))
+# Bot processes sharing the token, which split its global REST rate limit
+CLUSTER_COUNT = int(os.getenv("CLUSTER_COUNT", "1"))
+# Shards Discord lets us identify at once (session_start_limit.max_concurrency)
+IDENTIFY_CONCURRENCY = int(os.getenv("IDENTIFY_CONCURRENCY", "1"))
+# Only one process should sync the command tree
+SYNC_COMMANDS = os.getenv("SYNC_COMMANDS", "1") == "1"
+
+# Runtime state (stores, journals, logs); each launcher process gets its own
+STATE_DIR = os.getenv("STATE_DIR", "data")
+
+GUILD_CONFIG_FILE = "data/guild_config.json"
+
+
+class GuildConfig:
+    """data/guild_config.json held in memory as guild ID -> settings.
+
+    Entries under a guild ID override the "default" block, and guilds without
+    an entry get the defaults, so a lookup is two dict gets.
+    """
+
+    def __init__(self, path=GUILD_CONFIG_FILE):
+        self.path = path
+        self.reload()
+
+    def reload(self):
+        raw = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                content = f.read().strip()
+            raw = json.loads(content) if content else {}
+        self.defaults = raw.get("default", {})
+        self.guilds = {int(guild_id): {**self.defaults, **settings} for guild_id, settings in raw.items() if guild_id != "default"}
+
+    def get(self, guild_id, key, default=None):
+        return self.guilds.get(guild_id, self.defaults).get(key, default)
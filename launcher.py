@@ -0,0 +1,184 @@
+"""Run the bot as several processes, each connecting a contiguous slice of the shards.
+
+    python launcher.py --processes 2               # shard count recommended by Discord
+    python launcher.py --shards 16 --processes 4
+
+Every process gets its own state directory (data/cluster-<n>) because a
+guild always lands on the same shard, and so on the same process, as long
+as --shards and --processes stay the same. Changing either moves guilds
+between processes along with their warnings, timers and polls, so keep them
+fixed once chosen. State a single process left in data/ is moved, on the
+first clustered start, into the directory of the process running the home
+guild (GUILD_ID), which is whose data it is. Processes take turns
+identifying through lock files in data/shards/ and report their status
+there; crashed processes are restarted.
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+from config import DISCORD_TOKEN, GUILD_ID
+from utils.sharding import assign_shards, read_statuses
+
+GATEWAY_URL = "https://discord.com/api/v10/gateway/bot"
+STATUS_INTERVAL = 60
+MAX_RESTART_DELAY = 60
+
+# Per-process state under data/, as written by a bot run without the launcher (STATE_DIR=data)
+LEGACY_STATE = ("warnings.json", "onboarding.json", "onboarding.jsonl", "onboarding_sessions.json",
+                "onboarding_queue.json", "onboarding_held.json", "moderation_timers.jsonl", "polls.json", "role_jobs.json", "role_snapshots.jsonl", "cases",
+                "logs/admin_actions.jsonl")
+
+
+def recommended_shards():
+    """Discord's recommended shard count and identify concurrency for this bot."""
+    request = urllib.request.Request(GATEWAY_URL, headers={"Authorization": f"Bot {DISCORD_TOKEN}"})
+    with urllib.request.urlopen(request, timeout=10) as response:
+        info = json.load(response)
+    return info["shards"], info["session_start_limit"]["max_concurrency"]
+
+
+class Cluster:
+    """One bot process and the shards it runs."""
+
+    def __init__(self, cluster_id, shard_ids, shard_count, concurrency=1, cluster_count=1):
+        self.cluster_id = cluster_id
+        self.cluster_count = cluster_count
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.concurrency = concurrency
+        self.state_dir = os.path.join("data", f"cluster-{cluster_id}")
+        self.process = None
+        self.restarts = 0
+        self.failures = 0
+        self.started_at = 0.0
+        self.restart_at = 0.0
+
+    def start(self):
+        env = dict(os.environ,
+                   SHARD_COUNT=str(self.shard_count),
+                   SHARD_IDS=",".join(map(str, self.shard_ids)),
+                   CLUSTER_ID=str(self.cluster_id),
+                   CLUSTER_COUNT=str(self.cluster_count),
+                   IDENTIFY_CONCURRENCY=str(self.concurrency),
+                   STATE_DIR=self.state_dir,
+                   SYNC_COMMANDS="1" if self.cluster_id == 0 else "0")
+        self.process = subprocess.Popen([sys.executable, "bot.py"], env=env)
+        self.started_at = time.monotonic()
+        print(f"✅ Started cluster {self.cluster_id} (pid {self.process.pid}) with shards {self.shard_ids[0]}-{self.shard_ids[-1]}")
+
+    def check(self):
+        """Restart the process if it exited, backing off when it keeps crashing."""
+        if self.process is None:
+            if time.monotonic() >= self.restart_at:
+                self.start()
+            return
+        code = self.process.poll()
+        if code is None:
+            return
+        self.restarts += 1
+        # Back off only while it keeps crashing soon after starting
+        self.failures = self.failures + 1 if time.monotonic() - self.started_at < MAX_RESTART_DELAY * 5 else 1
+        delay = min(MAX_RESTART_DELAY, 2 ** self.failures)
+        print(f"❌ Cluster {self.cluster_id} exited with code {code}, restarting in {delay}s")
+        self.process = None
+        self.restart_at = time.monotonic() + delay
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+
+    def wait(self, timeout):
+        if self.process is None:
+            return
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+def migrate_legacy_state(clusters, shard_count):
+    """Move unclustered state from data/ into the state directory of the cluster running the home guild."""
+    present = [name for name in LEGACY_STATE if os.path.exists(os.path.join("data", name))]
+    if not present:
+        return
+    # Discord routes a guild's events to shard (guild_id >> 22) % shard_count
+    shard = (GUILD_ID >> 22) % shard_count if GUILD_ID else 0
+    cluster = next(cluster for cluster in clusters if shard in cluster.shard_ids)
+    for name in present:
+        target = os.path.join(cluster.state_dir, name)
+        if os.path.exists(target):
+            print(f"⚠️ Not migrating data/{name}: cluster {cluster.cluster_id} already has its own")
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(os.path.join("data", name), target)
+        print(f"✅ Moved data/{name} to {target}")
+
+
+def print_statuses(clusters):
+    statuses = read_statuses()
+    for cluster in clusters:
+        status = statuses.get(cluster.cluster_id)
+        if status is None:
+            print(f"Cluster {cluster.cluster_id}: no status yet")
+            continue
+        latencies = [latency for latency in status["shards"].values() if latency is not None]
+        worst = f"{max(latencies)}ms" if latencies else "n/a"
+        age = time.time() - status["updated"]
+        print(f"Cluster {cluster.cluster_id}: {status['guilds']} guilds, {len(status['shards'])} shards, "
+              f"worst latency {worst}, {cluster.restarts} restarts, updated {age:.0f}s ago")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the bot's shards across several processes.")
+    parser.add_argument("--shards", type=int, help="total shard count (default: Discord's recommendation)")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="number of bot processes")
+    args = parser.parse_args()
+
+    shard_count, concurrency = args.shards, 1
+    if shard_count is None:
+        shard_count, concurrency = recommended_shards()
+        print(f"✅ Discord recommends {shard_count} shards (identify concurrency {concurrency})")
+    processes = max(1, min(args.processes, shard_count))
+
+    assignments = assign_shards(shard_count, processes)
+    clusters = [Cluster(cluster_id, shard_ids, shard_count, concurrency, len(assignments))
+                for cluster_id, shard_ids in enumerate(assignments)]
+
+    migrate_legacy_state(clusters, shard_count)
+
+    stopping = False
+
+    def shutdown(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    for cluster in clusters:
+        cluster.start()
+
+    last_status = time.monotonic()
+    while not stopping:
+        time.sleep(1)
+        for cluster in clusters:
+            cluster.check()
+        if time.monotonic() - last_status >= STATUS_INTERVAL:
+            print_statuses(clusters)
+            last_status = time.monotonic()
+
+    print("🔄 Stopping clusters...")
+    for cluster in clusters:
+        cluster.stop()
+    for cluster in clusters:
+        cluster.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
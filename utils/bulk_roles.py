@@ -0,0 +1,197 @@
+import asyncio
+import itertools
+import time
+
+from config import STATE_DIR
+from utils.ratelimit import TokenBucket
+from utils.storage import JsonStore
+
+JOBS_FILE = f"{STATE_DIR}/role_jobs.json"
+
+# Member role edits share one bucket per guild on Discord's side
+ROLE_EDIT_RATE = 10
+ROLE_EDIT_PER = 1.0
+
+# Job states
+RUNNING = "running"
+CANCELLED = "cancelled"
+DONE = "done"
+
+
+class BulkRoleJob:
+    """A role add/remove over a fixed set of member IDs.
+
+    ``pending`` shrinks as members are processed and is persisted, so an
+    interrupted or cancelled job can be resumed where it stopped. So is the
+    time spent running, so that after a resume the rate covers the whole job
+    like the done count does.
+    """
+
+    def __init__(self, job_id, guild_id, role_id, action, member_ids, total=None, done=0, failed=0, state=RUNNING,
+                 elapsed=0.0):
+        self.id = job_id
+        self.guild_id = guild_id
+        self.role_id = role_id
+        self.action = action
+        self.pending = set(member_ids)
+        self.total = total if total is not None else len(self.pending)
+        self.done = done
+        self.failed = failed
+        self.state = state
+        # Seconds spent in earlier runs; started is set while a run is in progress
+        self.elapsed = elapsed
+        self.started = None
+
+    @property
+    def processed(self):
+        return self.done + self.failed
+
+    @property
+    def running_time(self):
+        if self.started is None:
+            return self.elapsed
+        return self.elapsed + time.monotonic() - self.started
+
+    @property
+    def rate(self):
+        elapsed = self.running_time
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+    def to_dict(self):
+        return {
+            "guild_id": self.guild_id,
+            "role_id": self.role_id,
+            "action": self.action,
+            "pending": list(self.pending),
+            "total": self.total,
+            "done": self.done,
+            "failed": self.failed,
+            "state": self.state,
+            "elapsed": self.running_time,
+        }
+
+    @classmethod
+    def from_dict(cls, job_id, data):
+        return cls(
+            job_id, data["guild_id"], data["role_id"], data["action"], data["pending"],
+            total=data["total"], done=data["done"], failed=data["failed"], state=data["state"],
+            elapsed=data.get("elapsed", 0.0),
+        )
+
+
+class BulkRoleEngine:
+    """Runs bulk role jobs through a bounded worker pool behind per-guild rate buckets.
+
+    ``apply(job, member_id)`` performs a single role edit. A 429 (any exception
+    with ``status == 429``) requeues the member and pauses the whole bucket for
+    its ``retry_after``; other failures are counted and skipped.
+    """
+
+    def __init__(self, apply, path=JOBS_FILE, workers=4, rate=ROLE_EDIT_RATE, per=ROLE_EDIT_PER, progress_interval=5.0):
+        self.apply = apply
+        self.workers = workers
+        self.rate = rate
+        self.per = per
+        self.progress_interval = progress_interval
+        self.store = JsonStore(path)
+        self.jobs = {job_id: BulkRoleJob.from_dict(job_id, data) for job_id, data in self.store.data.items()}
+        self.buckets = {}
+        self.tasks = {}
+        self._ids = itertools.count(max((int(job_id) for job_id in self.jobs), default=0) + 1)
+
+    def create(self, guild_id, role_id, action, member_ids):
+        job = BulkRoleJob(str(next(self._ids)), guild_id, role_id, action, member_ids)
+        self.jobs[job.id] = job
+        self._save(job)
+        return job
+
+    def bucket_for(self, guild_id):
+        if guild_id not in self.buckets:
+            self.buckets[guild_id] = TokenBucket(self.rate, self.per)
+        return self.buckets[guild_id]
+
+    def cancel(self, job_id):
+        task = self.tasks.get(job_id)
+        if task is None or task.done():
+            return False
+        task.cancel()
+        return True
+
+    async def run(self, job, on_progress=None):
+        """Run ``job`` in its own task, which ``cancel`` stops; returns the job once it's done or cancelled."""
+        task = self.tasks[job.id] = asyncio.create_task(self._run(job, on_progress))
+        try:
+            await asyncio.wait([task])
+        except asyncio.CancelledError:
+            # The caller itself was cancelled (shutdown, unload): stop the job too and let it propagate
+            task.cancel()
+            raise
+        if task.cancelled():
+            # Cancelled before it got to start
+            job.state = CANCELLED
+            self.tasks.pop(job.id, None)
+            self._save(job)
+        return job
+
+    async def _run(self, job, on_progress):
+        job.state = RUNNING
+        job.started = time.monotonic()
+        queue = asyncio.Queue()
+        for member_id in job.pending:
+            queue.put_nowait(member_id)
+
+        bucket = self.bucket_for(job.guild_id)
+        workers = [asyncio.create_task(self._worker(job, queue, bucket)) for _ in range(self.workers)]
+        try:
+            while not all(worker.done() for worker in workers):
+                await asyncio.wait(workers, timeout=self.progress_interval)
+                self._save(job)
+                if on_progress and job.pending:
+                    await on_progress(job)
+            job.state = DONE
+        except asyncio.CancelledError:
+            job.state = CANCELLED
+        finally:
+            for worker in workers:
+                worker.cancel()
+            job.elapsed, job.started = job.running_time, None
+            self.tasks.pop(job.id, None)
+            self._save(job)
+
+        if on_progress:
+            await on_progress(job)
+
+    async def _worker(self, job, queue, bucket):
+        while True:
+            try:
+                member_id = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            await bucket.acquire()
+            try:
+                await self.apply(job, member_id)
+            except Exception as e:
+                if getattr(e, "status", None) == 429:
+                    bucket.block(getattr(e, "retry_after", None) or self.per)
+                    queue.put_nowait(member_id)
+                    continue
+                job.failed += 1
+            else:
+                job.done += 1
+            job.pending.discard(member_id)
+
+    def _save(self, job):
+        # Finished jobs are dropped; running and cancelled ones stay resumable
+        if job.state == DONE:
+            self.jobs.pop(job.id, None)
+            if job.id in self.store.data:
+                self.store.pop(job.id)
+        else:
+            self.store.set(job.id, job.to_dict())
+
+    async def close(self):
+        tasks = list(self.tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.store.close()
@@ -0,0 +1,265 @@
+import asyncio
+import json
+import os
+import time
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+from config import STATE_DIR
+from utils.storage import AppendLog, atomic_write
+
+CASES_DIR = f"{STATE_DIR}/cases"
+
+# Recent cases are journaled as JSON lines; every SEGMENT_SIZE of them are sealed into a compressed segment
+SEGMENT_SIZE = 50_000
+# Cases per independently compressed block, the unit read back when paging through a segment
+BLOCK_SIZE = 256
+BLOCK_CACHE = 64
+JOURNAL_FLUSH_DELAY = 1.0
+
+ACTIONS = ("ban", "tempban", "unban", "kick", "timeout", "clear_timeout", "warn", "remove_warning",
+           "strip_role", "purge", "clear_roles", "add_roles", "restore_roles", "lockdown_kick")
+ACTION_CODES = {action: code for code, action in enumerate(ACTIONS)}
+# Code of actions no longer in ACTIONS (recorded by a newer or older version)
+UNKNOWN_ACTION = 255
+
+# Column typecodes: guild, time (epoch seconds), action index, target and moderator
+COLUMNS = (("guilds", "Q"), ("times", "I"), ("actions", "B"), ("targets", "Q"), ("moderators", "Q"))
+
+
+class CaseLog:
+    """Every moderation action as a numbered case, indexed by target, moderator and time.
+
+    Case N is row N - 1 of a set of column arrays (guild, time, action,
+    target, moderator) held in memory, about 30 bytes a case, plus one array
+    of row numbers per target, moderator, guild and (guild, action). Rows are
+    in time order, so a time range is a bisect and a query walks the smallest
+    matching posting list newest first, stopping once it has a page. Reasons
+    stay on disk: recent cases in a JSON-lines journal, older ones in sealed
+    segments of zlib blocks (``BLOCK_SIZE`` cases each), with their columns
+    stored raw beside them so a restart reads them back without parsing.
+    """
+
+    def __init__(self, directory=CASES_DIR):
+        self.directory = directory
+        self.log = AppendLog(os.path.join(directory, "journal.jsonl"))
+        self.manifest_path = os.path.join(directory, "segments.json")
+        for name, typecode in COLUMNS:
+            setattr(self, name, array(typecode))
+        self.by_target = {}
+        self.by_moderator = {}
+        self.by_guild = {}
+        self.by_action = {}
+        # Sealed segments: {"name", "first" (row), "count", "blocks" (byte offsets, plus the end)}
+        self.segments = []
+        self.sealed = 0
+        # Full rows of the cases after the sealed ones
+        self.recent = []
+        self._blocks = OrderedDict()
+        self._journal_buffer = []
+        self._journal_task = None
+        self._closing = asyncio.Event()
+        self._seal_lock = asyncio.Lock()
+
+    def __len__(self):
+        return len(self.times)
+
+    async def load(self):
+        await asyncio.to_thread(self._load)
+
+    def _load(self):
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r") as f:
+                self.segments = json.load(f)
+        for segment in self.segments:
+            with open(self._path(segment, ".cols"), "rb") as f:
+                for name, typecode in COLUMNS:
+                    getattr(self, name).fromfile(f, segment["count"])
+            if segment["actions"] != list(ACTIONS):
+                self._remap_actions(segment)
+        self.sealed = len(self.times)
+        for row in self.log.read_all():
+            # Journal lines already sealed by an interrupted compaction are skipped
+            if row[0] > len(self.times):
+                self._append(row)
+                self.recent.append(row)
+        self._build_index()
+
+    def _remap_actions(self, segment):
+        # Sealed under an older action list; translate its codes to the current one
+        codes = bytes(ACTION_CODES.get(action, UNKNOWN_ACTION) for action in segment["actions"])
+        start, end = segment["first"], segment["first"] + segment["count"]
+        self.actions[start:end] = array("B", bytes(self.actions[start:end]).translate(codes.ljust(256, b"\xff")))
+
+    def _append(self, row):
+        _, guild_id, timestamp, action, target_id, moderator_id, _ = row
+        self.guilds.append(guild_id)
+        self.times.append(timestamp)
+        self.actions.append(ACTION_CODES.get(action, UNKNOWN_ACTION))
+        self.targets.append(target_id)
+        self.moderators.append(moderator_id)
+
+    def _build_index(self):
+        # One pass per column, cheaper than indexing row by row
+        for postings, column in ((self.by_guild, self.guilds), (self.by_moderator, self.moderators),
+                                 (self.by_target, self.targets)):
+            for row, key in enumerate(column):
+                rows = postings.get(key)
+                if rows is None:
+                    rows = postings[key] = array("I")
+                rows.append(row)
+            postings.pop(0, None)
+        # Action postings are kept per guild, so a rare action in a busy guild is a short walk
+        for row, key in enumerate(zip(self.guilds, self.actions)):
+            rows = self.by_action.get(key)
+            if rows is None:
+                rows = self.by_action[key] = array("I")
+            rows.append(row)
+
+    def _index(self, row):
+        for postings, key in ((self.by_guild, self.guilds[row]), (self.by_moderator, self.moderators[row]),
+                              (self.by_target, self.targets[row]), (self.by_action, (self.guilds[row], self.actions[row]))):
+            # Purges and bulk jobs have no single target
+            if key:
+                rows = postings.get(key)
+                if rows is None:
+                    rows = postings[key] = array("I")
+                rows.append(row)
+
+    def record(self, guild_id, action, moderator_id, target_id=None, reason="", when=None):
+        """Open a case (at ``when``, epoch seconds, default now); returns its number."""
+        case_id = len(self.times) + 1
+        # Kept non-decreasing so time ranges can be bisected
+        timestamp = max(int(when if when is not None else time.time()), self.times[-1] if self.times else 0)
+        row = [case_id, guild_id, timestamp, action, target_id or 0, moderator_id, reason or ""]
+        self._append(row)
+        self._index(case_id - 1)
+        self.recent.append(row)
+        self._journal(row)
+        return case_id
+
+    def search(self, guild_id, target_id=None, moderator_id=None, action=None, since=None, offset=0, limit=10):
+        """Row numbers of the guild's matching cases, newest first, and whether there are more."""
+        code = ACTION_CODES[action] if action is not None else None
+        candidates = [self.by_guild.get(guild_id, ())]
+        if code is not None:
+            candidates.append(self.by_action.get((guild_id, code), ()))
+        if target_id is not None:
+            candidates.append(self.by_target.get(target_id, ()))
+        if moderator_id is not None:
+            candidates.append(self.by_moderator.get(moderator_id, ()))
+        # Every filter is checked per row below; walking the shortest list keeps that to the fewest rows
+        postings = min(candidates, key=len)
+        low = bisect_left(postings, bisect_left(self.times, since)) if since else 0
+
+        found, skipped = [], 0
+        for i in range(len(postings) - 1, low - 1, -1):
+            row = postings[i]
+            if (self.guilds[row] != guild_id
+                    or (target_id is not None and self.targets[row] != target_id)
+                    or (moderator_id is not None and self.moderators[row] != moderator_id)
+                    or (code is not None and self.actions[row] != code)):
+                continue
+            if skipped < offset:
+                skipped += 1
+                continue
+            found.append(row)
+            if len(found) > limit:
+                break
+        return found[:limit], len(found) > limit
+
+    async def cases(self, rows):
+        """Full case rows (``[id, guild, time, action, target, moderator, reason]``) for row numbers."""
+        result = []
+        for row in rows:
+            if row >= self.sealed:
+                result.append(self.recent[row - self.sealed])
+                continue
+            index = bisect_right([segment["first"] for segment in self.segments], row) - 1
+            segment = self.segments[index]
+            block = await self._block(index, (row - segment["first"]) // BLOCK_SIZE)
+            result.append(block[(row - segment["first"]) % BLOCK_SIZE])
+        return result
+
+    async def _block(self, index, number):
+        key = (index, number)
+        block = self._blocks.get(key)
+        if block is None:
+            block = self._blocks[key] = await asyncio.to_thread(self._read_block, self.segments[index], number)
+            if len(self._blocks) > BLOCK_CACHE:
+                self._blocks.popitem(last=False)
+        else:
+            self._blocks.move_to_end(key)
+        return block
+
+    def _read_block(self, segment, number):
+        start, end = segment["blocks"][number], segment["blocks"][number + 1]
+        with open(self._path(segment, ".z"), "rb") as f:
+            f.seek(start)
+            return json.loads(zlib.decompress(f.read(end - start)))
+
+    def _path(self, segment, extension):
+        return os.path.join(self.directory, segment["name"] + extension)
+
+    def _journal(self, row):
+        self._journal_buffer.append(row)
+        if self._journal_task is None or self._journal_task.done():
+            self._journal_task = asyncio.get_running_loop().create_task(self._flush_journal())
+
+    async def _flush_journal(self):
+        while self._journal_buffer:
+            try:
+                await asyncio.wait_for(self._closing.wait(), JOURNAL_FLUSH_DELAY)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    async def flush(self):
+        rows, self._journal_buffer = self._journal_buffer, []
+        if rows:
+            await self.log.append(*rows)
+        if len(self.recent) >= SEGMENT_SIZE:
+            await self.seal()
+
+    async def seal(self):
+        """Compact the journal: move every full segment's worth of cases into compressed segments."""
+        async with self._seal_lock:
+            while len(self.recent) >= SEGMENT_SIZE:
+                rows, first = self.recent[:SEGMENT_SIZE], self.sealed
+                # Column slices are copied on the loop; compression and writes happen off it
+                columns = [getattr(self, name)[first:first + SEGMENT_SIZE] for name, _ in COLUMNS]
+                segment = await asyncio.to_thread(self._write_segment, rows, first, columns)
+                manifest = json.dumps(self.segments + [segment])
+                await asyncio.to_thread(atomic_write, self.manifest_path, manifest)
+                self.segments.append(segment)
+                self.sealed += len(rows)
+                self.recent = self.recent[len(rows):]
+                # Rows also still in the journal buffer are written twice; loading skips the repeat
+                await self.log.rewrite(self.recent)
+
+    def _write_segment(self, rows, first, columns):
+        segment = {"name": f"cases-{first + 1:010d}", "first": first, "count": len(rows), "actions": list(ACTIONS),
+                   "blocks": []}
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path(segment, ".z.tmp"), "wb") as f:
+            for start in range(0, len(rows), BLOCK_SIZE):
+                segment["blocks"].append(f.tell())
+                f.write(zlib.compress(json.dumps(rows[start:start + BLOCK_SIZE]).encode(), 9))
+            segment["blocks"].append(f.tell())
+        # Raw machine-order arrays: the files are only ever read back on the host that wrote them
+        with open(self._path(segment, ".cols.tmp"), "wb") as f:
+            for column in columns:
+                column.tofile(f)
+        for extension in (".z", ".cols"):
+            os.replace(self._path(segment, extension + ".tmp"), self._path(segment, extension))
+        return segment
+
+    async def close(self):
+        # Not cancelled: a cancel doesn't stop a segment already being written in a worker thread, and the
+        # final flush could then seal the same segment alongside it
+        self._closing.set()
+        if self._journal_task is not None:
+            await asyncio.gather(self._journal_task, return_exceptions=True)
+        await self.flush()
@@ -1 +1,60 @@
+import discord
+from discord import app_commands
 
+
+class PermissionIndex:
+    """Per-guild sets of privileged role IDs, precomputed from data/guild_config.json.
+
+    ``privileged_roles`` entries may be role IDs or (case-insensitive) role
+    names; names are resolved to IDs whenever the guild's roles change, so a
+    permission check is a handful of set lookups instead of a scan of role
+    names.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.roles = {}
+
+    def _resolve(self, guild):
+        configured = self.config.get(guild.id, "privileged_roles", [])
+        ids = {int(entry) for entry in configured if str(entry).isdigit()}
+        names = {str(entry).lower() for entry in configured if not str(entry).isdigit()}
+        return {role.id for role in guild.roles if role.id in ids or role.name.lower() in names}
+
+    def rebuild(self, guild):
+        self.roles[guild.id] = self._resolve(guild)
+
+    def is_privileged(self, member):
+        if not isinstance(member, discord.Member):
+            return False
+        privileged = self.roles.get(member.guild.id)
+        if privileged is None:
+            self.rebuild(member.guild)
+            privileged = self.roles[member.guild.id]
+        # Member._roles holds the member's role IDs, no Role objects built
+        return not privileged.isdisjoint(member._roles)
+
+
+def setup_permissions(bot):
+    """Attach a PermissionIndex to ``bot`` and keep it in sync with role changes."""
+    bot.permissions = PermissionIndex(bot.guild_config)
+
+    async def on_guild_available(guild):
+        bot.permissions.rebuild(guild)
+
+    async def on_guild_role_change(role, after=None):
+        bot.permissions.rebuild(role.guild)
+
+    bot.add_listener(on_guild_available)
+    bot.add_listener(on_guild_available, "on_guild_join")
+    bot.add_listener(on_guild_role_change, "on_guild_role_create")
+    bot.add_listener(on_guild_role_change, "on_guild_role_delete")
+    bot.add_listener(on_guild_role_change, "on_guild_role_update")
+    return bot.permissions
+
+
+def is_privileged():
+    """App command check allowing only members holding a privileged role."""
+    async def predicate(interaction: discord.Interaction):
+        return interaction.client.permissions.is_privileged(interaction.user)
+    return app_commands.check(predicate)
@@ -0,0 +1,48 @@
+import hashlib
+import json
+
+from utils.storage import JsonStore
+
+SYNC_STATE_FILE = "data/command_sync.json"
+
+
+def _command_payload(tree, command):
+    # discord.py 2.4 added the tree argument to to_dict
+    try:
+        return command.to_dict(tree)
+    except TypeError:
+        return command.to_dict()
+
+
+def tree_fingerprint(tree, guild=None):
+    """Stable hash of the commands registered for ``guild`` (or globally)."""
+    payloads = sorted((_command_payload(tree, command) for command in tree.get_commands(guild=guild)),
+                      key=lambda payload: (payload.get("type", 1), payload["name"]))
+    return hashlib.sha256(json.dumps(payloads, sort_keys=True).encode()).hexdigest()
+
+
+class CommandSyncer:
+    """Calls ``tree.sync`` only when the registered commands differ from the last successful sync.
+
+    Fingerprints are persisted per scope ("global" or a guild ID), so restarts
+    and reconnects with an unchanged command tree skip the rate-limited call.
+    """
+
+    def __init__(self, tree, path=SYNC_STATE_FILE):
+        self.tree = tree
+        self.state = JsonStore(path, flush_delay=0)
+
+    def is_stale(self, guild=None):
+        scope = str(guild.id) if guild else "global"
+        return self.state.get(scope) != tree_fingerprint(self.tree, guild)
+
+    async def sync(self, guild=None, force=False):
+        """Sync ``guild`` if needed. Returns the synced commands, or None if nothing changed."""
+        scope = str(guild.id) if guild else "global"
+        fingerprint = tree_fingerprint(self.tree, guild)
+        if not force and self.state.get(scope) == fingerprint:
+            return None
+        synced = await self.tree.sync(guild=guild)
+        self.state.set(scope, fingerprint)
+        await self.state.flush()
+        return synced
@@ -1 +1,129 @@
+import asyncio
+import logging
+import os
+from datetime import timedelta
 
+# Discord rejects messages longer than this
+MESSAGE_LIMIT = 2000
+
+
+def chunk_text(text, limit=MESSAGE_LIMIT):
+    """Split text into pieces of at most ``limit`` characters, preferring line breaks."""
+    chunks = []
+    current = ""
+    for line in text.splitlines(keepends=True):
+        while len(line) > limit:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:limit])
+            line = line[limit:]
+        if len(current) + len(line) > limit:
+            chunks.append(current)
+            current = ""
+        current += line
+    if current:
+        chunks.append(current)
+    return [chunk.strip("\n") for chunk in chunks if chunk.strip()]
+
+
+def parse_duration(text):
+    """Parse durations like ``1d 2h 30m`` into a timedelta. Raises ValueError on bad input."""
+    units = {"d": "days", "h": "hours", "m": "minutes"}
+    total = timedelta()
+    parts = text.lower().split()
+    if not parts:
+        raise ValueError("Empty duration")
+    for part in parts:
+        if part[-1:] not in units or not part[:-1].isdigit():
+            raise ValueError(f"Invalid duration part {part!r}")
+        total += timedelta(**{units[part[-1]]: int(part[:-1])})
+    return total
+
+
+class ContentCache:
+    """Static text assets held in memory, pre-split into send-ready chunks.
+
+    ``get``/``chunks`` never touch disk. A background task polls file mtimes
+    and reloads changed files off the event loop, so edits apply without a
+    restart. A reload that fails (a bad encoding, a compile error) is logged
+    and the previous content stays in place until the file changes again.
+    """
+
+    def __init__(self, poll_interval=5.0):
+        self.poll_interval = poll_interval
+        self.entries = {}
+        self._watcher = None
+
+    async def preload(self, name, path, wrap="", reserve=0, compile=None):
+        """Load ``path`` under ``name``.
+
+        Each chunk is wrapped in ``wrap`` (e.g. a code fence) and kept short
+        enough that ``reserve`` extra characters can be added when sending.
+        ``compile(text)``, if given, runs in a worker thread on every (re)load
+        and its result is served by ``compiled``.
+        """
+        self.entries[name] = {"path": path, "wrap": wrap, "reserve": reserve, "compile": compile,
+                              "mtime": None, "text": None, "chunks": [], "compiled": None}
+        await self._reload(name)
+        if self._watcher is None or self._watcher.done():
+            self._watcher = asyncio.get_running_loop().create_task(self._watch())
+
+    def get(self, name):
+        entry = self.entries.get(name)
+        return entry["text"] if entry else None
+
+    def chunks(self, name):
+        entry = self.entries.get(name)
+        return entry["chunks"] if entry else []
+
+    def compiled(self, name):
+        entry = self.entries.get(name)
+        return entry["compiled"] if entry else None
+
+    async def _reload(self, name):
+        entry = self.entries[name]
+        mtime, text = await asyncio.to_thread(self._read, entry["path"])
+        wrap = entry["wrap"]
+        limit = MESSAGE_LIMIT - entry["reserve"] - 2 * (len(wrap) + 1)
+        chunks = [f"{wrap}\n{chunk}\n{wrap}" if wrap else chunk for chunk in chunk_text(text or "", limit)]
+        compiled = await asyncio.to_thread(entry["compile"], text or "") if entry["compile"] else None
+        # Swapped in together once everything is built, so readers never see a half-reloaded entry
+        entry.update(mtime=mtime, text=text, chunks=chunks, compiled=compiled)
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path, "r") as f:
+                return os.fstat(f.fileno()).st_mtime, f.read()
+        except FileNotFoundError:
+            return None, None
+
+    @staticmethod
+    def _mtime(path):
+        try:
+            return os.stat(path).st_mtime
+        except FileNotFoundError:
+            return None
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            for name, entry in list(self.entries.items()):
+                mtime = entry["mtime"]
+                try:
+                    mtime = await asyncio.to_thread(self._mtime, entry["path"])
+                    if mtime != entry["mtime"]:
+                        await self._reload(name)
+                except Exception as e:
+                    # Not retried until the file changes again
+                    entry["mtime"] = mtime
+                    logging.getLogger("bot").error(f"❌ Failed to reload {entry['path']}, keeping the previous version: {e}")
+
+    def stop(self):
+        if self._watcher:
+            self._watcher.cancel()
+
+
+# Shared by every cog so each asset is loaded and watched once
+content_cache = ContentCache()
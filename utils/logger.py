@@ -1 +1,179 @@
+import asyncio
+import json
+import logging
+import logging.handlers
+import os
+import queue
+from datetime import datetime, timezone
 
+import discord
+from config import STATE_DIR
+from utils.outbound import BACKGROUND
+
+AUDIT_LOG_FILE = f"{STATE_DIR}/logs/admin_actions.jsonl"
+AUDIT_CHANNEL_NAME = "leave-messages"
+
+# A burst of actions within this window is posted as one embed
+BATCH_WINDOW = 2.0
+# Discord allows 4096 characters in an embed description
+BATCH_MAX_CHARS = 4000
+# How long close() waits for what's still queued to be posted
+CLOSE_TIMEOUT = 10.0
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; structured ``fields`` are merged into it."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        return json.dumps(entry)
+
+
+def setup_audit_file_logger(path=AUDIT_LOG_FILE, max_bytes=5_000_000, backup_count=5):
+    """Return the "audit" logger writing JSONL through a background thread.
+
+    The logger only enqueues records (``QueueHandler``); formatting and the
+    rotating file write happen on the ``QueueListener`` thread.
+    """
+    logger = logging.getLogger("audit")
+    if logger.handlers:
+        return logger
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count)
+    file_handler.setFormatter(JsonFormatter())
+    records = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(records, file_handler)
+    listener.start()
+
+    logger.addHandler(logging.handlers.QueueHandler(records))
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    logger.listener = listener
+    return logger
+
+
+class ChannelBatcher:
+    """Posts lines to a per-guild text channel, coalescing bursts into embeds.
+
+    ``add`` only enqueues; a background task waits ``batch_window`` after the
+    first line, then posts everything queued as one embed per guild,
+    concurrently so one slow channel doesn't hold up the rest. The channel is
+    named by the guild's ``setting`` (``default_channel`` otherwise) and its
+    ID is resolved once and cached. ``close`` posts what is still queued
+    without waiting out the window.
+    """
+
+    def __init__(self, bot, setting, default_channel, title, color, batch_window=BATCH_WINDOW):
+        self.bot = bot
+        self.setting = setting
+        self.default_channel = default_channel
+        self.title = title
+        self.color = color
+        self.batch_window = batch_window
+        self.channel_ids = {}
+        self.pending = []
+        self._closing = asyncio.Event()
+        self._task = None
+
+    def add(self, guild_id, line):
+        self.pending.append((guild_id, line))
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def channel_for(self, guild_id):
+        channel = self.bot.get_channel(self.channel_ids.get(guild_id, 0))
+        if channel is None:
+            guild = self.bot.get_guild(guild_id)
+            name = self.bot.guild_config.get(guild_id, self.setting, self.default_channel)
+            channel = discord.utils.get(guild.text_channels, name=name) if guild else None
+            if channel is None:
+                return None
+            self.channel_ids[guild_id] = channel.id
+        return channel
+
+    async def _run(self):
+        # Lines added while a batch is posting go out with the next one
+        while self.pending:
+            try:
+                await asyncio.wait_for(self._closing.wait(), self.batch_window)
+            except asyncio.TimeoutError:
+                pass
+            batch, self.pending = self.pending, []
+
+            by_guild = {}
+            for guild_id, line in batch:
+                by_guild.setdefault(guild_id, []).append(line)
+            guild_ids = list(by_guild)
+            # One guild's failure (a deleted channel, a send cancelled by outbound.stop()) doesn't stop the rest
+            results = await asyncio.gather(*(self._post(guild_id, by_guild[guild_id]) for guild_id in guild_ids),
+                                           return_exceptions=True)
+            for guild_id, result in zip(guild_ids, results):
+                if isinstance(result, BaseException):
+                    logging.getLogger("bot").error(f"❌ Failed to post {self.title.lower()} for guild {guild_id}: {result!r}")
+
+    async def _post(self, guild_id, lines):
+        channel = self.channel_for(guild_id)
+        if channel is None:
+            return
+        description = ""
+        for line in lines:
+            line = line[:BATCH_MAX_CHARS]
+            if description and len(description) + len(line) + 1 > BATCH_MAX_CHARS:
+                await self._send(channel, description)
+                description = ""
+            description += line + "\n"
+        await self._send(channel, description)
+
+    async def _send(self, channel, description):
+        try:
+            embed = discord.Embed(title=self.title, description=description, color=self.color)
+            await self.bot.outbound.run(BACKGROUND, f"messages:{channel.id}", lambda: channel.send(embed=embed))
+        except discord.HTTPException as e:
+            logging.getLogger("bot").error(f"❌ Failed to post to #{channel.name}: {e}")
+
+    async def close(self, timeout=CLOSE_TIMEOUT):
+        """Post what is still queued, giving up after ``timeout`` seconds."""
+        self._closing.set()
+        if self._task is None or self._task.done():
+            return
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            logging.getLogger("bot").warning(f"⚠️ Gave up posting {self.title.lower()} after {timeout:.0f}s")
+
+
+class AuditLog(ChannelBatcher):
+    """Non-blocking audit trail for moderator actions.
+
+    ``record`` writes a structured line to the JSONL sink and enqueues the
+    action for the guild's audit channel.
+    """
+
+    def __init__(self, bot, batch_window=BATCH_WINDOW):
+        super().__init__(bot, "audit_channel", AUDIT_CHANNEL_NAME, "Moderation log", discord.Color.orange(), batch_window)
+        self.file_logger = setup_audit_file_logger()
+
+    def record(self, guild, action, moderator, reason=""):
+        self.file_logger.info(action, extra={"fields": {
+            "guild_id": guild.id,
+            "action": action,
+            "moderator": str(moderator),
+            "moderator_id": moderator.id,
+            "reason": reason,
+        }})
+        self.add(guild.id, f"**{action}**: {moderator} | Reason: {reason}")
+
+    async def close(self, timeout=CLOSE_TIMEOUT):
+        await super().close(timeout)
+        # Stopping the listener writes out the records still queued for the file
+        if self.file_logger.handlers:
+            self.file_logger.listener.stop()
+            for handler in list(self.file_logger.handlers):
+                self.file_logger.removeHandler(handler)
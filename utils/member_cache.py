@@ -0,0 +1,172 @@
+import json
+from collections import OrderedDict
+
+import discord
+
+# full:   discord.py default, every member of every guild is chunked and cached
+# lazy:   no chunking at startup; members are cached as they show up, a guild is chunked the first time a full list is needed
+# active: discord.py caches no members; a capped LRU keeps recently active ones and privileged members are pinned
+#
+# discord.py only dispatches on_member_update (and on_member_remove) for a member it held before the event,
+# so in lazy and active mode setup_member_cache reads GUILD_MEMBER_UPDATE from the raw gateway stream
+# (enable_debug_events) and dispatches every one as on_gateway_member_update(guild, user_id, role_ids);
+# role snapshots and the active-mode LRU listen to it. Guilds are never chunked in active mode, which also
+# means role snapshots skip their startup reconcile.
+CACHE_MODES = ("full", "lazy", "active")
+
+
+def member_cache_options(mode):
+    """Bot constructor options for a member cache mode."""
+    if mode not in CACHE_MODES:
+        raise ValueError(f"Unknown member cache mode {mode!r}, expected one of {', '.join(CACHE_MODES)}")
+    if mode == "full":
+        return {}
+    if mode == "lazy":
+        return {"chunk_guilds_at_startup": False, "enable_debug_events": True}
+    return {"chunk_guilds_at_startup": False, "enable_debug_events": True,
+            "member_cache_flags": discord.MemberCacheFlags.none()}
+
+
+class MemberLRU:
+    """Members keyed by (guild ID, user ID), evicting the least recently seen past ``capacity``."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.members = OrderedDict()
+
+    def __len__(self):
+        return len(self.members)
+
+    def get(self, guild_id, user_id):
+        member = self.members.get((guild_id, user_id))
+        if member is not None:
+            self.members.move_to_end((guild_id, user_id))
+        return member
+
+    def put(self, member):
+        key = (member.guild.id, member.id)
+        self.members[key] = member
+        self.members.move_to_end(key)
+        if len(self.members) > self.capacity:
+            self.members.popitem(last=False)
+
+    def discard(self, guild_id, user_id):
+        self.members.pop((guild_id, user_id), None)
+
+
+class MemberResolver:
+    """Member lookups that work in every cache mode.
+
+    Tries discord.py's cache, then our own LRU (``active`` mode), then the
+    REST API. Full member lists come from the cache when the guild is chunked
+    and from paginated ``fetch_members`` otherwise.
+    """
+
+    def __init__(self, bot, mode="full", capacity=10_000):
+        self.bot = bot
+        self.mode = mode
+        self.recent = MemberLRU(capacity)
+        self.pinned = {}
+
+    def remember(self, member):
+        if self.mode != "active" or not isinstance(member, discord.Member):
+            return
+        if self.bot.permissions.is_privileged(member):
+            self.pinned[(member.guild.id, member.id)] = member
+            self.recent.discard(member.guild.id, member.id)
+        else:
+            self.pinned.pop((member.guild.id, member.id), None)
+            self.recent.put(member)
+
+    def forget(self, guild_id, user_id):
+        self.pinned.pop((guild_id, user_id), None)
+        self.recent.discard(guild_id, user_id)
+
+    def cached(self, guild, user_id):
+        return (guild.get_member(user_id)
+                or self.pinned.get((guild.id, user_id))
+                or self.recent.get(guild.id, user_id))
+
+    async def get(self, guild, user_id):
+        """The member, fetched over REST if it isn't cached; None if they left the guild."""
+        member = self.cached(guild, user_id)
+        if member is not None:
+            return member
+        try:
+            member = await guild.fetch_member(user_id)
+        except discord.NotFound:
+            return None
+        self.remember(member)
+        return member
+
+    async def member_ids(self, guild, predicate=None):
+        """IDs of the guild's members matching ``predicate``, without requiring a full cache."""
+        if guild.chunked:
+            members = guild.members
+        elif self.mode == "lazy":
+            await guild.chunk()
+            members = guild.members
+        else:
+            # 1000 members per request; nothing beyond the matching IDs is kept
+            return [member.id async for member in guild.fetch_members(limit=None)
+                    if predicate is None or predicate(member)]
+        return [member.id for member in members if predicate is None or predicate(member)]
+
+    async def role_member_ids(self, guild, role):
+        if guild.chunked:
+            return [member.id for member in role.members]
+        return await self.member_ids(guild, lambda member: member.get_role(role.id) is not None)
+
+
+def dispatch_gateway_member_updates(bot):
+    """Dispatch ``on_gateway_member_update(guild, user_id, role_ids)`` for every GUILD_MEMBER_UPDATE.
+
+    Listeners also get the updates discord.py dispatched as on_member_update,
+    so handling one must be harmless to repeat.
+    """
+    async def on_socket_raw_receive(message):
+        # Runs for every gateway message; only member updates get parsed a second time
+        if "GUILD_MEMBER_UPDATE" not in message:
+            return
+        payload = json.loads(message)
+        if payload.get("t") != "GUILD_MEMBER_UPDATE":
+            return
+        data = payload["d"]
+        guild = bot.get_guild(int(data["guild_id"]))
+        if guild is not None:
+            bot.dispatch("gateway_member_update", guild, int(data["user"]["id"]),
+                         [int(role_id) for role_id in data["roles"]])
+
+    bot.add_listener(on_socket_raw_receive)
+
+
+def setup_member_cache(bot, mode, capacity):
+    """Attach a MemberResolver to ``bot`` and feed it the members seen in events."""
+    bot.member_cache = MemberResolver(bot, mode, capacity)
+    if mode == "full":
+        return bot.member_cache
+    dispatch_gateway_member_updates(bot)
+    if mode != "active":
+        return bot.member_cache
+
+    async def on_message(message):
+        if message.guild is not None:
+            bot.member_cache.remember(message.author)
+
+    async def on_member_join(member):
+        bot.member_cache.remember(member)
+
+    # A held member's roles may have changed; they are fetched (and pinned or not) again when next needed
+    async def on_gateway_member_update(guild, user_id, role_ids):
+        bot.member_cache.forget(guild.id, user_id)
+
+    # on_member_remove needs a cached member; the raw event always fires
+    async def on_raw_member_remove(payload):
+        bot.member_cache.forget(payload.guild_id, payload.user.id)
+
+    async def on_interaction(interaction):
+        bot.member_cache.remember(interaction.user)
+
+    for listener in (on_message, on_member_join, on_gateway_member_update, on_raw_member_remove, on_interaction):
+        bot.add_listener(listener)
+    return bot.member_cache
@@ -0,0 +1,316 @@
+import asyncio
+import logging
+import re
+import time
+from bisect import bisect_left, bisect_right
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+from config import STATE_DIR
+from utils.storage import atomic_write
+
+METRICS_FILE = f"{STATE_DIR}/metrics.prom"
+
+# Seconds; 3.0 is Discord's deadline for the first interaction response
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 2.5, 3.0, 5.0, 10.0, 30.0)
+INTERACTION_DEADLINE = 3.0
+# Interactions whose command never finished (failed before running, dropped) are forgotten after their
+# token's 15-minute lifetime
+STARTED_TTL = 900.0
+
+# discord.http logs every 429 as a warning with (method, url, retry_after), whether it retries or raises
+RATE_LIMIT_MESSAGE = "We are being rate limited."
+# ... and, at DEBUG, each bucket it will wait on before sending (by bucket hash, or route key until one is known)
+BUCKET_EXHAUSTED = "A rate limit bucket (%s) has been exhausted."
+BUCKET_FOUND = "%s has found its initial rate limit bucket hash (%s)."
+BUCKET_CHANGED = "A route (%s) has changed hashes: %s -> %s."
+SNOWFLAKE = re.compile(r"/\d{15,20}")
+# Route keys name their parameters ("/guilds/{guild_id}"); 429 routes are labelled with "{id}" instead
+ROUTE_PARAMETER = re.compile(r"\{\w+\}")
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; ``observe`` is one bisect and two additions."""
+
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class HandlerStats:
+    __slots__ = ("latency", "first_response", "errors", "late")
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.first_response = Histogram()
+        self.errors = 0
+        self.late = 0
+
+
+class LaneStats:
+    """Backpressure of one outbound scheduler lane: queue depth, queueing delay and what was saved or retried."""
+
+    __slots__ = ("depth", "wait", "sent", "coalesced", "retried")
+
+    def __init__(self):
+        self.depth = 0
+        self.wait = Histogram()
+        self.sent = 0
+        self.coalesced = 0
+        self.retried = 0
+
+
+class Metrics:
+    """Latency, error and rate-limit counters for commands, listeners, HTTP routes and outbound lanes."""
+
+    def __init__(self):
+        self.commands = {}
+        self.listeners = {}
+        self.rate_limits = {}
+        self.preemptive = {}
+        self.lanes = {}
+        self.started = {}
+        # Called with (method, url, retry_after) for every 429 discord.http reports
+        self.rate_limit_listeners = []
+
+    def _stats(self, table, name):
+        stats = table.get(name)
+        if stats is None:
+            stats = table[name] = HandlerStats()
+        return stats
+
+    def command_started(self, interaction):
+        now = time.perf_counter()
+        self.started[interaction.id] = now
+        # Insertion order is start order, so stale entries are always at the front
+        oldest = next(iter(self.started))
+        while now - self.started[oldest] > STARTED_TTL:
+            del self.started[oldest]
+            oldest = next(iter(self.started))
+
+    def watch_response(self, interaction, bound=None):
+        """Check ``interaction.response.is_done()`` at each bucket bound until it is, recording that bound.
+
+        Bounds are measured from Discord's own creation time, like the
+        3-second deadline, so the first response is timed at the histogram's
+        resolution without hooking the response itself.
+        """
+        if interaction.command is None:
+            return
+        if bound is not None and interaction.response.is_done():
+            self.command_responded(interaction, bound)
+            return
+        elapsed = (discord.utils.utcnow() - interaction.created_at).total_seconds()
+        index = bisect_right(BUCKETS, elapsed)
+        if index == len(BUCKETS):
+            # Never answered
+            self._stats(self.commands, interaction.command.qualified_name).late += 1
+            return
+        asyncio.get_running_loop().call_later(BUCKETS[index] - elapsed, self.watch_response, interaction, BUCKETS[index])
+
+    def command_responded(self, interaction, elapsed):
+        stats = self._stats(self.commands, interaction.command.qualified_name)
+        stats.first_response.observe(elapsed)
+        if elapsed > INTERACTION_DEADLINE:
+            stats.late += 1
+
+    def command_finished(self, interaction, command, failed=False):
+        start = self.started.pop(interaction.id, None)
+        if command is None:
+            return
+        stats = self._stats(self.commands, command.qualified_name)
+        if start is not None:
+            stats.latency.observe(time.perf_counter() - start)
+        if failed:
+            stats.errors += 1
+
+    def listener_finished(self, event_name, elapsed):
+        self._stats(self.listeners, event_name).latency.observe(elapsed)
+
+    def listener_failed(self, event_name):
+        self._stats(self.listeners, event_name).errors += 1
+
+    def lane(self, name):
+        stats = self.lanes.get(name)
+        if stats is None:
+            stats = self.lanes[name] = LaneStats()
+        return stats
+
+    def rate_limited(self, method, url, retry_after):
+        self.route_limited(f"{method} {SNOWFLAKE.sub('/{id}', url.split('/api/v10', 1)[-1])}", retry_after)
+        for listener in self.rate_limit_listeners:
+            listener(method, url, retry_after)
+
+    def route_limited(self, route, retry_after):
+        entry = self.rate_limits.setdefault(route, [0, 0.0])
+        entry[0] += 1
+        entry[1] += retry_after
+
+    def bucket_exhausted(self, route):
+        """discord.py will hold the route's next request until its bucket resets (a pre-emptive wait)."""
+        route = ROUTE_PARAMETER.sub("{id}", route)
+        self.preemptive[route] = self.preemptive.get(route, 0) + 1
+
+    def slowest_commands(self, limit=5):
+        ranked = sorted(self.commands.items(), key=lambda item: item[1].latency.quantile(0.99), reverse=True)
+        return ranked[:limit]
+
+    def summary_lines(self, limit=None):
+        lines = []
+        for name, stats in self.slowest_commands(limit or len(self.commands)):
+            lines.append(
+                f"/{name}: {stats.latency.count} calls, p50 {stats.latency.quantile(0.5) * 1000:.0f}ms, "
+                f"p99 {stats.latency.quantile(0.99) * 1000:.0f}ms, first response p99 "
+                f"{stats.first_response.quantile(0.99) * 1000:.0f}ms, {stats.late} late, {stats.errors} errors"
+            )
+        return lines
+
+    def lane_lines(self):
+        return [
+            f"{name}: {stats.depth} queued, wait p50 {stats.wait.quantile(0.5) * 1000:.0f}ms, "
+            f"p99 {stats.wait.quantile(0.99) * 1000:.0f}ms, {stats.sent} sent, {stats.coalesced} coalesced, "
+            f"{stats.retried} retried"
+            for name, stats in self.lanes.items()
+        ]
+
+    def to_prometheus(self):
+        lines = []
+        for kind, table in (("command", self.commands), ("listener", self.listeners)):
+            for name, stats in sorted(table.items()):
+                label = f'{kind}="{name}"'
+                lines.extend(_histogram_lines(f"bot_{kind}_latency_seconds", label, stats.latency))
+                if kind == "command":
+                    lines.extend(_histogram_lines("bot_command_first_response_seconds", label, stats.first_response))
+                    lines.append(f"bot_command_late_responses_total{{{label}}} {stats.late}")
+                lines.append(f"bot_{kind}_errors_total{{{label}}} {stats.errors}")
+        for route, (count, waited) in sorted(self.rate_limits.items()):
+            lines.append(f'bot_http_rate_limited_total{{route="{route}"}} {count}')
+            lines.append(f'bot_http_rate_limit_wait_seconds_total{{route="{route}"}} {waited:.3f}')
+        for route, count in sorted(self.preemptive.items()):
+            lines.append(f'bot_http_preemptive_waits_total{{route="{route}"}} {count}')
+        for name, stats in self.lanes.items():
+            label = f'lane="{name}"'
+            lines.append(f"bot_outbound_queue_depth{{{label}}} {stats.depth}")
+            lines.extend(_histogram_lines("bot_outbound_wait_seconds", label, stats.wait))
+            lines.append(f"bot_outbound_sent_total{{{label}}} {stats.sent}")
+            lines.append(f"bot_outbound_coalesced_total{{{label}}} {stats.coalesced}")
+            lines.append(f"bot_outbound_retried_total{{{label}}} {stats.retried}")
+        return "\n".join(lines) + "\n"
+
+    async def export(self, path=METRICS_FILE, interval=15.0):
+        """Rewrite a Prometheus text file (for node_exporter's textfile collector) every ``interval`` seconds."""
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.to_thread(atomic_write, path, self.to_prometheus())
+
+
+def _histogram_lines(metric, label, histogram):
+    lines = []
+    cumulative = 0
+    for bound, count in zip(BUCKETS, histogram.counts):
+        cumulative += count
+        lines.append(f'{metric}_bucket{{{label},le="{bound}"}} {cumulative}')
+    lines.append(f'{metric}_bucket{{{label},le="+Inf"}} {histogram.count}')
+    lines.append(f"{metric}_sum{{{label}}} {histogram.total:.6f}")
+    lines.append(f"{metric}_count{{{label}}} {histogram.count}")
+    return lines
+
+
+class InstrumentedTree(app_commands.CommandTree):
+    """Command tree that timestamps every interaction and watches for its first response before its command runs."""
+
+    async def interaction_check(self, interaction):
+        self.client.metrics.command_started(interaction)
+        self.client.metrics.watch_response(interaction)
+        return True
+
+
+class InstrumentedBot(commands.AutoShardedBot):
+    """Bot that times every event listener, including cog listeners.
+
+    Auto-sharded: one process runs every shard by default, or the subset
+    given by ``shard_ids`` when launched as part of a cluster.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, tree_cls=InstrumentedTree, **kwargs)
+        self.metrics = Metrics()
+
+    async def setup_hook(self):
+        await super().setup_hook()
+        self.metrics_export = asyncio.create_task(self.metrics.export())
+
+    async def _run_event(self, coro, event_name, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            await super()._run_event(coro, event_name, *args, **kwargs)
+        finally:
+            self.metrics.listener_finished(event_name, time.perf_counter() - start)
+
+    async def on_error(self, event_method, *args, **kwargs):
+        self.metrics.listener_failed(event_method)
+        await super().on_error(event_method, *args, **kwargs)
+
+    async def on_app_command_completion(self, interaction, command):
+        self.metrics.command_finished(interaction, command)
+
+
+class RateLimitFilter(logging.Filter):
+    """Feeds discord.http's rate-limit log lines into Metrics without touching the HTTP client.
+
+    429s are warnings, but pre-emptive waits are only logged at DEBUG, so the
+    logger is opened up to DEBUG and this filter, after reading a record,
+    drops it again unless its parent logger would have let it through.
+    """
+
+    def __init__(self, metrics, logger):
+        super().__init__()
+        self.metrics = metrics
+        self.parent = logger.parent
+        # Bucket hash -> route key, learnt from the same debug lines
+        self.buckets = {}
+
+    def filter(self, record):
+        if isinstance(record.msg, str):
+            self._read(record.msg, record.args)
+        return record.levelno >= self.parent.getEffectiveLevel()
+
+    def _read(self, message, args):
+        if message.startswith(RATE_LIMIT_MESSAGE) and len(args) >= 3:
+            method, url, retry_after = args[:3]
+            self.metrics.rate_limited(str(method), str(url), float(retry_after))
+        elif message.startswith(BUCKET_EXHAUSTED):
+            self.metrics.bucket_exhausted(self.buckets.get(args[0], str(args[0])))
+        elif message == BUCKET_FOUND:
+            self.buckets[args[1]] = args[0]
+        elif message == BUCKET_CHANGED:
+            self.buckets[args[2]] = args[0]
+
+
+def instrument(bot):
+    """Start collecting metrics for ``bot``: 429s and pre-emptive waits per route. Calling it again is a no-op."""
+    logger = logging.getLogger("discord.http")
+    if not any(isinstance(watcher, RateLimitFilter) and watcher.metrics is bot.metrics for watcher in logger.filters):
+        logger.addFilter(RateLimitFilter(bot.metrics, logger))
+        logger.setLevel(logging.DEBUG)
@@ -0,0 +1,142 @@
+import asyncio
+import itertools
+import logging
+import time
+
+from config import STATE_DIR
+from utils.scheduler import Scheduler
+from utils.storage import AppendLog
+
+TIMERS_FILE = f"{STATE_DIR}/moderation_timers.jsonl"
+
+# Journal writes are batched; a catch-up burst costs one append, not one per timer
+JOURNAL_FLUSH_DELAY = 0.5
+# Rewrite the journal once it holds this many finished timers, and more of them than live ones
+COMPACT_AFTER = 10_000
+# A failed handler is retried after RETRY_DELAY seconds, doubling per attempt up to RETRY_MAX
+RETRY_DELAY = 30.0
+RETRY_MAX = 3600.0
+
+logger = logging.getLogger("bot")
+
+
+class ModerationTimers:
+    """Persistent moderation deadlines (warning expiry, temp bans, role restores).
+
+    Timers are journaled to an append-only log and replayed on load; a single
+    Scheduler fires them, so anything that came due while the bot was down runs
+    in one pass at startup. ``handlers`` maps a timer kind to
+    ``async handler(timer)``. A timer is only finished once its handler
+    succeeds; a handler that raises is retried with exponential backoff.
+    """
+
+    def __init__(self, handlers, path=TIMERS_FILE):
+        self.handlers = handlers
+        self.log = AppendLog(path)
+        self.scheduler = Scheduler(self._fire)
+        self.timers = {}
+        self.index = {}
+        self.finished = 0
+        self.attempts = {}
+        self._ids = itertools.count(1)
+        self._journal_buffer = []
+        self._journal_task = None
+
+    async def load(self):
+        timers = {}
+        for record in await asyncio.to_thread(self.log.read_all):
+            if record["op"] == "add":
+                timers[record["id"]] = record
+            else:
+                timers.pop(record["id"], None)
+                self.finished += 1
+
+        self._ids = itertools.count(max(timers, default=0) + 1)
+        for timer in timers.values():
+            self._track(timer, schedule=False)
+        self.scheduler.schedule_many((timer["when"], timer["id"]) for timer in timers.values())
+        self.scheduler.start()
+
+    def __len__(self):
+        return len(self.timers)
+
+    def _track(self, timer, schedule=True):
+        self.timers[timer["id"]] = timer
+        self.index.setdefault((timer["kind"], timer["key"]), []).append(timer["id"])
+        if schedule:
+            self.scheduler.schedule(timer["when"], timer["id"])
+
+    def _untrack(self, timer_id):
+        timer = self.timers.pop(timer_id, None)
+        if timer is None:
+            return None
+        ids = self.index.get((timer["kind"], timer["key"]), [])
+        if timer_id in ids:
+            ids.remove(timer_id)
+        if not ids:
+            self.index.pop((timer["kind"], timer["key"]), None)
+        self.scheduler.cancel(timer_id)
+        self.attempts.pop(timer_id, None)
+        self.finished += 1
+        self._journal({"op": "done", "id": timer_id})
+        return timer
+
+    def add(self, kind, delay, key, **data):
+        """Run the ``kind`` handler ``delay`` seconds from now. ``key`` groups timers for lookup."""
+        timer = {"op": "add", "id": next(self._ids), "kind": kind, "key": str(key), "when": time.time() + delay, "data": data}
+        self._track(timer)
+        self._journal(timer)
+        return timer
+
+    def pending(self, kind, key):
+        """Timers of ``kind`` for ``key``, soonest first."""
+        ids = self.index.get((kind, str(key)), [])
+        return sorted((self.timers[timer_id] for timer_id in ids), key=lambda timer: timer["when"])
+
+    def cancel(self, timer_id):
+        return self._untrack(timer_id) is not None
+
+    async def _fire(self, timer_id):
+        timer = self.timers.get(timer_id)
+        if timer is None:
+            return
+        try:
+            await self.handlers[timer["kind"]](timer)
+        except Exception as e:
+            if timer_id not in self.timers:
+                return  # Cancelled while its handler ran
+            attempt = self.attempts.get(timer_id, 0) + 1
+            self.attempts[timer_id] = attempt
+            delay = min(RETRY_DELAY * 2 ** (attempt - 1), RETRY_MAX)
+            # Still journaled as pending, so a restart retries it too
+            self.scheduler.schedule(time.time() + delay, timer_id)
+            logger.warning(f"⚠️ {timer['kind']} timer {timer_id} failed ({e}); retry {attempt} in {delay:.0f}s")
+        else:
+            self.attempts.pop(timer_id, None)
+            self._untrack(timer_id)
+
+    def _journal(self, record):
+        self._journal_buffer.append(record)
+        if self._journal_task is None or self._journal_task.done():
+            self._journal_task = asyncio.get_running_loop().create_task(self._flush_journal())
+
+    async def _flush_journal(self):
+        # Records journaled while a flush is writing are picked up by the next round
+        while self._journal_buffer:
+            await asyncio.sleep(JOURNAL_FLUSH_DELAY)
+            await self.flush()
+
+    async def flush(self):
+        records, self._journal_buffer = self._journal_buffer, []
+        if self.finished > COMPACT_AFTER and self.finished > len(self.timers):
+            # Live timers are the whole state; the buffered records are already reflected in them
+            await self.log.rewrite(list(self.timers.values()))
+            self.finished = 0
+        elif records:
+            await self.log.append(*records)
+
+    async def close(self):
+        self.scheduler.stop()
+        if self._journal_task and not self._journal_task.done():
+            self._journal_task.cancel()
+        await self.flush()
@@ -0,0 +1,304 @@
+import asyncio
+import re
+import time
+from collections import OrderedDict, deque
+
+import discord
+
+from utils.metrics import Metrics
+from utils.ratelimit import TokenBucket
+
+# Lanes, always served in this order
+INTERACTION = 0  # REST calls a moderator's pending command response waits on (bans, kicks, timeouts)
+USER = 1         # onboarding DMs and reactions, poll reactions
+BACKGROUND = 2   # audit and report posts, progress edits, poll results
+BULK = 3         # bulk role jobs and purges
+LANE_NAMES = ("interaction", "user", "background", "bulk")
+
+# Starting budget per route, by the prefix before the first ":" (requests, seconds);
+# a 429 blocks the route for its retry_after on top of this
+ROUTE_LIMITS = {
+    "messages": (5, 5.0),    # per channel, DM channels included
+    "reactions": (4, 1.0),   # per channel
+    "members": (10, 1.0),    # member and role edits per guild
+    "bans": (10, 1.0),       # bans, unbans and kicks per guild
+    "deletes": (5, 5.0),     # single message deletes per channel
+}
+DEFAULT_ROUTE_LIMIT = (5, 1.0)
+
+# Per bot token, below Discord's 50 requests/s so discord.py's own calls (gateway chunking, fetches) still
+# fit; bot.py divides it between the launcher's processes, which share the token
+GLOBAL_RATE = 40
+GLOBAL_PER = 1.0
+MAX_IN_FLIGHT = 16
+# In-flight slots only the interaction lane may use, so bulk calls parked in discord.py's own bucket
+# waits can never hold every slot while a ban is queued
+RESERVED_SLOTS = 2
+MAX_RETRIES = 5
+# Idle route buckets are dropped once there are this many
+PRUNE_AFTER = 5_000
+
+# Request lines of discord.http's 429 warnings mapped back to the route keys above, so a 429 discord.py
+# retried by itself still holds back the rest of that route's queue (DM channels can't be mapped: their
+# routes are keyed by user)
+ROUTE_PATTERNS = (
+    ("bans", re.compile(r"(?:PUT|DELETE) /guilds/(\d+)/bans/\d+$")),
+    ("bans", re.compile(r"DELETE /guilds/(\d+)/members/\d+$")),
+    ("members", re.compile(r"(?:PATCH|PUT|DELETE) /guilds/(\d+)/members/\d+")),
+    ("bulk_deletes", re.compile(r"POST /channels/(\d+)/messages/bulk[-_]delete$")),
+    ("reactions", re.compile(r"(?:PUT|DELETE) /channels/(\d+)/messages/\d+/reactions/")),
+    ("deletes", re.compile(r"DELETE /channels/(\d+)/messages/\d+$")),
+    ("messages", re.compile(r"POST /channels/(\d+)/messages$")),
+    ("webhook_messages", re.compile(r"PATCH /webhooks/\d+/[^/]+/messages/(\d+)$")),
+)
+
+
+def route_for(method, url):
+    """The route key a request was queued under, or None if it isn't one the scheduler knows."""
+    request = f"{method} {url.split('/api/v10', 1)[-1].split('?', 1)[0]}"
+    for prefix, pattern in ROUTE_PATTERNS:
+        match = pattern.match(request)
+        if match:
+            return f"{prefix}:{match.group(1)}"
+    return None
+
+
+def _is_rate_limit(error):
+    # discord.RateLimited (raised instead of waiting past max_ratelimit_timeout) carries no status
+    return isinstance(error, discord.RateLimited) or getattr(error, "status", None) == 429
+
+
+class OutboundAction:
+    __slots__ = ("lane", "route", "factory", "key", "waiters", "submitted", "retries")
+
+    def __init__(self, lane, route, factory, key):
+        self.lane = lane
+        self.route = route
+        self.factory = factory
+        self.key = key
+        # One future per submitter, so one of them cancelling doesn't cancel the others
+        self.waiters = []
+        self.submitted = time.monotonic()
+        self.retries = 0
+
+    @property
+    def abandoned(self):
+        return all(waiter.done() for waiter in self.waiters)
+
+    def resolve(self, result=None, error=None):
+        for waiter in self.waiters:
+            if waiter.done():
+                continue
+            if error is not None:
+                waiter.set_exception(error)
+            else:
+                waiter.set_result(result)
+
+    def cancel(self):
+        for waiter in self.waiters:
+            waiter.cancel()
+
+
+class OutboundScheduler:
+    """One queue for the REST calls every cog makes, so bulk work never delays urgent work.
+
+    ``submit(lane, route, factory)`` queues ``factory()``, a coroutine function
+    making one REST call, and returns a future of its result. Actions leave
+    in lane order under a global token bucket; within a lane they are FIFO per
+    route and round-robin across routes. A route whose own bucket is empty (or
+    blocked by a 429) is skipped rather than holding up the others, and the
+    429'd action goes back to the front of its route; 429s discord.py
+    retries internally block the route too, through the metrics' rate-limit
+    listeners. Other lanes never hold more than ``concurrency - reserved`` of
+    the in-flight slots. Submitting with the ``key`` of an action that hasn't started
+    replaces its factory: the newest edit of a message is sent once and every
+    submitter gets its result. An action every submitter has cancelled is
+    dropped before it is sent.
+    """
+
+    def __init__(self, metrics=None, rate=GLOBAL_RATE, per=GLOBAL_PER, concurrency=MAX_IN_FLIGHT,
+                 reserved=RESERVED_SLOTS, route_limits=ROUTE_LIMITS, default_limit=DEFAULT_ROUTE_LIMIT):
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.stats = [self.metrics.lane(name) for name in LANE_NAMES]
+        self.bucket = TokenBucket(rate, per)
+        self.route_limits = route_limits
+        self.default_limit = default_limit
+        self.concurrency = concurrency
+        self.shared_slots = max(1, concurrency - reserved)
+        # One route -> deque of actions map per lane
+        self.lanes = [OrderedDict() for _ in LANE_NAMES]
+        self.buckets = {}
+        self.keyed = {}
+        # In-flight task -> its action
+        self._running = {}
+        # In-flight actions outside the interaction lane
+        self._shared = 0
+        self._wake = asyncio.Event()
+        self._slots = None
+        self._task = None
+        self.metrics.rate_limit_listeners.append(self.rate_limited)
+
+    def __len__(self):
+        return sum(stats.depth for stats in self.stats)
+
+    @property
+    def in_flight(self):
+        return len(self._running)
+
+    def submit(self, lane, route, factory, key=None):
+        """Queue ``factory()`` on ``route`` (e.g. ``f"messages:{channel.id}"``); returns a future of its result."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        action = self.keyed.get(key) if key is not None else None
+        if action is not None:
+            action.factory = factory
+            action.waiters.append(future)
+            self.stats[action.lane].coalesced += 1
+            return future
+        action = OutboundAction(lane, route, factory, key)
+        action.waiters.append(future)
+        if key is not None:
+            self.keyed[key] = action
+        self._push(action)
+        if self._task is None or self._task.done():
+            self._slots = asyncio.Semaphore(self.concurrency)
+            self._task = loop.create_task(self._dispatch())
+        return future
+
+    async def run(self, lane, route, factory, key=None):
+        return await self.submit(lane, route, factory, key)
+
+    def _push(self, action, front=False):
+        actions = self.lanes[action.lane].setdefault(action.route, deque())
+        if front:
+            actions.appendleft(action)
+        else:
+            actions.append(action)
+        self.stats[action.lane].depth += 1
+        self._wake.set()
+
+    def _bucket(self, route):
+        bucket = self.buckets.get(route)
+        if bucket is None:
+            rate, per = self.route_limits.get(route.split(":", 1)[0], self.default_limit)
+            bucket = self.buckets[route] = TokenBucket(rate, per)
+        return bucket
+
+    def _next(self, now):
+        """The lane and route of the first action whose route has a token, or the seconds until one might."""
+        soonest = None
+        for lane, routes in enumerate(self.lanes):
+            if lane != INTERACTION and self._shared >= self.shared_slots:
+                # The free slots are held for the interaction lane; one finishing wakes the dispatcher
+                break
+            for route in routes:
+                delay = self._bucket(route).delay(now)
+                if not delay:
+                    return lane, route, 0.0
+                soonest = delay if soonest is None else min(soonest, delay)
+        return None, None, soonest
+
+    async def _dispatch(self):
+        while True:
+            await self._slots.acquire()
+            while True:
+                self._wake.clear()
+                lane, route, delay = self._next(time.monotonic())
+                if route is not None:
+                    # The global bucket is checked last so a token is never spent on a blocked route
+                    delay = self.bucket.delay()
+                    if not delay:
+                        break
+                try:
+                    await asyncio.wait_for(self._wake.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+
+            routes = self.lanes[lane]
+            actions = routes[route]
+            action = actions.popleft()
+            if actions:
+                routes.move_to_end(route)
+            else:
+                del routes[route]
+            self.stats[lane].depth -= 1
+            if action.key is not None and self.keyed.get(action.key) is action:
+                del self.keyed[action.key]
+            if action.abandoned:
+                # Cancelled by every submitter while queued
+                self._slots.release()
+                continue
+
+            self.bucket.take()
+            self._bucket(route).take()
+            if lane != INTERACTION:
+                self._shared += 1
+            self.stats[lane].wait.observe(time.monotonic() - action.submitted)
+            # Held here so the loop can't garbage-collect a request mid-flight
+            task = asyncio.get_running_loop().create_task(self._run(action))
+            self._running[task] = action
+            task.add_done_callback(self._running.pop)
+            if len(self.buckets) > PRUNE_AFTER:
+                self._prune()
+
+    async def _run(self, action):
+        try:
+            result = await action.factory()
+        except Exception as e:
+            if _is_rate_limit(e) and action.retries < MAX_RETRIES:
+                retry_after = getattr(e, "retry_after", None)
+                retry_after = retry_after if retry_after is not None else 1.0
+                # Counted per route by the metrics from discord.http's log, not again here
+                self._bucket(action.route).block(retry_after)
+                self.stats[action.lane].retried += 1
+                action.retries += 1
+                self._requeue(action)
+            else:
+                action.resolve(error=e)
+        else:
+            self.stats[action.lane].sent += 1
+            action.resolve(result)
+        finally:
+            if action.lane != INTERACTION:
+                self._shared -= 1
+            self._slots.release()
+            self._wake.set()
+
+    def _requeue(self, action):
+        newer = self.keyed.get(action.key) if action.key is not None else None
+        if newer is not None:
+            # A newer edit of the same thing is already queued; its result stands for both
+            newer.waiters.extend(action.waiters)
+            return
+        if action.key is not None:
+            self.keyed[action.key] = action
+        self._push(action, front=True)
+
+    def _prune(self):
+        queued = {route for routes in self.lanes for route in routes}
+        now = time.monotonic()
+        for route in [route for route, bucket in self.buckets.items()
+                      if route not in queued and not bucket.delay(now) and bucket.tokens >= bucket.rate]:
+            del self.buckets[route]
+
+    def rate_limited(self, method, url, retry_after):
+        """Block the route of a request discord.py got a 429 for (fed from its rate-limit log)."""
+        route = route_for(method, url)
+        if route is not None:
+            self._bucket(route).block(retry_after)
+            self._wake.set()
+
+    def stop(self):
+        """Stop sending; everyone still waiting on a queued or in-flight action gets CancelledError."""
+        if self._task:
+            self._task.cancel()
+        for task, action in list(self._running.items()):
+            task.cancel()
+            action.cancel()
+        for stats, routes in zip(self.stats, self.lanes):
+            for actions in routes.values():
+                for action in actions:
+                    action.cancel()
+            routes.clear()
+            stats.depth = 0
+        self.keyed.clear()
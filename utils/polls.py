@@ -0,0 +1,111 @@
+import logging
+import time
+from datetime import datetime, timezone
+
+from config import STATE_DIR
+from utils.scheduler import Scheduler
+from utils.storage import JsonStore
+
+POLLS_FILE = f"{STATE_DIR}/polls.json"
+POLL_EMOJIS = ['🇦', '🇧', '🇨', '🇩', '🇪']
+EMOJI_INDEX = {emoji: index for index, emoji in enumerate(POLL_EMOJIS)}
+# Posting results that failed is retried after RETRY_DELAY seconds, doubling per attempt up to RETRY_MAX
+RETRY_DELAY = 30.0
+RETRY_MAX = 3600.0
+
+logger = logging.getLogger("bot")
+
+
+class PollEngine:
+    """Open polls with live tallies, closed by one shared scheduler.
+
+    Polls are keyed by message ID, so a reaction event is a dict lookup and a
+    counter update; nothing is refetched from Discord. ``on_close(poll)`` is
+    awaited when a poll's deadline passes, including deadlines that passed
+    while the bot was offline. A poll is only removed once ``on_close``
+    succeeds; if it raises, the poll stays open and is retried with backoff.
+    """
+
+    def __init__(self, on_close, path=POLLS_FILE):
+        self.on_close = on_close
+        self.store = JsonStore(path)
+        self.scheduler = Scheduler(self.close)
+        self.attempts = {}
+
+    def start(self):
+        self.scheduler.schedule_many((poll["closes_at"], message_id) for message_id, poll in self.store.data.items())
+        self.scheduler.start()
+
+    async def stop(self):
+        self.scheduler.stop()
+        await self.store.close()
+
+    def __len__(self):
+        return len(self.store.data)
+
+    def create(self, message_id, guild_id, channel_id, author_id, question, options, closes_at):
+        poll = {
+            "guild_id": guild_id,
+            "channel_id": channel_id,
+            "author_id": author_id,
+            "question": question,
+            "options": options,
+            "counts": [0] * len(options),
+            "closes_at": closes_at,
+        }
+        self.store.set(str(message_id), poll)
+        self.scheduler.schedule(closes_at, str(message_id))
+        return poll
+
+    def react(self, message_id, emoji, delta):
+        """Apply one reaction add (+1) or remove (-1). Returns False if it isn't a poll vote."""
+        poll = self.store.get(str(message_id))
+        index = EMOJI_INDEX.get(emoji)
+        if poll is None or index is None or index >= len(poll["counts"]):
+            return False
+        poll["counts"][index] = max(0, poll["counts"][index] + delta)
+        self.store.mark_dirty()
+        return True
+
+    async def close(self, message_id):
+        key = str(message_id)
+        poll = self.store.get(key)
+        if poll is None:
+            return None
+        try:
+            await self.on_close(int(message_id), poll)
+        except Exception as e:
+            attempt = self.attempts.get(key, 0) + 1
+            self.attempts[key] = attempt
+            delay = min(RETRY_DELAY * 2 ** (attempt - 1), RETRY_MAX)
+            # Still in the store, so a restart retries it too
+            self.scheduler.schedule(time.time() + delay, key)
+            logger.warning(f"⚠️ Closing poll {key} failed ({e}); retry {attempt} in {delay:.0f}s")
+            return None
+        self.attempts.pop(key, None)
+        self.store.pop(key)
+        self.scheduler.cancel(key)
+        return poll
+
+    @staticmethod
+    def results(poll):
+        total = sum(poll["counts"])
+        lines = []
+        for emoji, option, count in zip(POLL_EMOJIS, poll["options"], poll["counts"]):
+            share = f"{count / total:.0%}" if total else "0%"
+            lines.append(f"{emoji} {option}: **{count}** ({share})")
+        return lines, total
+
+
+def closes_in(hours=None, until=None, default_hours=24):
+    """Deadline timestamp from either a number of hours or a UTC "YYYY-MM-DD HH:MM:SS".
+
+    Raises ``ValueError`` for a malformed time or a deadline that isn't in the future.
+    """
+    if until:
+        deadline = datetime.strptime(until, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc).timestamp()
+    else:
+        deadline = time.time() + (hours if hours is not None else default_hours) * 3600
+    if deadline <= time.time():
+        raise ValueError("Poll deadline is not in the future")
+    return deadline
@@ -0,0 +1,127 @@
+import asyncio
+import re
+import time
+from datetime import datetime, timedelta, timezone
+
+from utils.outbound import BULK
+from utils.ratelimit import TokenBucket
+
+# Discord only bulk-deletes batches of up to 100 messages younger than 14 days
+BULK_DELETE_MAX = 100
+BULK_DELETE_MAX_AGE = timedelta(days=14) - timedelta(minutes=5)
+
+# Older messages are deleted one by one on a much stricter limit
+SINGLE_DELETE_RATE = 5
+SINGLE_DELETE_PER = 5.0
+SINGLE_DELETE_QUEUE = 200
+
+
+def build_filter(author_id=None, pattern=None, attachments_only=False):
+    """Combine the purge options into a single message predicate.
+
+    The time window isn't part of it: ``purge_channel`` bounds the history
+    scan itself. Raises ``re.error`` for an invalid ``pattern``.
+    """
+    regex = re.compile(pattern, re.IGNORECASE) if pattern else None
+
+    def check(message):
+        if author_id is not None and message.author.id != author_id:
+            return False
+        if attachments_only and not message.attachments:
+            return False
+        if regex is not None and not regex.search(message.content):
+            return False
+        return True
+
+    return check
+
+
+class PurgeProgress:
+    def __init__(self, amount):
+        self.amount = amount
+        self.scanned = 0
+        self.matched = 0
+        self.bulk_deleted = 0
+        self.single_deleted = 0
+        self.failed = 0
+        self.finished = False
+
+    @property
+    def deleted(self):
+        return self.bulk_deleted + self.single_deleted
+
+
+async def purge_channel(channel, amount, check, outbound, since=None, on_progress=None, progress_interval=5.0):
+    """Stream ``channel`` history and delete up to ``amount`` messages passing ``check``.
+
+    With ``since``, only history after it is fetched, so a time-limited purge
+    stops at the cutoff instead of scanning the whole channel.
+
+    Recent messages are grouped into 100-message bulk deletes; older ones go
+    through a bounded, throttled single-delete lane. At most one batch plus
+    the lane's queue is held in memory, whatever ``amount`` is. Deletes are
+    bulk work on the ``outbound`` scheduler.
+    """
+    progress = PurgeProgress(amount)
+    cutoff = datetime.now(timezone.utc) - BULK_DELETE_MAX_AGE
+    old_messages = asyncio.Queue(maxsize=SINGLE_DELETE_QUEUE)
+    single_lane = asyncio.create_task(_single_delete_lane(outbound, channel, old_messages, progress))
+    batch = []
+    last_report = time.monotonic()
+
+    try:
+        # An ``after`` bound would otherwise flip the history to oldest first
+        async for message in channel.history(limit=None, after=since, oldest_first=False):
+            progress.scanned += 1
+            if not check(message):
+                continue
+            progress.matched += 1
+
+            if message.created_at > cutoff:
+                batch.append(message)
+                if len(batch) == BULK_DELETE_MAX:
+                    await _bulk_delete(outbound, channel, batch, progress)
+                    batch = []
+            else:
+                # Blocks while the lane is behind, which keeps memory bounded
+                await old_messages.put(message)
+
+            if on_progress and time.monotonic() - last_report >= progress_interval:
+                last_report = time.monotonic()
+                await on_progress(progress)
+            if progress.matched >= amount:
+                break
+
+        if batch:
+            await _bulk_delete(outbound, channel, batch, progress)
+        await old_messages.put(None)
+        await single_lane
+    finally:
+        single_lane.cancel()
+
+    progress.finished = True
+    if on_progress:
+        await on_progress(progress)
+    return progress
+
+
+async def _bulk_delete(outbound, channel, batch, progress):
+    try:
+        await outbound.run(BULK, f"bulk_deletes:{channel.id}", lambda: channel.delete_messages(batch))
+        progress.bulk_deleted += len(batch)
+    except Exception:
+        progress.failed += len(batch)
+
+
+async def _single_delete_lane(outbound, channel, queue, progress):
+    bucket = TokenBucket(SINGLE_DELETE_RATE, SINGLE_DELETE_PER)
+    while True:
+        message = await queue.get()
+        if message is None:
+            return
+        await bucket.acquire()
+        try:
+            await outbound.run(BULK, f"deletes:{channel.id}", message.delete)
+            progress.single_deleted += 1
+        except Exception:
+            progress.failed += 1
@@ -0,0 +1,97 @@
+from collections import deque
+
+from utils.ratelimit import SlidingCounter
+
+# Defaults, overridable per guild in data/guild_config.json
+RAID_JOINS = 10             # joins...
+RAID_WINDOW = 10            # ...within this many seconds start a lockdown
+LOCKDOWN_MINUTES = 10       # an automatic lockdown lifts after this long without another surge
+MIN_ACCOUNT_AGE_DAYS = 7    # younger accounts are suspicious
+
+# Accounts created within the same 10 minutes as CLUSTER_SIZE other recent joiners look mass-registered
+CLUSTER_BUCKET = 600
+CLUSTER_SIZE = 3
+CLUSTER_WINDOW = 600
+
+# Onboarding priorities, lowest first
+ESTABLISHED = 0
+NEW_ACCOUNT = 1
+SUSPECTED = 2
+
+
+class RaidDetector:
+    """Per-guild join surge detection and joiner scoring.
+
+    Joins go through a sliding-window counter; a surge puts the guild in
+    lockdown, which ``check`` extends while joins keep coming. Each joiner is
+    scored on account age, default avatar and whether their account was
+    created alongside other recent joiners' (a mass-registration tell).
+    """
+
+    def __init__(self, guild_config):
+        self.guild_config = guild_config
+        self.joins = SlidingCounter()
+        self.lockdowns = {}
+        # guild ID -> (deque of (join time, creation bucket), bucket -> count)
+        self.created = {}
+
+    def in_lockdown(self, guild_id):
+        return guild_id in self.lockdowns
+
+    def observe(self, member, now):
+        """Count a join; returns the lockdown it started, if any."""
+        guild_id = member.guild.id
+        config = self.guild_config
+        window = config.get(guild_id, "raid_window", RAID_WINDOW)
+        joins = self.joins.add(guild_id, now, window)
+        self._track_creation(guild_id, member, now)
+        if joins < config.get(guild_id, "raid_joins", RAID_JOINS):
+            return None
+        lockdown = self.lockdowns.get(guild_id)
+        until = now + config.get(guild_id, "lockdown_minutes", LOCKDOWN_MINUTES) * 60
+        if lockdown is not None:
+            if not lockdown["manual"]:
+                lockdown["until"] = until
+            return None
+        lockdown = self.lockdowns[guild_id] = {"since": now, "until": until, "manual": False,
+                                               "reason": f"{joins} joins in {window}s"}
+        return lockdown
+
+    def _track_creation(self, guild_id, member, now):
+        recent, buckets = self.created.setdefault(guild_id, (deque(), {}))
+        bucket = int(member.created_at.timestamp()) // CLUSTER_BUCKET
+        recent.append((now, bucket))
+        buckets[bucket] = buckets.get(bucket, 0) + 1
+        while recent[0][0] <= now - CLUSTER_WINDOW:
+            _, old = recent.popleft()
+            buckets[old] -= 1
+            if not buckets[old]:
+                del buckets[old]
+
+    def priority(self, member, now_dt):
+        """ESTABLISHED, NEW_ACCOUNT or SUSPECTED."""
+        guild_id = member.guild.id
+        min_age = self.guild_config.get(guild_id, "min_account_age_days", MIN_ACCOUNT_AGE_DAYS)
+        score = 0
+        if (now_dt - member.created_at).days < min_age:
+            score += 2
+        if getattr(member, "avatar", None) is None:
+            score += 1
+        _, buckets = self.created.get(guild_id, (None, {}))
+        if buckets.get(int(member.created_at.timestamp()) // CLUSTER_BUCKET, 0) > CLUSTER_SIZE:
+            score += 2
+        if score >= 2:
+            return SUSPECTED
+        return NEW_ACCOUNT if score else ESTABLISHED
+
+    def start(self, guild_id, now, reason="manual"):
+        self.lockdowns[guild_id] = {"since": now, "until": None, "manual": True, "reason": reason}
+
+    def lift(self, guild_id):
+        return self.lockdowns.pop(guild_id, None)
+
+    def expired(self, now):
+        """Automatic lockdowns whose quiet period is over, removed and returned by guild ID."""
+        done = [guild_id for guild_id, lockdown in self.lockdowns.items()
+                if not lockdown["manual"] and lockdown["until"] <= now]
+        return {guild_id: self.lockdowns.pop(guild_id) for guild_id in done}
@@ -0,0 +1,86 @@
+import asyncio
+import time
+from collections import deque
+
+
+class TokenBucket:
+    """Async token bucket allowing ``rate`` acquisitions every ``per`` seconds.
+
+    ``block`` empties the bucket for a server-provided ``retry_after`` so a 429
+    pauses every caller sharing the route, not just the one that hit it.
+    """
+
+    def __init__(self, rate, per):
+        self.rate = rate
+        self.per = per
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate / self.per)
+        self.updated = now
+
+    async def acquire(self):
+        # Waiters queue on the lock, so tokens are handed out in arrival order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) * self.per / self.rate)
+
+    def delay(self, now=None):
+        """Seconds until a token is available (0.0 if one is now), without taking it."""
+        now = time.monotonic() if now is None else now
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) * self.per / self.rate
+
+    def take(self):
+        """Take a token without waiting; returns False if there is none."""
+        if self.delay():
+            return False
+        self.tokens -= 1
+        return True
+
+    def block(self, retry_after):
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens = 0.0
+        self.blocked_until = max(self.blocked_until, now + retry_after)
+
+
+class SlidingCounter:
+    """Per-key event totals over a trailing time window.
+
+    Each key keeps a deque of (time, amount) and a running total, so adding
+    an event and reading the total is amortized O(1).
+    """
+
+    def __init__(self):
+        self.keys = {}
+
+    def add(self, key, now, window, amount=1):
+        entry = self.keys.get(key)
+        if entry is None:
+            entry = self.keys[key] = [deque(), 0]
+        events = entry[0]
+        events.append((now, amount))
+        entry[1] += amount
+        cutoff = now - window
+        while events[0][0] <= cutoff:
+            entry[1] -= events.popleft()[1]
+        return entry[1]
+
+    def prune(self, now, idle):
+        # Keys that went quiet hold no memory
+        for key in [key for key, (events, total) in self.keys.items() if events[-1][0] <= now - idle]:
+            del self.keys[key]
@@ -0,0 +1,266 @@
+import asyncio
+import time
+
+import discord
+
+from config import STATE_DIR
+from utils.storage import AppendLog
+
+SNAPSHOTS_FILE = f"{STATE_DIR}/role_snapshots.jsonl"
+
+# Role changes are journaled in batches; a bulk role job costs a handful of appends
+JOURNAL_FLUSH_DELAY = 1.0
+# Rewrite the journal once it holds this many diffs, and more than one per tracked member
+COMPACT_AFTER = 50_000
+COMPACT_RATIO = 2
+
+EMPTY = ()
+
+
+class RoleSnapshots:
+    """The last known roles of every member, including members who left.
+
+    Each change is journaled as a diff of role IDs (``{"g", "u", "a", "r"}``:
+    guild, user, added, removed) and replaying the journal rebuilds
+    ``guilds``, guild ID -> user ID -> sorted tuple of role IDs. Members
+    holding the same roles share one tuple in memory. The roles a member held
+    when they left are frozen separately in ``left`` (``{"g", "u", "left"}``)
+    so that role changes after they rejoin can't overwrite them; the record
+    stays until their roles are restored. Compaction rewrites the journal as
+    one line per guild: the guild's role IDs once, then each distinct role
+    set as indexes into them with the users holding it.
+    """
+
+    def __init__(self, path=SNAPSHOTS_FILE):
+        self.log = AppendLog(path)
+        self.guilds = {}
+        self.left = {}
+        self.members = 0
+        self.records = 0
+        self._sets = {}
+        self._ids = {}
+        self._journal_buffer = []
+        self._journal_task = None
+
+    def __len__(self):
+        return self.members
+
+    def _intern_ids(self, role_ids):
+        # Parsed snowflakes are fresh int objects; share one per role ID
+        return tuple(self._ids.setdefault(role_id, role_id) for role_id in role_ids)
+
+    def _set(self, guild_id, user_id, role_ids):
+        members = self.guilds.setdefault(guild_id, {})
+        if role_ids:
+            if user_id not in members:
+                self.members += 1
+            members[user_id] = self._sets.setdefault(role_ids, role_ids)
+        elif members.pop(user_id, None) is not None:
+            self.members -= 1
+
+    def _set_left(self, guild_id, user_id, role_ids):
+        left = self.left.setdefault(guild_id, {})
+        if role_ids:
+            left[user_id] = self._sets.setdefault(role_ids, role_ids)
+        else:
+            left.pop(user_id, None)
+
+    async def load(self):
+        for record in await asyncio.to_thread(self.log.read_all):
+            guild_id = record["g"]
+            if "sets" in record:
+                roles = self._intern_ids(record["roles"])
+                for indexes, user_ids in record["sets"]:
+                    role_ids = tuple(roles[index] for index in indexes)
+                    for user_id in user_ids:
+                        self._set(guild_id, user_id, role_ids)
+                for indexes, user_ids in record.get("left", ()):
+                    role_ids = tuple(roles[index] for index in indexes)
+                    for user_id in user_ids:
+                        self._set_left(guild_id, user_id, role_ids)
+            elif "left" in record:
+                self._set_left(guild_id, record["u"], self._intern_ids(record["left"]))
+            else:
+                current = set(self.current(guild_id, record["u"]))
+                current.difference_update(record.get("r", ()))
+                current.update(record.get("a", ()))
+                self._set(guild_id, record["u"], self._intern_ids(sorted(current)))
+            self.records += 1
+
+    def get(self, guild_id, user_id):
+        """Role IDs to give the member back: those held when they left, else the last known ones (empty if unknown)."""
+        return self.left.get(guild_id, {}).get(user_id) or self.current(guild_id, user_id)
+
+    def current(self, guild_id, user_id):
+        """Role IDs the member last held in the guild (empty if unknown)."""
+        return self.guilds.get(guild_id, {}).get(user_id, EMPTY)
+
+    def record(self, guild_id, user_id, role_ids):
+        """Remember the member's current roles; only the difference is written. Returns whether anything changed."""
+        new = tuple(sorted(set(role_ids)))
+        old = self.current(guild_id, user_id)
+        if new == old:
+            return False
+        added, removed = set(new).difference(old), set(old).difference(new)
+        diff = {"g": guild_id, "u": user_id}
+        if added:
+            diff["a"] = sorted(added)
+        if removed:
+            diff["r"] = sorted(removed)
+        self._set(guild_id, user_id, new)
+        self._journal(diff)
+        return True
+
+    def record_member(self, member):
+        # @everyone and integration-managed roles can't be given back, so they aren't kept
+        return self.record(member.guild.id, member.id,
+                           [role.id for role in member.roles if not role.is_default() and not role.managed])
+
+    def record_role_ids(self, guild, user_id, role_ids):
+        """``record_member`` for a member known only by the role IDs of a gateway update (which omit @everyone)."""
+        roles = (guild.get_role(role_id) for role_id in role_ids)
+        return self.record(guild.id, user_id, [role.id for role in roles if role is not None and not role.managed])
+
+    def leave(self, guild_id, user_id):
+        """Freeze the member's last known roles as their roles at leave, unless an earlier leave wasn't restored yet."""
+        role_ids = self.current(guild_id, user_id)
+        if not role_ids or user_id in self.left.get(guild_id, {}):
+            return False
+        self._set_left(guild_id, user_id, role_ids)
+        self._journal({"g": guild_id, "u": user_id, "left": list(role_ids)})
+        return True
+
+    def restored(self, guild_id, user_id):
+        """Drop the member's roles at leave once they have been given back."""
+        if self.left.get(guild_id, {}).pop(user_id, None) is not None:
+            self._journal({"g": guild_id, "u": user_id, "left": []})
+
+    async def reconcile(self, guild):
+        """Catch up on role changes and departures missed while offline; returns how many members changed.
+
+        Only the members' role IDs are copied on the loop. Comparing them
+        with the snapshots runs in a worker thread, and just the members it
+        finds changed are recorded back on the loop.
+        """
+        skip = {role.id for role in guild.roles if role.is_default() or role.managed}
+        members = [(member.id, tuple(member._roles)) for member in guild.members]
+        known = dict(self.guilds.get(guild.id, {}))
+        changed, gone = await asyncio.to_thread(self._compare, members, known, skip)
+        count = 0
+        for user_id in changed:
+            # Re-read: the member may have been updated while the comparison ran
+            member = guild.get_member(user_id)
+            if member is not None:
+                count += self.record_member(member)
+        for user_id in gone:
+            # Left while the bot was offline; the last known roles are the roles at leave
+            self.leave(guild.id, user_id)
+        return count
+
+    @staticmethod
+    def _compare(members, known, skip):
+        changed = []
+        for user_id, role_ids in members:
+            if tuple(sorted(role_id for role_id in role_ids if role_id not in skip)) != known.pop(user_id, EMPTY):
+                changed.append(user_id)
+        return changed, list(known)
+
+    def _journal(self, record):
+        self._journal_buffer.append(record)
+        self.records += 1
+        if self._journal_task is None or self._journal_task.done():
+            self._journal_task = asyncio.get_running_loop().create_task(self._flush_journal())
+
+    async def _flush_journal(self):
+        # Changes recorded while a flush is writing are picked up by the next round
+        while self._journal_buffer:
+            await asyncio.sleep(JOURNAL_FLUSH_DELAY)
+            await self.flush()
+
+    @staticmethod
+    def _compacted(guilds, left):
+        records = []
+        for guild_id in guilds.keys() | left.keys():
+            sets, left_sets = {}, {}
+            for user_id, role_ids in guilds.get(guild_id, {}).items():
+                sets.setdefault(role_ids, []).append(user_id)
+            for user_id, role_ids in left.get(guild_id, {}).items():
+                left_sets.setdefault(role_ids, []).append(user_id)
+            roles = sorted({role_id for role_ids in sets.keys() | left_sets.keys() for role_id in role_ids})
+            index = {role_id: position for position, role_id in enumerate(roles)}
+            record = {"g": guild_id, "roles": roles, "sets": [
+                [[index[role_id] for role_id in role_ids], user_ids] for role_ids, user_ids in sets.items()
+            ]}
+            if left_sets:
+                record["left"] = [[[index[role_id] for role_id in role_ids], user_ids]
+                                  for role_ids, user_ids in left_sets.items()]
+            records.append(record)
+        return records
+
+    async def flush(self):
+        records, self._journal_buffer = self._journal_buffer, []
+        if self.records > COMPACT_AFTER and self.records > COMPACT_RATIO * self.members:
+            # The in-memory roles already include the buffered diffs; a shallow copy is grouped off the loop
+            guilds = {guild_id: dict(members) for guild_id, members in self.guilds.items()}
+            left = {guild_id: dict(members) for guild_id, members in self.left.items()}
+            compacted = await asyncio.to_thread(self._compacted, guilds, left)
+            await self.log.rewrite(compacted)
+            self.records = len(compacted)
+            # Forget role sets nobody holds any more
+            self._sets = {role_ids: role_ids for table in (self.guilds, self.left)
+                          for members in table.values() for role_ids in members.values()}
+            self._ids = {role_id: role_id for role_ids in self._sets for role_id in role_ids}
+        elif records:
+            await self.log.append(*records)
+
+    async def close(self):
+        if self._journal_task and not self._journal_task.done():
+            self._journal_task.cancel()
+        await self.flush()
+
+
+def restorable_roles(guild, role_ids, current=()):
+    """The guild's roles from ``role_ids`` the bot can still give back, minus those already held."""
+    top = guild.me.top_role if guild.me else None
+    roles = []
+    for role_id in role_ids:
+        role = guild.get_role(role_id)
+        if role is None or role.managed or role.is_default() or role.id in current:
+            continue
+        if top is not None and role >= top:
+            continue
+        roles.append(role)
+    return roles
+
+
+def setup_role_snapshots(bot):
+    """Attach a RoleSnapshots to ``bot`` and record every member role change."""
+    bot.role_snapshots = RoleSnapshots()
+
+    async def on_guild_available(guild):
+        # Only members whose roles changed while the bot was offline produce a diff
+        if guild.chunked:
+            start = time.perf_counter()
+            changed = await bot.role_snapshots.reconcile(guild)
+            bot.logger.info(f"✅ Role snapshots for {guild.name}: {changed} changed ({time.perf_counter() - start:.2f}s)")
+
+    async def on_member_update(before, after):
+        if before.roles != after.roles:
+            bot.role_snapshots.record_member(after)
+
+    # Lazy and active member cache modes, including members discord.py doesn't hold (see utils/member_cache.py);
+    # only a change is journaled, so updates on_member_update already recorded cost nothing
+    async def on_gateway_member_update(guild, user_id, role_ids):
+        bot.role_snapshots.record_role_ids(guild, user_id, role_ids)
+
+    # The raw event fires whether or not the member was cached
+    async def on_raw_member_remove(payload):
+        if isinstance(payload.user, discord.Member):
+            bot.role_snapshots.record_member(payload.user)
+        bot.role_snapshots.leave(payload.guild_id, payload.user.id)
+
+    bot.add_listener(on_guild_available)
+    bot.add_listener(on_member_update)
+    bot.add_listener(on_gateway_member_update)
+    bot.add_listener(on_raw_member_remove)
+    return bot.role_snapshots
@@ -0,0 +1,96 @@
+import asyncio
+import heapq
+import logging
+import time
+
+logger = logging.getLogger("bot")
+
+
+class Scheduler:
+    """Runs ``callback(key)`` when each key's deadline passes, from a single task.
+
+    Deadlines live in a heap, so scheduling is O(log n) and the task sleeps
+    until the earliest one; scheduling something earlier wakes it up. Every
+    deadline already due is fired in one pass, each callback as its own task
+    so a slow one doesn't hold up the rest; that is also how missed deadlines
+    are caught up after a restart. Rescheduling or cancelling a key leaves its
+    old heap entry behind and skips it when it surfaces.
+    """
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.heap = []
+        self.deadlines = {}
+        self._wake = asyncio.Event()
+        self._task = None
+        # Callbacks still running, held so the loop can't garbage-collect them
+        self._running = set()
+
+    def __len__(self):
+        return len(self.deadlines)
+
+    def __contains__(self, key):
+        return key in self.deadlines
+
+    def schedule(self, when, key):
+        self.deadlines[key] = when
+        heapq.heappush(self.heap, (when, key))
+        if self.heap[0] == (when, key):
+            self._wake.set()
+
+    def schedule_many(self, entries):
+        """Bulk ``schedule`` for (when, key) pairs; one O(n) heapify instead of n pushes."""
+        for when, key in entries:
+            self.deadlines[key] = when
+            self.heap.append((when, key))
+        heapq.heapify(self.heap)
+        self._wake.set()
+
+    def cancel(self, key):
+        return self.deadlines.pop(key, None) is not None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+        for task in list(self._running):
+            task.cancel()
+
+    def pop_due(self, now=None):
+        now = now or time.time()
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            when, key = heapq.heappop(self.heap)
+            if self.deadlines.get(key) == when:
+                del self.deadlines[key]
+                due.append(key)
+        return due
+
+    async def _call(self, key):
+        try:
+            await self.callback(key)
+        except Exception:
+            logger.exception(f"❌ Error running scheduled task {key!r}")
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            for key in self.pop_due():
+                task = loop.create_task(self._call(key))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+
+            # Drop cancelled entries so the sleep targets a live deadline
+            while self.heap and self.deadlines.get(self.heap[0][1]) != self.heap[0][0]:
+                heapq.heappop(self.heap)
+
+            self._wake.clear()
+            timeout = self.heap[0][0] - time.time() if self.heap else None
+            if timeout is None or timeout > 0:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
@@ -0,0 +1,82 @@
+import asyncio
+import json
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process identify lock, run a single process there
+    fcntl = None
+
+from utils.storage import atomic_write
+
+# Shared by every launcher process, unlike the per-process STATE_DIR
+SHARD_DIR = "data/shards"
+# Discord accepts max_concurrency identifies per 5 seconds across all of a bot's connections
+IDENTIFY_INTERVAL = 5.0
+
+
+def assign_shards(shard_count, processes):
+    """Split shard IDs 0..shard_count-1 into ``processes`` contiguous, near-equal ranges."""
+    base, extra = divmod(shard_count, processes)
+    ranges, start = [], 0
+    for index in range(processes):
+        size = base + (1 if index < extra else 0)
+        ranges.append(list(range(start, start + size)))
+        start += size
+    return ranges
+
+
+def _claim_identify_slot(path, interval):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a+") as f:
+        # The lock serializes processes; the timestamp inside spaces them out
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            f.seek(0)
+            content = f.read().strip()
+            wait = (float(content) if content else 0.0) + interval - time.time()
+            if wait > 0:
+                time.sleep(wait)
+            f.seek(0)
+            f.truncate()
+            f.write(str(time.time()))
+            f.flush()
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+async def wait_for_identify(shard_id, concurrency=1, interval=IDENTIFY_INTERVAL):
+    """Wait until ``shard_id`` may identify without exceeding the identify limit.
+
+    Every process on this machine takes turns through a lock file per
+    rate-limit bucket (``shard_id % concurrency``), so shards started by
+    separate processes never identify closer than ``interval`` apart.
+    Returns False when file locks are unavailable and the caller should
+    fall back to its own pacing.
+    """
+    if fcntl is None:
+        return False
+    path = os.path.join(SHARD_DIR, f"identify-{shard_id % concurrency}.lock")
+    await asyncio.to_thread(_claim_identify_slot, path, interval)
+    return True
+
+
+def write_status(cluster_id, status):
+    atomic_write(os.path.join(SHARD_DIR, f"cluster-{cluster_id}.json"), json.dumps(status))
+
+
+def read_statuses():
+    """Latest status written by each process, keyed by cluster ID."""
+    statuses = {}
+    if not os.path.isdir(SHARD_DIR):
+        return statuses
+    for name in os.listdir(SHARD_DIR):
+        if name.startswith("cluster-") and name.endswith(".json"):
+            try:
+                with open(os.path.join(SHARD_DIR, name), "r") as f:
+                    status = json.load(f)
+            except (OSError, ValueError):
+                continue
+            statuses[status["cluster"]] = status
+    return statuses
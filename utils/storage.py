@@ -0,0 +1,127 @@
+import asyncio
+import json
+import os
+import threading
+
+
+# Write a file atomically: dump to a temp file next to it, then rename over the original
+def atomic_write(path, payload):
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class JsonStore:
+    """A JSON dict loaded once and served from memory.
+
+    Mutations are serialized behind ``lock`` and persisted by a batched
+    write-behind: ``mark_dirty`` schedules a single flush ``flush_delay``
+    seconds later, so a burst of changes costs one atomic write.
+    """
+
+    def __init__(self, path, flush_delay=1.0):
+        self.path = path
+        self.flush_delay = flush_delay
+        self.lock = asyncio.Lock()
+        self.data = self._load()
+        self._flush_task = None
+        self._dirty = False
+        self._io_lock = threading.Lock()
+
+    def _load(self):
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                return json.load(f)
+        return {}
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def set(self, key, value):
+        self.data[key] = value
+        self.mark_dirty()
+
+    def pop(self, key, default=None):
+        value = self.data.pop(key, default)
+        self.mark_dirty()
+        return value
+
+    def mark_dirty(self):
+        # One pending flush covers every change made before it snapshots
+        self._dirty = True
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+
+    async def _flush_later(self):
+        # Changes made while a write is in progress leave the store dirty for another round
+        while self._dirty:
+            await asyncio.sleep(self.flush_delay)
+            await self.flush()
+
+    async def flush(self):
+        # Snapshot on the loop, write off it
+        self._dirty = False
+        payload = json.dumps(self.data)
+        await asyncio.to_thread(self._write, payload)
+
+    def _write(self, payload):
+        # A cancelled flush can leave its thread running; never let two writes overlap
+        with self._io_lock:
+            atomic_write(self.path, payload)
+
+    async def close(self):
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self.flush()
+
+
+class AppendLog:
+    """An append-only JSON-lines file.
+
+    Records are only ever appended, so a write costs the size of the record
+    rather than the size of the history. Appends run off the event loop.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._io_lock = threading.Lock()
+
+    def read_all(self):
+        if not os.path.exists(self.path):
+            return []
+        records = []
+        with open(self.path, "r") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A torn last line from a crash mid-append; everything before it is intact
+                    continue
+        return records
+
+    async def append(self, *records):
+        payload = "".join(json.dumps(record) + "\n" for record in records)
+        await asyncio.to_thread(self._append, payload)
+
+    def _append(self, payload):
+        with self._io_lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(payload)
+
+    async def rewrite(self, records):
+        # Compaction: replace the whole log with the given records in one atomic swap
+        payload = "".join(json.dumps(record) + "\n" for record in records)
+        await asyncio.to_thread(self._rewrite, payload)
+
+    def _rewrite(self, payload):
+        with self._io_lock:
+            atomic_write(self.path, payload)